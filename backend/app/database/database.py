@@ -1,24 +1,133 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 import os
+import logging
+import threading
+from typing import Optional
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # 获取数据库URL
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./pdf_ocr.db")
 
+# SQLite配置：WAL模式下读写互不阻塞，写入等待锁的时间由busy_timeout控制
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "30000"))  # 毫秒
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 字节
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # 负数表示KiB，默认64MB
+# 同一进程内的写事务排队执行，避免多个线程同时等待SQLite写锁
+SQLITE_WRITE_LOCK = os.getenv("SQLITE_WRITE_LOCK", "true").lower() in ("1", "true", "yes")
+
+# PostgreSQL等数据库的连接池配置
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # 秒
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # 秒
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+IS_SQLITE = make_url(DATABASE_URL).get_backend_name() == "sqlite"
+
+# 异步驱动：API请求使用，默认由 DATABASE_URL 推导（SQLite使用aiosqlite，PostgreSQL使用asyncpg）
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql"
+}
+
+def _default_async_database_url() -> str:
+    url = make_url(DATABASE_URL)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        return DATABASE_URL
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _default_async_database_url()
+
+def _sqlite_engine_options() -> dict:
+    return {
+        "connect_args": {
+            "check_same_thread": False,  # SQLite特定配置
+            "timeout": SQLITE_BUSY_TIMEOUT / 1000
+        }
+    }
+
+def _pool_engine_options() -> dict:
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+
 # 创建数据库引擎
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False}  # SQLite特定配置
+    **(_sqlite_engine_options() if IS_SQLITE else _pool_engine_options())
 )
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    每个新连接设置SQLite参数
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    finally:
+        cursor.close()
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 单写者锁：会话第一次写入时获取，提交或回滚时释放
+# 等待超过busy_timeout后不再等待，交给SQLite自身的锁处理，避免异步路由等场景下互相等待
+_write_lock = threading.Lock()
+_WRITE_LOCK_KEY = "sqlite_write_lock"
+
+def _acquire_write_lock(session: Session) -> None:
+    if session.info.get(_WRITE_LOCK_KEY) is not None:
+        return
+    acquired = _write_lock.acquire(timeout=SQLITE_BUSY_TIMEOUT / 1000)
+    if not acquired:
+        logger.warning("等待数据库写锁超时，直接执行写入")
+    session.info[_WRITE_LOCK_KEY] = acquired
+
+def _release_write_lock(session: Session) -> None:
+    if session.info.pop(_WRITE_LOCK_KEY, None):
+        _write_lock.release()
+
+if IS_SQLITE and SQLITE_WRITE_LOCK:
+    @event.listens_for(SessionLocal, "before_flush")
+    def _lock_before_flush(session, flush_context, instances):
+        if session.new or session.dirty or session.deleted:
+            _acquire_write_lock(session)
+
+    @event.listens_for(SessionLocal, "do_orm_execute")
+    def _lock_before_dml(orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            _acquire_write_lock(orm_execute_state.session)
+
+    @event.listens_for(SessionLocal, "after_transaction_end")
+    def _unlock_after_transaction(session, transaction):
+        # 最外层事务结束（提交、回滚或会话关闭）时释放，保存点结束时不释放
+        if transaction.parent is None:
+            _release_write_lock(session)
+
 # 创建基类
 Base = declarative_base()
 
@@ -28,4 +137,49 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# 异步引擎在第一次使用时创建，工作进程等只使用同步会话的场景不需要安装异步驱动
+# 异步会话不经过上面的单写者锁，写入冲突由SQLite的busy_timeout等待（在驱动线程中等待，不阻塞事件循环）
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+
+def get_async_engine() -> AsyncEngine:
+    """
+    获取异步数据库引擎（API请求使用）
+    """
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            **(_sqlite_engine_options() if IS_SQLITE else _pool_engine_options())
+        )
+        if IS_SQLITE:
+            event.listen(_async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return _async_engine
+
+def AsyncSessionLocal() -> AsyncSession:
+    """
+    创建异步会话，提交后不过期对象，避免提交后访问属性时触发同步加载
+    """
+    global _async_session_factory
+    if _async_session_factory is None:
+        _async_session_factory = async_sessionmaker(
+            get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _async_session_factory()
+
+async def dispose_async_engine() -> None:
+    """
+    关闭异步引擎的连接池（服务关闭时调用）
+    """
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _async_session_factory = None
+
+# 依赖项：获取异步数据库会话
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
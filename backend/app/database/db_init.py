@@ -1,16 +1,28 @@
 from app.database.database import engine, Base
+# 导入模型以便注册到Base.metadata（工作进程中可能先于路由模块初始化数据库）
+from app.database import models
+from app.database.migrations import run_migrations
+from app.services.search_service import create_search_index
+from sqlalchemy import inspect
 import logging
 
 logger = logging.getLogger(__name__)
 
 def init_database():
     """
-    初始化数据库，创建所有表
+    初始化数据库，创建所有表并执行尚未执行的结构迁移
     """
     try:
+        # 新数据库的表直接按最新模型创建，迁移只需记录版本
+        fresh = not inspect(engine).has_table(models.PDFDocument.__tablename__)
         # 创建所有表
         Base.metadata.create_all(bind=engine)
+        # 全文索引虚拟表不属于模型，单独创建
+        create_search_index(engine)
         logger.info("数据库表创建成功")
+        executed = run_migrations(engine, fresh=fresh)
+        if executed and not fresh:
+            logger.info(f"数据库迁移完成: {executed}")
     except Exception as e:
         logger.error(f"数据库初始化失败: {str(e)}")
         raise
\ No newline at end of file
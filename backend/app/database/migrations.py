@@ -0,0 +1,240 @@
+"""
+数据库结构迁移
+
+create_all 只会创建缺失的表，无法给已有的表添加列和索引。
+这里按版本号顺序记录结构变更，已执行的版本保存在 schema_migrations 表中，
+启动时（init_database）自动执行尚未执行的迁移。
+
+新增迁移：在 MIGRATIONS 末尾追加 (版本号, 说明, 执行函数)，版本号递增，已发布的迁移不要修改。
+每个迁移都应可重复执行（列、索引已存在时跳过），以便多个进程同时启动时互不影响。
+
+手动执行: python -m app.database.migrations [upgrade|status]
+"""
+import sys
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from app.database.database import Base
+
+logger = logging.getLogger(__name__)
+
+# 迁移记录表（不属于业务模型，单独定义）
+_migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+def add_column_if_missing(conn: Connection, table_name: str, column_name: str) -> None:
+    """
+    按模型中的列定义给已有的表添加列
+    """
+    if column_name in {c["name"] for c in inspect(conn).get_columns(table_name)}:
+        return
+    column = Base.metadata.tables[table_name].columns[column_name]
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}'))
+    logger.info(f"添加列: {table_name}.{column_name}")
+
+def create_index_if_missing(conn: Connection, table_name: str, index_name: str) -> None:
+    """
+    按模型中的索引定义创建索引
+    """
+    for index in Base.metadata.tables[table_name].indexes:
+        if index.name == index_name:
+            index.create(bind=conn, checkfirst=True)
+            logger.info(f"确认索引: {index_name}")
+            return
+    raise ValueError(f"模型中不存在索引: {table_name}.{index_name}")
+
+def compress_text_column(conn: Connection, table_name: str, column_name: str, batch_size: int = 500) -> int:
+    """
+    按当前压缩配置压缩已有的大文本（仅SQLite），已压缩和较短的文本跳过，不修改 updated_at
+    :return: 压缩的行数
+    """
+    from app.database.types import TEXT_COMPRESSION, TEXT_COMPRESSION_MIN_BYTES, compress_text
+
+    if conn.dialect.name != "sqlite" or TEXT_COMPRESSION == "none":
+        return 0
+    compressed = 0
+    last_rowid = 0
+    while True:
+        rows = conn.execute(text(f"""
+            SELECT rowid, {column_name} FROM {table_name}
+            WHERE rowid > :last_rowid AND typeof({column_name}) = 'text'
+                AND length(CAST({column_name} AS BLOB)) >= :min_bytes
+            ORDER BY rowid LIMIT :batch_size
+        """), {"last_rowid": last_rowid, "min_bytes": TEXT_COMPRESSION_MIN_BYTES, "batch_size": batch_size}).all()
+        if not rows:
+            break
+        last_rowid = rows[-1][0]
+        updates = [{"row_id": rowid, "value": compress_text(value)} for rowid, value in rows]
+        updates = [item for item in updates if isinstance(item["value"], bytes)]
+        if updates:
+            conn.execute(text(f"UPDATE {table_name} SET {column_name} = :value WHERE rowid = :row_id"), updates)
+            compressed += len(updates)
+    return compressed
+
+def _migration_1(conn: Connection) -> None:
+    # 去重、任务队列引入的列（旧数据库中缺失）
+    add_column_if_missing(conn, "pdf_documents", "content_hash")
+    create_index_if_missing(conn, "pdf_documents", "ix_pdf_documents_content_hash")
+    add_column_if_missing(conn, "processing_jobs", "batch_id")
+    create_index_if_missing(conn, "processing_jobs", "ix_processing_jobs_batch_id")
+
+def _migration_2(conn: Connection) -> None:
+    # 同一文档同一页码只保留一条记录（优先保留已OCR的记录，其次是最早的记录），再建立唯一索引
+    conn.execute(text("""
+        DELETE FROM pdf_pages WHERE id NOT IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY document_id, page_number
+                    ORDER BY CASE WHEN ocr_status THEN 0 ELSE 1 END, id
+                ) AS rn FROM pdf_pages
+            ) ranked WHERE rn = 1
+        )
+    """))
+    create_index_if_missing(conn, "pdf_pages", "ux_pdf_pages_document_page")
+    # 列表排序字段
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_pdf_documents_created_at ON pdf_documents (created_at)"))
+    create_index_if_missing(conn, "notes", "ix_notes_updated_at")
+
+def _migration_3(conn: Connection) -> None:
+    # 文件列表按 (created_at, id) 分页，替换单列的 created_at 索引
+    create_index_if_missing(conn, "pdf_documents", "ix_pdf_documents_created_at_id")
+    create_index_if_missing(conn, "pdf_documents", "ix_pdf_documents_status_created_at_id")
+    conn.execute(text("DROP INDEX IF EXISTS ix_pdf_documents_created_at"))
+
+def _migration_4(conn: Connection) -> None:
+    # 页面识别文本全文索引，为已有页面建立索引
+    from app.services.search_service import rebuild_search_index
+
+    indexed = rebuild_search_index(conn)
+    logger.info(f"全文索引已建立: {indexed} 页")
+
+def _migration_5(conn: Connection) -> None:
+    # 文档的页面进度计数，按已有页面记录回填
+    add_column_if_missing(conn, "pdf_documents", "pages_processed")
+    add_column_if_missing(conn, "pdf_documents", "pages_rendered")
+    conn.execute(text("""
+        UPDATE pdf_documents SET
+            pages_processed = (
+                SELECT COUNT(*) FROM pdf_pages
+                WHERE pdf_pages.document_id = pdf_documents.id AND pdf_pages.ocr_status
+            ),
+            pages_rendered = (
+                SELECT COUNT(*) FROM pdf_pages
+                WHERE pdf_pages.document_id = pdf_documents.id AND pdf_pages.image_path IS NOT NULL
+            )
+    """))
+
+def _migration_6(conn: Connection) -> None:
+    # 压缩已有的大文本列，释放的空间需要执行 VACUUM 才会还给文件系统
+    for table_name, column_name in (("pdf_pages", "ocr_text"), ("notes", "content"), ("ocr_cache", "text")):
+        compressed = compress_text_column(conn, table_name, column_name)
+        logger.info(f"压缩已有文本: {table_name}.{column_name}, {compressed} 行")
+
+def _migration_7(conn: Connection) -> None:
+    # 页面图片清单，按已有页面记录的图片路径回填原图（读取全部图片计算大小和哈希耗时较长，旧图片不记录）
+    # 已登记的图片（重复执行、其他进程已写入）按唯一索引跳过
+    conn.execute(text("""
+        INSERT OR IGNORE INTO page_assets (document_id, page_number, variant, path, format)
+        SELECT document_id, page_number, 'original', image_path,
+            CASE
+                WHEN lower(image_path) LIKE '%.webp' THEN 'webp'
+                WHEN lower(image_path) LIKE '%.jpg' OR lower(image_path) LIKE '%.jpeg' THEN 'jpeg'
+                ELSE 'png'
+            END
+        FROM pdf_pages
+        WHERE image_path IS NOT NULL
+    """))
+
+def _migration_8(conn: Connection) -> None:
+    # OCR缓存总大小改为由计数维护，按已有条目初始化
+    conn.execute(text("""
+        INSERT OR REPLACE INTO ocr_cache_counters (name, value)
+        SELECT 'bytes', coalesce(sum(size_bytes), 0) FROM ocr_cache
+    """))
+
+def _migration_9(conn: Connection) -> None:
+    # 全文索引中汉字的分隔符由空格改为零宽字符，重建索引（摘要片段保留原文中的空格）
+    from app.services.search_service import rebuild_search_index
+
+    indexed = rebuild_search_index(conn)
+    logger.info(f"全文索引已重建: {indexed} 页")
+
+# (版本号, 说明, 执行函数)
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "pdf_documents.content_hash, processing_jobs.batch_id", _migration_1),
+    (2, "pdf_pages(document_id, page_number) unique index, list sort indexes", _migration_2),
+    (3, "pdf_documents (created_at, id) keyset pagination indexes", _migration_3),
+    (4, "pdf_page_fts full-text index over page OCR text", _migration_4),
+    (5, "pdf_documents.pages_processed, pages_rendered progress counters", _migration_5),
+    (6, "compress existing pdf_pages.ocr_text, notes.content, ocr_cache.text", _migration_6),
+    (7, "page_assets manifest backfilled from pdf_pages.image_path", _migration_7),
+    (8, "ocr_cache_counters.bytes running total of ocr_cache.size_bytes", _migration_8),
+    (9, "pdf_page_fts rebuilt with zero-width CJK separators", _migration_9),
+]
+
+def _applied_versions(conn: Connection) -> set:
+    return {row[0] for row in conn.execute(schema_migrations.select().with_only_columns(schema_migrations.c.version))}
+
+def _record(conn: Connection, version: int, description: str) -> None:
+    conn.execute(schema_migrations.insert().values(
+        version=version, description=description, applied_at=datetime.utcnow()
+    ))
+
+def run_migrations(engine: Engine, fresh: bool = False) -> List[int]:
+    """
+    执行尚未执行的迁移
+    :param fresh: 数据库是新建的（表由 create_all 按最新模型创建），只记录版本不执行迁移
+    :return: 本次执行的版本号列表
+    """
+    _migration_metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        applied = _applied_versions(conn)
+
+    executed = []
+    for version, description, upgrade in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            with engine.begin() as conn:
+                if not fresh:
+                    logger.info(f"执行数据库迁移 {version}: {description}")
+                    upgrade(conn)
+                _record(conn, version, description)
+            executed.append(version)
+        except IntegrityError:
+            # 其他进程已执行并记录了该版本
+            logger.info(f"数据库迁移 {version} 已由其他进程执行")
+    return executed
+
+def get_migration_status(engine: Engine) -> List[dict]:
+    """
+    各迁移版本的执行情况
+    """
+    _migration_metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        applied = _applied_versions(conn)
+    return [
+        {"version": version, "description": description, "applied": version in applied}
+        for version, description, _ in MIGRATIONS
+    ]
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    from app.database.database import engine
+    from app.database.db_init import init_database
+
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        for item in get_migration_status(engine):
+            print(f"{item['version']:>4}  {'已执行' if item['applied'] else '未执行'}  {item['description']}")
+    else:
+        init_database()
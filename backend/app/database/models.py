@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, Boolean, JSON, Index
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 import enum
 from app.database.database import Base
+from app.database.types import CompressedText
 
 # 定义处理状态枚举类
 class ProcessingStatus(str, enum.Enum):
@@ -25,6 +27,20 @@ class AISearchStatus(str, enum.Enum):
     COMPLETED = "completed"
     ERROR = "error"
 
+# 后台任务状态枚举类
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+# 后台任务阶段枚举类
+class JobStage(str, enum.Enum):
+    PARSE = "parse"
+    CLASSIFY = "classify"
+    RENDER = "render"
+    OCR = "ocr"
+
 # PDF文档表
 class PDFDocument(Base):
     __tablename__ = "pdf_documents"
@@ -32,14 +48,24 @@ class PDFDocument(Base):
     id = Column(String, primary_key=True, index=True)  # 使用UUID作为主键
     original_filename = Column(String, nullable=False)
     file_path = Column(String, nullable=False)
+    content_hash = Column(String(64), nullable=True, index=True)  # 文件内容SHA-256，用于去重
     pdf_type = Column(String, nullable=True)
     pdf_metadata = Column(String, nullable=True)
     total_pages = Column(Integer, default=0)
+    # 页面进度计数，与页面记录在同一个事务中更新，状态轮询和完成判断不再统计页面表
+    pages_processed = Column(Integer, default=0)  # 已OCR页数
+    pages_rendered = Column(Integer, default=0)  # 已生成（或按需渲染模式下已记录）图片的页数
     status = Column(Enum(ProcessingStatus), default=ProcessingStatus.UPLOADED)
     error_message = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # 文件列表按 (created_at, id) 倒序分页，可按状态过滤
+        Index("ix_pdf_documents_created_at_id", "created_at", "id"),
+        Index("ix_pdf_documents_status_created_at_id", "status", "created_at", "id"),
+    )
+
 # PDF页面表
 class PDFPage(Base):
     __tablename__ = "pdf_pages"
@@ -48,20 +74,88 @@ class PDFPage(Base):
     document_id = Column(String, ForeignKey("pdf_documents.id"), nullable=False)
     page_number = Column(Integer, nullable=False)
     image_path = Column(String, nullable=True)
-    ocr_text = Column(Text, nullable=True)
+    # 识别文本可能很大，延迟加载：只有访问该属性或查询时 undefer 才读取（读取时才解压）
+    ocr_text = deferred(Column(CompressedText, nullable=True))
     ocr_status = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # 按文档查询页面、按文档和页码查询单页，同一文档的页码唯一
+        Index("ux_pdf_pages_document_page", "document_id", "page_number", unique=True),
+    )
+
+# 页面图片清单表，记录渲染生成的页面图片（原图和预生成的各尺寸图片），按文档和页码直接查找，不扫描图片目录
+class PageAsset(Base):
+    __tablename__ = "page_assets"
+    
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    document_id = Column(String, ForeignKey("pdf_documents.id"), nullable=False)
+    page_number = Column(Integer, nullable=False)
+    variant = Column(String, nullable=False)  # original（原图）/ thumb / screen / full
+    path = Column(String, nullable=False)  # 相对 IMAGES_DIR 的路径，复用的文档指向来源文档的图片
+    format = Column(String, nullable=False)  # png / webp / jpeg
+    # 按需渲染的图片可能被淘汰后重新生成，不记录大小和哈希
+    size_bytes = Column(Integer, nullable=True)
+    content_hash = Column(String(64), nullable=True)  # 图片内容SHA-256
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ux_page_assets_document_page_variant", "document_id", "page_number", "variant", unique=True),
+    )
+
+# PDF处理任务队列表
+class ProcessingJob(Base):
+    __tablename__ = "processing_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    document_id = Column(String, ForeignKey("pdf_documents.id"), nullable=False, index=True)
+    stage = Column(Enum(JobStage), nullable=False)
+    payload = Column(JSON, nullable=True)
+    batch_id = Column(String, nullable=True, index=True)  # 批量任务ID（如整本OCR）
+    status = Column(Enum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=5, nullable=False)
+    run_after = Column(DateTime, nullable=False)  # UTC，早于该时间不执行（重试退避）
+    locked_until = Column(DateTime, nullable=True)  # UTC，可见性超时，超时后任务可被重新领取
+    worker_id = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_processing_jobs_status_run_after", "status", "run_after"),
+    )
+
+# OCR结果缓存表，按页面图片哈希、模型和提示词缓存识别结果
+class OCRCacheEntry(Base):
+    __tablename__ = "ocr_cache"
+    
+    cache_key = Column(String(64), primary_key=True)  # SHA-256(图片哈希, 模型, 提示词)
+    image_hash = Column(String(64), nullable=False, index=True)
+    model = Column(String, nullable=False)
+    text = Column(CompressedText, nullable=True)
+    size_bytes = Column(Integer, default=0, nullable=False)
+    hit_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime, nullable=False, index=True)  # UTC，用于淘汰最久未使用的条目
+
+# OCR缓存命中统计表
+class OCRCacheCounter(Base):
+    __tablename__ = "ocr_cache_counters"
+    
+    name = Column(String, primary_key=True)  # hits / misses / evictions / bytes（缓存总大小）
+    value = Column(Integer, default=0, nullable=False)
+
 # 笔记表
 class Note(Base):
     __tablename__ = "notes"
     
     id = Column(String, primary_key=True, index=True)  # 使用UUID作为主键
     title = Column(String, nullable=False)
-    content = Column(Text, nullable=True)
+    content = Column(CompressedText, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), index=True)  # 列表排序字段
 
 # 笔记资源表
 class NoteResource(Base):
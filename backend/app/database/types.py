@@ -0,0 +1,112 @@
+"""
+自定义列类型
+
+CompressedText: 透明压缩的大文本列（页面识别文本、笔记内容、OCR缓存文本）
+SQLite下超过 TEXT_COMPRESSION_MIN_BYTES 的文本压缩后以BLOB保存，读取时解压；
+较短的文本和旧数据仍按原文保存（TEXT），读取时按存储类型区分，不需要迁移即可混合存在。
+PostgreSQL会自动压缩超过2KB的大字段（TOAST），其他数据库按原文保存，列定义不变。
+"""
+import os
+import zlib
+import logging
+import threading
+from typing import Optional, Union
+from dotenv import load_dotenv
+from sqlalchemy import Text
+from sqlalchemy.types import TypeDecorator
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# zstd压缩（可选依赖），未安装时使用zlib
+HAS_ZSTD = False
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    zstandard = None
+
+# 压缩算法：zstd / zlib / none（none只影响写入，已压缩的数据仍可读取）
+TEXT_COMPRESSION = os.getenv("TEXT_COMPRESSION", "zstd").lower()
+# 只压缩UTF-8编码后不小于该字节数的文本，短文本压缩收益小
+TEXT_COMPRESSION_MIN_BYTES = int(os.getenv("TEXT_COMPRESSION_MIN_BYTES", "1024"))
+# 压缩级别，未配置时使用各算法的默认级别（zstd 3，zlib 6）
+TEXT_COMPRESSION_LEVEL = os.getenv("TEXT_COMPRESSION_LEVEL")
+
+if TEXT_COMPRESSION == "zstd" and not HAS_ZSTD:
+    logger.warning("zstandard库未安装，文本压缩使用zlib，请安装: pip install zstandard")
+    TEXT_COMPRESSION = "zlib"
+
+# 压缩数据的第一个字节标记压缩算法
+_ZLIB_TAG = b"Z"
+_ZSTD_TAG = b"S"
+
+# zstd压缩/解压对象不能在多个线程中同时使用，每个线程单独创建
+_zstd_local = threading.local()
+
+def _zstd_compressor():
+    compressor = getattr(_zstd_local, "compressor", None)
+    if compressor is None:
+        level = int(TEXT_COMPRESSION_LEVEL) if TEXT_COMPRESSION_LEVEL else 3
+        compressor = _zstd_local.compressor = zstandard.ZstdCompressor(level=level)
+    return compressor
+
+def _zstd_decompressor():
+    decompressor = getattr(_zstd_local, "decompressor", None)
+    if decompressor is None:
+        decompressor = _zstd_local.decompressor = zstandard.ZstdDecompressor()
+    return decompressor
+
+def compress_text(value: Optional[str]) -> Union[str, bytes, None]:
+    """
+    按配置压缩文本，短文本或未启用压缩时原样返回
+    :return: 压缩后的数据（首字节为算法标记）或原文本
+    """
+    if value is None or TEXT_COMPRESSION == "none":
+        return value
+    data = value.encode("utf-8")
+    if len(data) < TEXT_COMPRESSION_MIN_BYTES:
+        return value
+    if TEXT_COMPRESSION == "zstd":
+        compressed = _ZSTD_TAG + _zstd_compressor().compress(data)
+    else:
+        level = int(TEXT_COMPRESSION_LEVEL) if TEXT_COMPRESSION_LEVEL else 6
+        compressed = _ZLIB_TAG + zlib.compress(data, level)
+    # 压缩后没有变小（已压缩过的内容等）时保存原文
+    return compressed if len(compressed) < len(data) else value
+
+def decompress_text(value: Union[str, bytes, None]) -> Optional[str]:
+    """
+    还原 compress_text 的结果，原文本直接返回
+    """
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    tag, payload = value[:1], value[1:]
+    if tag == _ZSTD_TAG:
+        if not HAS_ZSTD:
+            raise RuntimeError("数据使用zstd压缩，需要安装zstandard库: pip install zstandard")
+        return _zstd_decompressor().decompress(payload).decode("utf-8")
+    if tag == _ZLIB_TAG:
+        return zlib.decompress(payload).decode("utf-8")
+    # 其他方式写入的二进制文本
+    return value.decode("utf-8")
+
+class CompressedText(TypeDecorator):
+    """
+    透明压缩的文本列：写入时压缩（仅SQLite），读取时解压
+    列定义与 Text 相同，已有的表不需要修改结构
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if dialect.name != "sqlite":
+            return value
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
@@ -1,5 +1,6 @@
 # 路由模块初始化文件
 from app.routes.pdf import router as pdf_router
 from app.routes.notes import router as notes_router
+from app.routes.search import router as search_router
 
-__all__ = ["pdf_router", "notes_router"]
\ No newline at end of file
+__all__ = ["pdf_router", "notes_router", "search_router"]
\ No newline at end of file
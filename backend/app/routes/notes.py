@@ -4,8 +4,8 @@ import os
 from dotenv import load_dotenv
 import uuid
 import logging
-from sqlalchemy.orm import Session
-from app.database.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.database import AsyncSessionLocal, get_async_db
 from app.services.note_service import (
     create_note, update_note, delete_note, get_note, get_all_notes,
     add_resource_to_note, remove_resource_from_note, get_note_resources,
@@ -47,12 +47,12 @@ class ResourceURLRequest(BaseModel):
 
 # 创建笔记
 @router.post("/notes")
-async def create_new_note(note: NoteCreate, db: Session = Depends(get_db)):
+async def create_new_note(note: NoteCreate, db: AsyncSession = Depends(get_async_db)):
     """
     创建新笔记
     """
     try:
-        new_note = create_note(
+        new_note = await create_note(
             db=db,
             title=note.title,
             content=note.content
@@ -72,12 +72,12 @@ async def create_new_note(note: NoteCreate, db: Session = Depends(get_db)):
 
 # 获取笔记列表
 @router.get("/notes")
-async def get_notes_list(db: Session = Depends(get_db)):
+async def get_notes_list(db: AsyncSession = Depends(get_async_db)):
     """
     获取所有笔记列表
     """
     try:
-        notes = get_all_notes(db)
+        notes = await get_all_notes(db)
         return [
             {
                 "note_id": note.id,
@@ -94,17 +94,17 @@ async def get_notes_list(db: Session = Depends(get_db)):
 
 # 获取笔记详情
 @router.get("/notes/{note_id}")
-async def get_note_details(note_id: str, db: Session = Depends(get_db)):
+async def get_note_details(note_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     获取笔记详情
     """
     try:
-        note = get_note(db, note_id)
+        note = await get_note(db, note_id)
         if not note:
             raise HTTPException(status_code=404, detail="笔记不存在")
         
         # 获取笔记资源
-        resources = get_note_resources(db, note_id)
+        resources = await get_note_resources(db, note_id)
         
         return {
             "note_id": note.id,
@@ -132,12 +132,12 @@ async def get_note_details(note_id: str, db: Session = Depends(get_db)):
 
 # 更新笔记
 @router.put("/notes/{note_id}")
-async def update_note_details(note_id: str, note: NoteUpdate, db: Session = Depends(get_db)):
+async def update_note_details(note_id: str, note: NoteUpdate, db: AsyncSession = Depends(get_async_db)):
     """
     更新笔记内容
     """
     try:
-        updated_note = update_note(
+        updated_note = await update_note(
             db=db,
             note_id=note_id,
             title=note.title,
@@ -163,12 +163,12 @@ async def update_note_details(note_id: str, note: NoteUpdate, db: Session = Depe
 
 # 删除笔记
 @router.delete("/notes/{note_id}")
-async def delete_note_by_id(note_id: str, db: Session = Depends(get_db)):
+async def delete_note_by_id(note_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     删除笔记
     """
     try:
-        success = delete_note(db, note_id)
+        success = await delete_note(db, note_id)
         if not success:
             raise HTTPException(status_code=404, detail="笔记不存在")
         
@@ -186,7 +186,7 @@ async def delete_note_by_id(note_id: str, db: Session = Depends(get_db)):
 async def add_pdf_resource(
     note_id: str,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     向笔记添加PDF资源
@@ -204,7 +204,7 @@ async def add_pdf_resource(
             f.write(await file.read())
         
         # 添加资源到笔记
-        resource = add_resource_to_note(
+        resource = await add_resource_to_note(
             db=db,
             note_id=note_id,
             resource_type=ResourceType.PDF,
@@ -235,7 +235,7 @@ async def add_pdf_resource(
 async def add_image_resource(
     note_id: str,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     向笔记添加图片资源
@@ -255,7 +255,7 @@ async def add_image_resource(
             f.write(await file.read())
         
         # 添加资源到笔记
-        resource = add_resource_to_note(
+        resource = await add_resource_to_note(
             db=db,
             note_id=note_id,
             resource_type=ResourceType.IMAGE,
@@ -286,14 +286,14 @@ async def add_image_resource(
 async def add_url_resource(
     note_id: str,
     url_request: ResourceURLRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     向笔记添加URL资源
     """
     try:
         # 添加URL资源到笔记
-        resource = add_resource_to_note(
+        resource = await add_resource_to_note(
             db=db,
             note_id=note_id,
             resource_type=ResourceType.URL,
@@ -321,12 +321,12 @@ async def add_url_resource(
 
 # 删除笔记资源
 @router.delete("/notes/resources/{resource_id}")
-async def remove_resource(resource_id: int, db: Session = Depends(get_db)):
+async def remove_resource(resource_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     删除笔记资源
     """
     try:
-        success = remove_resource_from_note(db, resource_id)
+        success = await remove_resource_from_note(db, resource_id)
         if not success:
             raise HTTPException(status_code=404, detail="资源不存在")
         
@@ -341,12 +341,12 @@ async def remove_resource(resource_id: int, db: Session = Depends(get_db)):
 
 # 获取笔记资源列表
 @router.get("/notes/{note_id}/resources")
-async def get_resources(note_id: str, db: Session = Depends(get_db)):
+async def get_resources(note_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     获取笔记的所有资源
     """
     try:
-        resources = get_note_resources(db, note_id)
+        resources = await get_note_resources(db, note_id)
         return [
             {
                 "resource_id": resource.id,
@@ -368,18 +368,18 @@ async def create_search_task(
     note_id: str,
     search_request: AISearchRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     创建AI搜索任务
     """
     try:
         # 检查笔记是否存在
-        if not get_note(db, note_id):
+        if not await get_note(db, note_id):
             raise HTTPException(status_code=404, detail="笔记不存在")
         
         # 创建搜索任务
-        task = create_ai_search_task(db, note_id, search_request.search_query)
+        task = await create_ai_search_task(db, note_id, search_request.search_query)
         
         # 添加后台任务执行搜索
         background_tasks.add_task(perform_ai_search_background, task.id)
@@ -400,12 +400,12 @@ async def create_search_task(
 
 # 获取笔记的AI搜索任务列表
 @router.get("/notes/{note_id}/ai-search")
-async def get_search_tasks(note_id: str, db: Session = Depends(get_db)):
+async def get_search_tasks(note_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     获取笔记的所有AI搜索任务
     """
     try:
-        tasks = get_ai_search_tasks(db, note_id)
+        tasks = await get_ai_search_tasks(db, note_id)
         return [
             {
                 "task_id": task.id,
@@ -428,18 +428,18 @@ async def get_search_tasks(note_id: str, db: Session = Depends(get_db)):
 async def generate_card(
     note_id: str,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     生成知识卡片
     """
     try:
         # 检查笔记是否存在
-        if not get_note(db, note_id):
+        if not await get_note(db, note_id):
             raise HTTPException(status_code=404, detail="笔记不存在")
         
         # 生成知识卡片
-        card = generate_knowledge_card(db, note_id)
+        card = await generate_knowledge_card(db, note_id)
         
         if not card:
             raise HTTPException(status_code=500, detail="生成知识卡片失败")
@@ -460,12 +460,12 @@ async def generate_card(
 
 # 获取知识卡片列表
 @router.get("/notes/{note_id}/knowledge-cards")
-async def get_cards(note_id: str, db: Session = Depends(get_db)):
+async def get_cards(note_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     获取笔记的所有知识卡片
     """
     try:
-        cards = get_knowledge_cards(db, note_id)
+        cards = await get_knowledge_cards(db, note_id)
         return [
             {
                 "card_id": card.id,
@@ -481,30 +481,22 @@ async def get_cards(note_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="获取知识卡片列表失败")
 
 # 后台任务函数
-def perform_ai_search_background(task_id: str):
+async def perform_ai_search_background(task_id: str):
     """
     执行AI搜索任务的后台函数
     """
-    from app.database.database import SessionLocal
-    
-    db = SessionLocal()
-    try:
-        perform_ai_search(db, task_id)
-    except Exception as e:
-        logger.error(f"后台执行AI搜索任务失败: {str(e)}")
-    finally:
-        db.close()
+    async with AsyncSessionLocal() as db:
+        try:
+            await perform_ai_search(db, task_id)
+        except Exception as e:
+            logger.error(f"后台执行AI搜索任务失败: {str(e)}")
 
-def generate_knowledge_card_background(note_id: str):
+async def generate_knowledge_card_background(note_id: str):
     """
     生成知识卡片的后台函数
     """
-    from app.database.database import SessionLocal
-    
-    db = SessionLocal()
-    try:
-        generate_knowledge_card(db, note_id)
-    except Exception as e:
-        logger.error(f"后台生成知识卡片失败: {str(e)}")
-    finally:
-        db.close()
\ No newline at end of file
+    async with AsyncSessionLocal() as db:
+        try:
+            await generate_knowledge_card(db, note_id)
+        except Exception as e:
+            logger.error(f"后台生成知识卡片失败: {str(e)}")
@@ -1,5 +1,4 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Depends
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Query, Request
 import os
 from dotenv import load_dotenv
 import uuid
@@ -7,9 +6,28 @@ import logging
 import requests
 import base64
 import json
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database.database import get_db
-from app.services.pdf_service import create_pdf_record, process_pdf, get_pdf_document, get_pdf_pages
+from app.database.database import AsyncSessionLocal, get_async_db
+from app.services.pdf_service import (
+    create_pdf_record, find_pdf_by_hash, clone_pdf_document, delete_pdf_document,
+    run_page_ocr_async, get_pdf_document_async, get_pdf_pages_async, get_pdf_page_async,
+    get_page_image_path_async, list_pdf_documents_async, count_pdf_documents_async,
+    get_document_meta_async, get_page_summaries_async, mark_page_processed
+)
+from app.services.job_queue import enqueue_job, enqueue_ocr_batch, get_batch_progress
+from app.database.models import JobStage, PDFPage, ProcessingStatus
+from app.services.ocr_cache import get_ocr_cache_stats
+from app.services.ocr_backends import get_ocr_backend, list_ocr_backends, OCRBackendError
+from app.services.search_service import index_page
+from app.services.metadata_cache import invalidate_on_commit
+from app.utils.file_storage import save_upload_stream, FileTooLargeError, InvalidUploadError
+from app.utils.image_variants import resolve_image_size, variant_media_type, variant_signature
+from app.utils.http_cache import cached_file_response, cached_bytes_response
+from app.utils.page_store import find_page_image, PackedImage
+from app.utils.image_encoding import encoding_for_path
 
 # 加载环境变量
 load_dotenv()
@@ -21,23 +39,45 @@ logger = logging.getLogger(__name__)
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "104857600"))  # 默认100MB
 
-@router.post("/upload")
+# 上传接口直接解析请求体，不声明 UploadFile 参数，在接口文档中单独说明请求格式
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}}
+                }
+            }
+        }
+    }
+}
+
+@router.post("/upload", openapi_extra=UPLOAD_REQUEST_BODY)
 async def upload_pdf(
-    file: UploadFile = File(...),
+    request: Request,
     background_tasks: BackgroundTasks = BackgroundTasks()
 ):
     """
-    上传PDF文件
+    上传PDF文件（multipart/form-data，文件字段名为 file）
     """
     # 检查文件类型
-    # if not file.filename.endswith('.pdf'):
+    # if not filename.endswith('.pdf'):
     #     raise HTTPException(status_code=400, detail="只支持PDF文件")
     
-    # 检查文件大小
-    contents = await file.read()
-    logger.info(f"文件大小: {len(contents)} 字节")
-    if len(contents) > MAX_FILE_SIZE:
+    # 从请求体流式写入临时文件，同时检查文件大小并计算哈希
+    try:
+        tmp_path, filename, file_size, content_hash = await save_upload_stream(request, UPLOAD_DIR, MAX_FILE_SIZE)
+    except FileTooLargeError:
         raise HTTPException(status_code = 413, detail=f"文件大小超过限制 ({MAX_FILE_SIZE / 1048576}MB)")
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"文件保存失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="文件保存失败")
+    logger.info(f"文件大小: {file_size} 字节, SHA-256: {content_hash}")
     
     # 生成唯一文件名
     file_id = str(uuid.uuid4())[0:8]
@@ -45,71 +85,86 @@ async def upload_pdf(
     
     # 保存文件
     try:
-        with open(file_path, "wb") as f:
-            f.write(contents)
-        
-        logger.info(f"文件上传成功: {file.filename} -> {file_id}.pdf")
-        
-        # 创建数据库记录
-        db = next(get_db())
-        try:
-            create_pdf_record(db, file_id, file.filename, file_path)
-            
-            # 添加后台任务处理PDF
-            # background_tasks.add_task(process_pdf_background, file_id, file_path)
-        finally:
-            db.close()
+        # 去重、复用和入队逻辑与工作进程共用同步实现，通过 run_sync 在异步会话上执行
+        async with AsyncSessionLocal() as db:
+            status = await db.run_sync(_register_upload, file_id, filename, tmp_path, file_path, content_hash)
         
         return {
             "file_id": file_id,
-            "original_filename": file.filename,
-            "status": "uploaded",
-            "message": "文件上传成功，等待处理"
+            "original_filename": filename,
+            "content_hash": content_hash,
+            "status": status,
+            "message": "文件上传成功，等待处理" if status == "uploaded" else "文件已存在，已复用处理结果"
         }
     except Exception as e:
         logger.error(f"文件保存失败: {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         raise HTTPException(status_code=500, detail="文件保存失败")
 
+def _register_upload(db: Session, file_id: str, filename: str, tmp_path: str, file_path: str, content_hash: str) -> str:
+    """
+    保存上传文件并创建文档记录，已有相同内容的文档时共享文件并复用处理结果
+    :return: 文档处理状态
+    """
+    # 已存在相同内容的文件时，共享已保存的文件，不再重复存储
+    existing = find_pdf_by_hash(db, content_hash)
+    if existing and os.path.exists(existing.file_path):
+        os.remove(tmp_path)
+        file_path = existing.file_path
+        logger.info(f"文件内容已存在: {filename} -> {file_id}, 共享文件 {file_path}")
+    else:
+        os.replace(tmp_path, file_path)
+        logger.info(f"文件上传成功: {filename} -> {file_id}.pdf")
+    
+    # 创建数据库记录
+    pdf_doc = create_pdf_record(db, file_id, filename, file_path, content_hash)
+    
+    # 已有处理完成的相同文档时，直接复用页面、图片和OCR结果
+    source = find_pdf_by_hash(db, content_hash, exclude_id=file_id, processed_only=True)
+    if source:
+        pdf_doc = clone_pdf_document(db, file_id, source)
+    else:
+        # 添加解析任务，由独立的工作进程处理（python worker.py）
+        enqueue_job(db, file_id, JobStage.PARSE)
+    return pdf_doc.status.value
+
 @router.get("/status/{file_id}")
-async def get_file_status(file_id: str, db: Session = Depends(get_db)):
+async def get_file_status(file_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     获取文件处理状态
     """
-    pdf_doc = get_pdf_document(db, file_id)
-    if not pdf_doc:
+    # 只查询状态和已处理页数，不读取页面记录（经过元数据缓存）
+    progress = await get_document_meta_async(db, file_id)
+    if not progress:
         raise HTTPException(status_code=404, detail="文件不存在")
     
-    # 获取页面信息
-    pages = get_pdf_pages(db, file_id)
-    
     return {
         "file_id": file_id,
-        "original_filename": pdf_doc.original_filename,
-        "status": pdf_doc.status.value,
-        "total_pages": pdf_doc.total_pages,
-        "pages_processed": len([p for p in pages if p.ocr_status]),
-        "error_message": pdf_doc.error_message,
-        "created_at": pdf_doc.created_at
+        "original_filename": progress.original_filename,
+        "status": progress.status.value,
+        "total_pages": progress.total_pages,
+        "pages_processed": progress.pages_processed,
+        "pages_rendered": progress.pages_rendered,
+        "error_message": progress.error_message,
+        "created_at": progress.created_at
     }
 
 @router.get("/ocr/{file_id}")
-async def get_ocr_results(file_id: str, page: int = None, db: Session = Depends(get_db)):
+async def get_ocr_results(file_id: str, page: int = None, db: AsyncSession = Depends(get_async_db)):
     """
     获取OCR识别结果
     
     - **file_id**: PDF文件ID
     - **page**: 页码（可选，不提供则返回所有页的结果）
     """
-    pdf_doc = get_pdf_document(db, file_id)
+    pdf_doc = await get_document_meta_async(db, file_id)
     if not pdf_doc:
         raise HTTPException(status_code=404, detail="文件不存在")
-    
-    # 获取页面信息
-    pages = get_pdf_pages(db, file_id)
-    
-    # 如果指定了页码，返回单页结果
+
+    # 如果指定了页码，只读取该页
     if page is not None:
-        target_page = next((p for p in pages if p.page_number == page), None)
+        target_page = await get_pdf_page_async(db, file_id, page, with_text=True)
         if not target_page:
             raise HTTPException(status_code=404, detail=f"页码 {page} 不存在")
         if not target_page.ocr_status:
@@ -119,17 +174,17 @@ async def get_ocr_results(file_id: str, page: int = None, db: Session = Depends(
             "file_id": file_id,
             "page": page,
             "text": target_page.ocr_text,
-            "processed_at": target_page.processed_at
+            "processed_at": target_page.updated_at or target_page.created_at
         }
     
-    # 返回所有页的结果
+    # 返回所有页的结果，识别文本在同一次查询中加载
     results = []
-    for p in pages:
+    for p in await get_pdf_pages_async(db, file_id, with_text=True):
         if p.ocr_status:
             results.append({
                 "page": p.page_number,
                 "text": p.ocr_text,
-                "processed_at": p.processed_at
+                "processed_at": p.updated_at or p.created_at
             })
     
     return {
@@ -141,56 +196,79 @@ async def get_ocr_results(file_id: str, page: int = None, db: Session = Depends(
     }
 
 @router.get("/list")
-async def get_pdf_files_list(db: Session = Depends(get_db)):
+async def get_pdf_files_list(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[ProcessingStatus] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    获取所有PDF文件列表
+    获取PDF文件列表
+    
+    返回上传的PDF文件信息，包括文件ID、原始文件名、处理状态等，按创建时间倒序分页
     
-    返回系统中所有上传的PDF文件信息，包括文件ID、原始文件名、处理状态等
+    - **limit**: 每页数量（1-200，默认50）
+    - **cursor**: 上一页返回的 next_cursor，不传表示第一页
+    - **status**: 只返回指定处理状态的文件
     """
-    from app.database.models import PDFDocument
+    try:
+        rows, next_cursor = await list_pdf_documents_async(db, limit, cursor, status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     try:
-        # 从数据库获取所有PDF记录，按创建时间倒序排列
-        pdf_documents = db.query(PDFDocument).order_by(PDFDocument.created_at.desc()).all()
-        
         # 构建响应数据
-        files_list = []
-        for doc in pdf_documents:
-            # 获取页面信息，计算已处理的页面数
-            pages = get_pdf_pages(db, doc.id)
-            pages_processed = len([p for p in pages if p.ocr_status])
-            
-            files_list.append({
-                "id": doc.id,
-                "original_filename": doc.original_filename,
-                "status": doc.status.value,
-                "total_pages": doc.total_pages,
-                "pages_processed": pages_processed,
-                "error_message": doc.error_message,
-                "created_at": doc.created_at,
-                "updated_at": doc.updated_at
-            })
+        files_list = [
+            {
+                "id": row.id,
+                "original_filename": row.original_filename,
+                "status": row.status.value,
+                "total_pages": row.total_pages,
+                "pages_processed": row.pages_processed,
+                "pages_rendered": row.pages_rendered,
+                "error_message": row.error_message,
+                "created_at": row.created_at,
+                "updated_at": row.updated_at
+            }
+            for row in rows
+        ]
         
         return {
-            "total": len(files_list),
-            "files": files_list
+            "total": await count_pdf_documents_async(db, status),
+            "files": files_list,
+            "next_cursor": next_cursor
         }
     except Exception as e:
         logger.error(f"获取PDF文件列表失败: {str(e)}")
         raise HTTPException(status_code=500, detail="获取文件列表失败")
 
+@router.get("/ocr-backends")
+async def get_ocr_backends():
+    """
+    列出可用的OCR后端及其模型、超时和并发配置
+    """
+    return {"backends": list_ocr_backends()}
+
+@router.get("/ocr-cache/stats")
+async def get_ocr_cache_statistics(db: AsyncSession = Depends(get_async_db)):
+    """
+    获取OCR缓存统计信息：条目数、总大小、命中/未命中次数和命中率
+    """
+    return await db.run_sync(get_ocr_cache_stats)
+
 @router.get("/{file_id}")
-async def download_pdf(file_id: str, db: Session = Depends(get_db)):
+async def download_pdf(file_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     下载PDF文件
     
-    通过文件ID直接返回PDF文件
+    通过文件ID直接返回PDF文件，支持条件请求（ETag/Last-Modified，返回304）和按字节范围请求（Range，返回206），
+    PDF查看器可以分段加载大文件
     
     - **file_id**: PDF文件ID
     """
     try:
         # 获取PDF文档信息
-        pdf_doc = get_pdf_document(db, file_id)
+        pdf_doc = await get_document_meta_async(db, file_id)
         if not pdf_doc:
             raise HTTPException(status_code=404, detail="文件不存在")
         
@@ -200,11 +278,14 @@ async def download_pdf(file_id: str, db: Session = Depends(get_db)):
             logger.error(f"文件路径不存在: {file_path}")
             raise HTTPException(status_code=404, detail="文件不存在于服务器")
         
-        # 返回文件
-        return FileResponse(
-            path=file_path,
-            filename=pdf_doc.original_filename,
-            media_type="application/pdf"
+        # 返回文件，文件ID对应的内容不会变化，有内容哈希时允许浏览器永久缓存
+        return cached_file_response(
+            request,
+            file_path,
+            content_key=(pdf_doc.content_hash,) if pdf_doc.content_hash else None,
+            immutable=bool(pdf_doc.content_hash),
+            media_type="application/pdf",
+            filename=pdf_doc.original_filename
         )
     except HTTPException:
         raise
@@ -218,29 +299,28 @@ class TextItem(BaseModel):
     page_number: int
 
 @router.post("/content/{file_id}")
-async def save_text(file_id: str, item: TextItem, db: Session = Depends(get_db)):
+async def save_text(file_id: str, item: TextItem, db: AsyncSession = Depends(get_async_db)):
     """
     - **file_id**: PDF文件ID
     - **content**: OCR识别内容
     """
     try:
-        from app.database.models import PDFPage
         from datetime import datetime
 
-        page = db.query(PDFPage).filter(
-            PDFPage.document_id == file_id,
-            PDFPage.page_number == item.page_number
-        ).first()
+        page = await get_pdf_page_async(db, file_id, item.page_number)
         
         # 检查文件是否存在
         if not page:
             raise HTTPException(status_code=404, detail=f"页码 {item.page_number} 不存在")
         
         page.ocr_text = item.content
-        page.ocr_status = True
         page.updated_at = datetime.now()
+        # 更新文档的已OCR页数和全文索引，提交后失效元数据缓存
+        await db.run_sync(mark_page_processed, page)
+        await db.run_sync(index_page, page)
+        invalidate_on_commit(db, file_id)
 
-        db.commit()
+        await db.commit()
         
         # 返回文件
         return {
@@ -255,7 +335,7 @@ async def save_text(file_id: str, item: TextItem, db: Session = Depends(get_db))
         raise HTTPException(status_code=500, detail="保存失败")
 
 @router.delete("/{file_id}")
-async def delete_pdf(file_id: str, db: Session = Depends(get_db)):
+async def delete_pdf(file_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     删除PDF文件
     
@@ -265,58 +345,34 @@ async def delete_pdf(file_id: str, db: Session = Depends(get_db)):
     """
     try:
         # 获取PDF文档信息
-        pdf_doc = get_pdf_document(db, file_id)
+        pdf_doc = await get_pdf_document_async(db, file_id)
         if not pdf_doc:
             raise HTTPException(status_code=404, detail="文件不存在")
         
-        # 删除物理文件
-        file_path = pdf_doc.file_path
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                logger.info(f"成功删除PDF文件: {file_path}")
-            except Exception as e:
-                logger.error(f"删除PDF文件失败: {str(e)}")
-        
-        # 删除相关的图片文件夹
-        image_dir = os.path.join("images", file_id)
-        if os.path.exists(image_dir) and os.path.isdir(image_dir):
-            try:
-                import shutil
-                shutil.rmtree(image_dir)
-                logger.info(f"成功删除图片文件夹: {image_dir}")
-            except Exception as e:
-                logger.error(f"删除图片文件夹失败: {str(e)}")
-        
-        # 从数据库删除记录
-        from app.database.models import PDFPage
-        # 先删除相关的页面记录
-        db.query(PDFPage).filter(PDFPage.document_id == file_id).delete()
-        # 再删除文档记录
-        db.delete(pdf_doc)
-        db.commit()
+        # 删除文档记录，按引用计数删除物理文件和图片
+        await db.run_sync(delete_pdf_document, pdf_doc)
         
-        logger.info(f"成功删除PDF文档记录: {file_id}")
         return {"message": "文件删除成功", "file_id": file_id}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"删除PDF文件失败: {str(e)}")
         raise HTTPException(status_code=500, detail="删除文件失败")
 
 @router.get("/{file_id}/info")
-async def get_pdf_info(file_id: str, db: Session = Depends(get_db)):
+async def get_pdf_info(file_id: str, include_text: bool = True, db: AsyncSession = Depends(get_async_db)):
     """
     获取PDF文件信息
     
     通过文件ID获取PDF文件路径和图片列表
     
     - **file_id**: PDF文件ID
+    - **include_text**: 是否返回各页识别文本，只需要页面列表和状态时传 false
     """
     try:
         # 获取PDF文档信息
-        pdf_doc = get_pdf_document(db, file_id)
+        pdf_doc = await get_document_meta_async(db, file_id)
         if not pdf_doc:
             raise HTTPException(status_code=404, detail="文件不存在")
         
@@ -324,9 +380,8 @@ async def get_pdf_info(file_id: str, db: Session = Depends(get_db)):
         file_path = pdf_doc.file_path
         file_exists = os.path.exists(file_path)
         
-        # 查询页面记录
-        from app.database.models import PDFPage
-        pages = db.query(PDFPage).filter(PDFPage.document_id == file_id).all()
+        # 查询页面摘要（按页码排序），不需要文本时不读取识别文本
+        pages = await get_page_summaries_async(db, file_id, include_text)
         
         # 构建页面数据列表
         pages_data = []
@@ -335,17 +390,14 @@ async def get_pdf_info(file_id: str, db: Session = Depends(get_db)):
                 "id": page.id,
                 "document_id": page.document_id,
                 "page_number": page.page_number,
-                "ocr_text": page.ocr_text,
-                "image_url": "images/"+page.image_path,
+                "ocr_text": page.ocr_text if include_text else None,
+                "image_url": f"/api/file/{file_id}/image/{page.page_number}",
                 "ocr_status": page.ocr_status,
                 # "processed_at": page.processed_at,
                 "created_at": page.created_at,
                 "updated_at": page.updated_at
             })
         
-        # 按页码排序
-        pages_data.sort(key=lambda x: x["page_number"])
-        
         # 构建响应数据
         return {
             "file_id": file_id,
@@ -367,18 +419,33 @@ async def get_pdf_info(file_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="获取文件信息失败")
 
 @router.get("/{file_id}/image/{page_number}")
-async def get_pdf_image(file_id: str, page_number: int, db: Session = Depends(get_db)):
+async def get_pdf_image(
+    file_id: str,
+    page_number: int,
+    request: Request,
+    size: Optional[str] = None,
+    w: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     获取PDF指定页的图片
     
-    通过文件ID和页码返回对应的图片
+    通过文件ID和页码返回对应的图片，不指定尺寸时返回原图（格式见 PAGE_IMAGE_FORMAT，默认PNG）
+    支持条件请求（ETag由文档内容哈希、页码和图片尺寸生成，返回304）和按字节范围请求
     
     - **file_id**: PDF文件ID
     - **page_number**: 页码（从1开始）
+    - **size**: 图片尺寸：thumb（缩略图）、screen（屏幕尺寸）、full（原尺寸），按 IMAGE_VARIANT_FORMAT 编码
+    - **w**: 需要的宽度（像素），返回宽度不小于该值的最小尺寸
     """
+    try:
+        image_size = resolve_image_size(size, w)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         # 获取PDF文档信息
-        pdf_doc = get_pdf_document(db, file_id)
+        pdf_doc = await get_document_meta_async(db, file_id)
         if not pdf_doc:
             raise HTTPException(status_code=404, detail="文件不存在")
         
@@ -389,33 +456,38 @@ async def get_pdf_image(file_id: str, page_number: int, db: Session = Depends(ge
                 detail=f"页码无效，有效范围是1-{pdf_doc.total_pages}"
             )
         
-        # 构建图片文件名和路径
-        image_filename = f"p_{page_number}.png"
-        image_dir = os.path.join("images", file_id)
-        image_path = os.path.join(image_dir, image_filename)
+        # 获取图片路径
+        image_path = await get_page_image_path_async(db, file_id, page_number, image_size)
         
         # 检查图片是否存在
-        if not os.path.exists(image_path):
-            # 尝试查找可能存在的图片文件（处理可能的命名差异）
-            found = False
-            if os.path.exists(image_dir) and os.path.isdir(image_dir):
-                for filename in os.listdir(image_dir):
-                    if filename.endswith(f"_p_{page_number}.png"):
-                        image_path = os.path.join(image_dir, filename)
-                        found = True
-                        break
-            
-            if not found:
-                raise HTTPException(
-                    status_code=404, 
-                    detail=f"第{page_number}页的图片不存在"
-                )
+        if not image_path:
+            raise HTTPException(
+                status_code=404, 
+                detail=f"第{page_number}页的图片不存在"
+            )
         
-        # 返回图片文件
-        return FileResponse(
-            path=image_path,
-            filename=image_filename,
-            media_type="image/png"
+        # 返回图片文件，打包存储的图片直接发送打包文件中的数据
+        content_key = (
+            pdf_doc.content_hash or file_id,
+            page_number,
+            variant_signature(image_size) if image_size else str(encoding_for_path(image_path))
+        )
+        media_type = variant_media_type() if image_size else encoding_for_path(image_path).media_type
+        image = find_page_image(image_path)
+        if image is None:
+            raise HTTPException(status_code=404, detail=f"第{page_number}页的图片不存在")
+        if isinstance(image, PackedImage):
+            return cached_bytes_response(
+                request, image.data, image.mtime, content_key,
+                media_type=media_type,
+                filename=os.path.basename(image_path)
+            )
+        return cached_file_response(
+            request,
+            image,
+            content_key=content_key,
+            media_type=media_type,
+            filename=os.path.basename(image_path)
         )
     except HTTPException:
         raise
@@ -423,43 +495,27 @@ async def get_pdf_image(file_id: str, page_number: int, db: Session = Depends(ge
         logger.error(f"获取PDF图片失败: {str(e)}")
         raise HTTPException(status_code=500, detail="获取图片失败")
 
-def process_pdf_background(file_id: str, file_path: str):
-    """
-    后台处理PDF的函数
-    """
-    db = next(get_db())
-    try:
-        process_pdf(db, file_id, file_path)
-    finally:
-        db.close()
-
 @router.post("/{file_id}/noocr/{page_number}")
-async def perform_ocr_on_page(file_id: str, page_number: int, db: Session = Depends(get_db)):
+async def perform_ocr_on_page(file_id: str, page_number: int, db: AsyncSession = Depends(get_async_db)):
     """
     标记为无需ocr
     """
     try:
-        # 从数据库中更新页面的OCR结果
-        from app.database.models import PDFPage
-
         # 获取PDF文档信息
-        pdf_doc = get_pdf_document(db, file_id)
+        pdf_doc = await get_pdf_document_async(db, file_id)
         if not pdf_doc:
             raise HTTPException(status_code=404, detail="文件不存在")
 
         # 查询现有页面记录
-        page = db.query(PDFPage).filter(
-            PDFPage.document_id == file_id,
-            PDFPage.page_number == page_number
-        ).first()
+        page = await get_pdf_page_async(db, file_id, page_number)
 
-        page.ocr_status = True
+        await db.run_sync(mark_page_processed, page)
 
-        db.commit()
+        await db.commit()
         return {"message": f"执行成功"}
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"OCR识别失败: {str(e)}")
         raise HTTPException(status_code=500, detail="OCR识别过程中发生错误")
 
@@ -467,33 +523,27 @@ async def perform_ocr_on_page(file_id: str, page_number: int, db: Session = Depe
 from pydantic import BaseModel
 class OcrItem(BaseModel):
     again: bool = False
+    use_cache: bool = True
+    backend: Optional[str] = None
 
 @router.post("/{file_id}/ocr/{page_number}")
-async def perform_ocr_on_page(file_id: str, page_number: int, item: OcrItem, db: Session = Depends(get_db)):
+async def perform_ocr_on_page(file_id: str, page_number: int, item: OcrItem, db: AsyncSession = Depends(get_async_db)):
     """
     对PDF指定页执行OCR识别
     
-    使用本地ollama接口和deepseek-ocr模型进行OCR识别
+    使用 backend 指定的OCR后端识别，未指定时使用 OCR_BACKEND 配置的默认后端
     
     - **file_id**: PDF文件ID
     - **page_number**: 页码（从1开始）
     """
     try:
-        # 从数据库中更新页面的OCR结果
-        from app.database.models import PDFPage, ProcessingStatus
-        from datetime import datetime
-        from app.services.ocr_service import lm_studio_ocr
-
         # 获取PDF文档信息
-        pdf_doc = get_pdf_document(db, file_id)
+        pdf_doc = await get_pdf_document_async(db, file_id)
         if not pdf_doc:
             raise HTTPException(status_code=404, detail="文件不存在")
 
         # 查询现有页面记录
-        page = db.query(PDFPage).filter(
-            PDFPage.document_id == file_id,
-            PDFPage.page_number == page_number
-        ).first()
+        page = await get_pdf_page_async(db, file_id, page_number)
 
         logger.info(item)
 
@@ -511,92 +561,25 @@ async def perform_ocr_on_page(file_id: str, page_number: int, item: OcrItem, db:
                 detail=f"页码无效，有效范围是1-{pdf_doc.total_pages}"
             )
         
-        # 构建图片文件名和路径
-        image_filename = f"p_{page_number}.png"
-        image_dir = os.path.join("images", file_id)
-        image_path = os.path.join(image_dir, image_filename)
+        # 获取图片路径
+        image_path = await get_page_image_path_async(db, file_id, page_number)
         
         # 检查图片是否存在
-        if not os.path.exists(image_path):
-            # 尝试查找可能存在的图片文件（处理可能的命名差异）
-            found = False
-            if os.path.exists(image_dir) and os.path.isdir(image_dir):
-                for filename in os.listdir(image_dir):
-                    if filename.endswith(f"_p_{page_number}.png"):
-                        image_path = os.path.join(image_dir, filename)
-                        found = True
-                        break
-            
-            if not found:
-                raise HTTPException(
-                    status_code=404, 
-                    detail=f"第{page_number}页的图片不存在"
-                )
-        
-        # 读取图片并转换为base64
-        with open(image_path, "rb") as image_file:
-            encoded_image = base64.b64encode(image_file.read()).decode("utf-8")
+        if not image_path:
+            raise HTTPException(
+                status_code=404, 
+                detail=f"第{page_number}页的图片不存在"
+            )
         
-        # 调用ollama接口
+        # 检查OCR后端
         try:
-            # 配置Ollama API URL
-            #ollama_url = os.getenv("OLLAMA_URL", "http://192.168.18.53:11434/api/generate")
-            # 初始化OpenAI客户端
-            # recognized_text = easy_ocr(image_path)
-            # recognized_text = ali_ocr(encoded_image)
-            # recognized_text = ollama_ocr(encoded_image)
-            recognized_text = lm_studio_ocr(encoded_image)
-                
-            # 确保识别文本不为空
-            if not recognized_text.strip():
-                logger.warning("OCR识别结果为空")
-            
-            try:
-                if page:
-                    # 更新已存在的页面记录
-                    page.ocr_text = recognized_text
-                    page.ocr_status = True
-                    page.processed_at = datetime.now()
-                    logger.info(f"准备更新页面 {page_number} 的OCR结果")
-                else:
-                    # 创建新的页面记录
-                    new_page = PDFPage(
-                        document_id=file_id,
-                        page_number=page_number,
-                        ocr_text=recognized_text,
-                        ocr_status=True,
-                        processed_at=datetime.now()
-                    )
-                    db.add(new_page)
-                    logger.info(f"准备创建页面 {page_number} 的OCR记录")
-                
-                # 检查是否所有页面都已完成OCR
-                total_pages = pdf_doc.total_pages
-                processed_pages = db.query(PDFPage).filter(
-                    PDFPage.document_id == file_id,
-                    PDFPage.ocr_status == True
-                ).count()
-                
-                # 如果所有页面都已处理，更新文档状态
-                if processed_pages >= total_pages:
-                    pdf_doc.status = ProcessingStatus.OCR_COMPLETED
-                    logger.info(f"文档 {file_id} 所有页面OCR已完成")
-                elif pdf_doc.status != ProcessingStatus.PROCESSING:
-                    # 如果还有页面未处理，确保状态为处理中
-                    pdf_doc.status = ProcessingStatus.PROCESSING
-                    logger.info(f"文档 {file_id} 更新为处理中状态")
-                
-                # 提交事务
-                db.commit()
-                logger.info(f"成功保存页面 {page_number} 的OCR结果到数据库")
-                logger.info(f"当前文档进度: {processed_pages}/{total_pages} 页已完成OCR")
-                
-            except Exception as e:
-                # 发生错误时回滚事务
-                db.rollback()
-                logger.error(f"保存OCR结果到数据库失败: {str(e)}")
-                # 重新抛出异常，让上层处理
-                raise
+            ocr_backend = get_ocr_backend(item.backend)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # 调用OCR接口并保存结果
+        try:
+            recognized_text = await run_page_ocr_async(db, pdf_doc, page_number, image_path, item.use_cache, ocr_backend.name)
             
             # 返回OCR结果
             return {
@@ -604,12 +587,14 @@ async def perform_ocr_on_page(file_id: str, page_number: int, item: OcrItem, db:
                 "page_number": page_number,
                 "original_filename": pdf_doc.original_filename,
                 "recognized_text": recognized_text,
+                "backend": ocr_backend.name,
+                "model": ocr_backend.model,
                 "status": "success",
                 "message": "OCR识别成功"
             }
             
-        except requests.exceptions.RequestException as e:
-            logger.error(f"OLLAMA API调用异常: {str(e)}")
+        except OCRBackendError as e:
+            logger.error(f"OCR后端调用异常: {str(e)}")
             raise HTTPException(
                 status_code=503,
                 detail=f"OCR服务连接失败: {str(e)}"
@@ -618,6 +603,94 @@ async def perform_ocr_on_page(file_id: str, page_number: int, item: OcrItem, db:
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"OCR识别失败: {str(e)}")
-        raise HTTPException(status_code=500, detail="OCR识别过程中发生错误")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="OCR识别过程中发生错误")
+
+
+class OcrBatchItem(BaseModel):
+    start_page: int = 1
+    end_page: Optional[int] = None
+    again: bool = False
+    backend: Optional[str] = None
+
+@router.post("/{file_id}/ocr-batch")
+async def start_ocr_batch(file_id: str, item: OcrBatchItem, db: AsyncSession = Depends(get_async_db)):
+    """
+    批量OCR识别整个文档或指定页码范围
+    
+    为每一页添加OCR任务，由工作进程按 OCR_MAX_IN_FLIGHT 控制并发执行
+    
+    - **file_id**: PDF文件ID
+    - **start_page**: 起始页码（从1开始，默认第1页）
+    - **end_page**: 结束页码（包含，默认最后一页）
+    - **again**: 是否重新识别已完成OCR的页面
+    - **backend**: OCR后端名称，默认使用 OCR_BACKEND 配置
+    """
+    try:
+        # 获取PDF文档信息
+        pdf_doc = await get_pdf_document_async(db, file_id)
+        if not pdf_doc:
+            raise HTTPException(status_code=404, detail="文件不存在")
+        if not pdf_doc.total_pages:
+            raise HTTPException(status_code=400, detail="文件尚未解析完成")
+
+        # 检查OCR后端
+        try:
+            ocr_backend = get_ocr_backend(item.backend)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # 验证页码范围
+        end_page = item.end_page or pdf_doc.total_pages
+        if item.start_page < 1 or end_page > pdf_doc.total_pages or item.start_page > end_page:
+            raise HTTPException(
+                status_code=400,
+                detail=f"页码范围无效，有效范围是1-{pdf_doc.total_pages}"
+            )
+
+        # 只为需要识别的页面添加任务
+        query = select(PDFPage.page_number).where(
+            PDFPage.document_id == file_id,
+            PDFPage.page_number >= item.start_page,
+            PDFPage.page_number <= end_page
+        )
+        if not item.again:
+            query = query.where(PDFPage.ocr_status == False)
+        page_numbers = list(await db.scalars(query.order_by(PDFPage.page_number)))
+
+        batch_id, queued = await db.run_sync(enqueue_ocr_batch, file_id, page_numbers, item.again, ocr_backend.name)
+        return {
+            "file_id": file_id,
+            "batch_id": batch_id,
+            "backend": ocr_backend.name,
+            "start_page": item.start_page,
+            "end_page": end_page,
+            "queued_pages": queued,
+            "status": "queued",
+            "message": "批量OCR任务已添加"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"添加批量OCR任务失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="添加批量OCR任务失败")
+
+@router.get("/{file_id}/ocr-batch/{batch_id}")
+async def get_ocr_batch_progress(file_id: str, batch_id: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    查询批量OCR任务进度
+    
+    - **file_id**: PDF文件ID
+    - **batch_id**: 批量任务ID
+    """
+    pdf_doc = await get_document_meta_async(db, file_id)
+    if not pdf_doc:
+        raise HTTPException(status_code=404, detail="文件不存在")
+
+    progress = await db.run_sync(get_batch_progress, batch_id)
+    if progress["total"] == 0:
+        raise HTTPException(status_code=404, detail="批量任务不存在")
+
+    return {"file_id": file_id, **progress}
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+import logging
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.database import get_async_db
+from app.services.search_service import search_pages_async
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    file_id: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    全文搜索PDF页面的识别文本
+    
+    返回按相关度排序的页面和高亮摘要（匹配内容用 <mark> 标记）
+    
+    - **q**: 搜索内容，多个词用空格分隔，需同时出现
+    - **file_id**: 只搜索指定文件（可选）
+    - **limit**: 返回数量（1-100，默认20）
+    - **offset**: 跳过的结果数，用于翻页
+    """
+    try:
+        results = await search_pages_async(db, q, limit, offset, file_id)
+        return {
+            "query": q,
+            "count": len(results),
+            "offset": offset,
+            "results": results
+        }
+    except Exception as e:
+        logger.error(f"全文搜索失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="搜索失败")
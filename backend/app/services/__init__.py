@@ -1,4 +1,7 @@
 # 服务层模块初始化文件
 from app.services.pdf_service import *
 from app.services.ocr_service import *
-from app.services.note_service import *
\ No newline at end of file
+from app.services.note_service import *
+from app.services.job_queue import *
+from app.services.ocr_backends import *
+from app.services.search_service import *
\ No newline at end of file
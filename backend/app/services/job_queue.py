@@ -0,0 +1,312 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import update, select, func, or_, and_
+from app.database.models import ProcessingJob, JobStage, JobStatus, ProcessingStatus
+from app.services.pdf_service import update_pdf_status
+from datetime import datetime, timedelta
+from typing import Optional, Iterable
+import os
+import uuid
+import random
+import socket
+import logging
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 任务最大尝试次数
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+# 可见性超时（秒）：任务被领取后超过该时间未完成，视为工作进程失联，可被重新领取
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "900"))
+# 任务执行期间续期可见性超时的间隔（秒），默认为可见性超时的1/3
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", str(JOB_VISIBILITY_TIMEOUT / 3)))
+# 重试退避的初始延迟和最大延迟（秒），按尝试次数指数增长
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "5"))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", "600"))
+# 同时执行的OCR任务数上限（所有工作进程合计），即对视觉模型服务的并发请求数
+OCR_MAX_IN_FLIGHT = int(os.getenv("OCR_MAX_IN_FLIGHT", "4"))
+
+# 各阶段同时运行的任务数上限，未列出的阶段不限制
+STAGE_LIMITS = {
+    JobStage.OCR: OCR_MAX_IN_FLIGHT,
+}
+
+def utcnow() -> datetime:
+    """
+    任务队列统一使用不带时区的UTC时间
+    """
+    return datetime.utcnow()
+
+def default_worker_id() -> str:
+    """
+    工作进程标识：主机名:进程号
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def retry_delay(attempts: int) -> float:
+    """
+    计算第attempts次失败后的重试延迟（指数退避 + 随机抖动）
+    """
+    delay = min(JOB_RETRY_MAX_DELAY, JOB_RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.5, 1.0)
+
+def enqueue_job(db: Session, document_id: str, stage: JobStage, payload: dict = None,
+                delay: float = 0, max_attempts: int = None, commit: bool = True,
+                batch_id: str = None) -> ProcessingJob:
+    """
+    向任务队列添加任务
+    :param document_id: PDF文档ID
+    :param stage: 处理阶段
+    :param payload: 阶段参数（如OCR页码）
+    :param delay: 延迟执行的秒数
+    :param max_attempts: 最大尝试次数
+    :param commit: 是否立即提交事务（与其他写操作在同一事务中提交时传False）
+    :param batch_id: 所属批量任务ID
+    """
+    job = ProcessingJob(
+        document_id=document_id,
+        stage=stage,
+        payload=payload or {},
+        batch_id=batch_id,
+        status=JobStatus.QUEUED,
+        attempts=0,
+        max_attempts=max_attempts or JOB_MAX_ATTEMPTS,
+        run_after=utcnow() + timedelta(seconds=delay)
+    )
+    db.add(job)
+    if commit:
+        db.commit()
+        db.refresh(job)
+    logger.info(f"添加任务: {document_id} - {stage.value} {payload or ''}")
+    return job
+
+def _claimable_filter(now: datetime):
+    """
+    可领取的任务：排队中且已到执行时间，或运行中但可见性超时已过期
+    """
+    return or_(
+        and_(ProcessingJob.status == JobStatus.QUEUED, ProcessingJob.run_after <= now),
+        and_(ProcessingJob.status == JobStatus.RUNNING, ProcessingJob.locked_until < now)
+    )
+
+def _running_count(stage: JobStage, now: datetime):
+    """
+    某阶段正在运行（可见性超时未过期）的任务数
+    """
+    return (
+        select(func.count(ProcessingJob.id))
+        .where(
+            ProcessingJob.stage == stage,
+            ProcessingJob.status == JobStatus.RUNNING,
+            ProcessingJob.locked_until >= now
+        )
+        .scalar_subquery()
+    )
+
+def claim_job(db: Session, worker_id: str = None, stages: Iterable[JobStage] = None,
+              visibility_timeout: int = None) -> Optional[ProcessingJob]:
+    """
+    领取一个可执行的任务
+    通过带条件的UPDATE实现原子领取，多个工作进程同时领取时每个任务只会被一个进程拿到
+    :param worker_id: 工作进程标识
+    :param stages: 只领取这些阶段的任务，默认全部
+    :param visibility_timeout: 可见性超时（秒）
+    :return: 领取到的任务，没有可执行任务时返回None
+    """
+    worker_id = worker_id or default_worker_id()
+    visibility_timeout = visibility_timeout or JOB_VISIBILITY_TIMEOUT
+
+    for _ in range(5):
+        now = utcnow()
+        query = db.query(ProcessingJob).filter(_claimable_filter(now))
+        if stages:
+            query = query.filter(ProcessingJob.stage.in_(list(stages)))
+        # 跳过已达到并发上限的阶段
+        saturated = [
+            stage for stage, limit in STAGE_LIMITS.items()
+            if db.execute(select(_running_count(stage, now))).scalar() >= limit
+        ]
+        if saturated:
+            query = query.filter(ProcessingJob.stage.notin_(saturated))
+        candidate = query.order_by(ProcessingJob.run_after, ProcessingJob.id).first()
+        if not candidate:
+            return None
+
+        # 超时的任务已用完重试次数时直接标记为失败
+        if candidate.status == JobStatus.RUNNING and candidate.attempts >= candidate.max_attempts:
+            error = f"任务执行超时 (worker={candidate.worker_id})"
+            result = db.execute(
+                update(ProcessingJob)
+                .where(ProcessingJob.id == candidate.id, _claimable_filter(now))
+                .values(status=JobStatus.FAILED, locked_until=None, last_error=error)
+            )
+            db.commit()
+            if result.rowcount == 1:
+                logger.error(f"任务执行超时且重试次数已用完: {candidate.id}")
+                # 与执行失败相同，文档处理流程的任务最终失败时标记文档状态为错误
+                if candidate.stage != JobStage.OCR:
+                    update_pdf_status(db, candidate.document_id, ProcessingStatus.ERROR, f"PDF处理失败: {error}")
+            continue
+
+        # 领取条件中再次检查并发上限，保证多个进程同时领取时也不会超出
+        conditions = [ProcessingJob.id == candidate.id, _claimable_filter(now)]
+        if candidate.stage in STAGE_LIMITS:
+            conditions.append(_running_count(candidate.stage, now) < STAGE_LIMITS[candidate.stage])
+        result = db.execute(
+            update(ProcessingJob)
+            .where(*conditions)
+            .values(
+                status=JobStatus.RUNNING,
+                attempts=ProcessingJob.attempts + 1,
+                locked_until=now + timedelta(seconds=visibility_timeout),
+                worker_id=worker_id
+            )
+        )
+        db.commit()
+        if result.rowcount == 1:
+            job = db.query(ProcessingJob).filter(ProcessingJob.id == candidate.id).first()
+            logger.info(f"领取任务: {job.id} - {job.document_id} {job.stage.value} (第{job.attempts}次)")
+            return job
+        # 被其他工作进程抢先领取，重新查找
+    return None
+
+def _lease_filter(job_id: int, worker_id: str):
+    """
+    任务仍由该工作进程持有：状态为运行中且领取者未变（可见性超时后被其他进程重新领取时不成立）
+    """
+    return and_(
+        ProcessingJob.id == job_id,
+        ProcessingJob.worker_id == worker_id,
+        ProcessingJob.status == JobStatus.RUNNING
+    )
+
+def extend_job(db: Session, job_id: int, worker_id: str, visibility_timeout: int = None) -> bool:
+    """
+    延长任务的可见性超时（长时间运行的任务定期调用）
+    :return: 任务是否仍由该工作进程持有
+    """
+    result = db.execute(
+        update(ProcessingJob)
+        .where(_lease_filter(job_id, worker_id))
+        .values(locked_until=utcnow() + timedelta(seconds=visibility_timeout or JOB_VISIBILITY_TIMEOUT))
+    )
+    db.commit()
+    return result.rowcount == 1
+
+def complete_job(db: Session, job: ProcessingJob, worker_id: str) -> bool:
+    """
+    标记任务完成，与处理函数未提交的修改（如添加的下一阶段任务）在同一事务中提交
+    任务已不由该工作进程持有（执行超时后被重新领取）时放弃结果，回滚未提交的修改
+    :param worker_id: 领取任务时的工作进程标识
+    :return: 是否标记成功
+    """
+    job_id, stage = job.id, job.stage
+    result = db.execute(
+        update(ProcessingJob)
+        .where(_lease_filter(job_id, worker_id))
+        .values(status=JobStatus.COMPLETED, locked_until=None, last_error=None)
+    )
+    if result.rowcount != 1:
+        db.rollback()
+        logger.warning(f"任务已被其他工作进程重新领取，放弃执行结果: {job_id} - {stage.value}")
+        return False
+    db.commit()
+    logger.info(f"任务完成: {job_id} - {job.document_id} {stage.value}")
+    return True
+
+def fail_job(db: Session, job: ProcessingJob, error: str, worker_id: str) -> Optional[JobStatus]:
+    """
+    记录任务失败：未达到最大尝试次数时按指数退避重新排队，否则标记为失败
+    :param worker_id: 领取任务时的工作进程标识
+    :return: 任务的新状态；任务已不由该工作进程持有时不修改，返回None
+    """
+    job_id, stage = job.id, job.stage
+    values = {"last_error": error, "locked_until": None}
+    if job.attempts < job.max_attempts:
+        delay = retry_delay(job.attempts)
+        values.update(status=JobStatus.QUEUED, run_after=utcnow() + timedelta(seconds=delay))
+    else:
+        values.update(status=JobStatus.FAILED)
+    result = db.execute(
+        update(ProcessingJob)
+        .where(_lease_filter(job_id, worker_id))
+        .values(**values)
+    )
+    db.commit()
+    if result.rowcount != 1:
+        logger.warning(f"任务已被其他工作进程重新领取，不记录失败: {job_id} - {stage.value}, 错误: {error}")
+        return None
+    if values["status"] == JobStatus.QUEUED:
+        logger.warning(f"任务失败，{delay:.1f}秒后重试: {job_id} - {stage.value}, 错误: {error}")
+    else:
+        logger.error(f"任务失败且重试次数已用完: {job_id} - {stage.value}, 错误: {error}")
+    return values["status"]
+
+def get_document_jobs(db: Session, document_id: str) -> list[ProcessingJob]:
+    """
+    获取文档的所有任务
+    """
+    return db.query(ProcessingJob).filter(
+        ProcessingJob.document_id == document_id
+    ).order_by(ProcessingJob.id).all()
+
+def enqueue_ocr_batch(db: Session, document_id: str, page_numbers: Iterable[int], again: bool = False, backend: str = None) -> tuple:
+    """
+    为文档的多个页面批量添加OCR任务，已在队列中或正在执行的页面不重复添加
+    :param document_id: PDF文档ID
+    :param page_numbers: 页码列表（从1开始）
+    :param again: 是否重新识别已完成OCR的页面
+    :param backend: OCR后端名称，None表示使用默认后端
+    :return: (批量任务ID, 新添加的任务数)
+    """
+    pending_pages = set()
+    for (payload,) in db.query(ProcessingJob.payload).filter(
+        ProcessingJob.document_id == document_id,
+        ProcessingJob.stage == JobStage.OCR,
+        ProcessingJob.status.in_([JobStatus.QUEUED, JobStatus.RUNNING])
+    ):
+        if payload and "page_number" in payload:
+            pending_pages.add(int(payload["page_number"]))
+
+    batch_id = str(uuid.uuid4())[:8]
+    queued = 0
+    for page_number in page_numbers:
+        if page_number in pending_pages:
+            continue
+        enqueue_job(db, document_id, JobStage.OCR, {"page_number": page_number, "again": again, "backend": backend},
+                    commit=False, batch_id=batch_id)
+        queued += 1
+    db.commit()
+    logger.info(f"添加批量OCR任务: {document_id} - 批次 {batch_id}, 共 {queued} 页")
+    return batch_id, queued
+
+def get_batch_progress(db: Session, batch_id: str) -> dict:
+    """
+    统计批量任务的执行进度
+    :return: 各状态任务数、完成比例以及失败页面的错误信息
+    """
+    counts = {status.value: 0 for status in JobStatus}
+    for status, count in db.query(ProcessingJob.status, func.count(ProcessingJob.id)).filter(
+        ProcessingJob.batch_id == batch_id
+    ).group_by(ProcessingJob.status):
+        counts[status.value] = count
+
+    total = sum(counts.values())
+    finished = counts[JobStatus.COMPLETED.value] + counts[JobStatus.FAILED.value]
+    errors = [
+        {"page_number": (job.payload or {}).get("page_number"), "error": job.last_error}
+        for job in db.query(ProcessingJob).filter(
+            ProcessingJob.batch_id == batch_id,
+            ProcessingJob.status == JobStatus.FAILED
+        ).order_by(ProcessingJob.id)
+    ]
+    return {
+        "batch_id": batch_id,
+        "total": total,
+        **counts,
+        "progress": round(finished / total * 100, 2) if total else 100.0,
+        "finished": total > 0 and finished == total,
+        "errors": errors
+    }
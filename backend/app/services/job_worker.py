@@ -0,0 +1,174 @@
+from sqlalchemy.orm import Session
+from app.database.database import SessionLocal
+from app.database.models import PDFPage, ProcessingJob, JobStage, JobStatus, ProcessingStatus
+from app.services.job_queue import (
+    enqueue_job, claim_job, extend_job, complete_job, fail_job, default_worker_id, JOB_HEARTBEAT_INTERVAL
+)
+from app.services.pdf_service import (
+    get_pdf_document, update_pdf_status, parse_pdf_stage, classify_pdf_stage, render_pdf_stage,
+    get_page_image_path, run_page_ocr, has_pending_twin
+)
+import os
+import logging
+import threading
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 没有任务时的轮询间隔（秒）
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# 相同内容的文档正在处理时，解析任务推迟的间隔（秒）和最多推迟次数
+JOB_TWIN_WAIT_DELAY = float(os.getenv("JOB_TWIN_WAIT_DELAY", "30"))
+JOB_TWIN_WAIT_LIMIT = int(os.getenv("JOB_TWIN_WAIT_LIMIT", "20"))
+
+def handle_parse(db: Session, job: ProcessingJob, pdf_doc) -> None:
+    """
+    解析阶段完成后添加分类任务（复用已有结果时流程结束）
+    相同内容的文档正在处理时推迟解析，等待其完成后直接复用结果
+    """
+    waits = (job.payload or {}).get("twin_waits", 0)
+    if waits < JOB_TWIN_WAIT_LIMIT and has_pending_twin(db, pdf_doc):
+        logger.info(f"相同内容的文档正在处理，推迟解析: {pdf_doc.id}")
+        enqueue_job(db, pdf_doc.id, JobStage.PARSE, {"twin_waits": waits + 1},
+                    delay=JOB_TWIN_WAIT_DELAY, commit=False)
+        return
+
+    if parse_pdf_stage(db, pdf_doc.id, pdf_doc.file_path):
+        enqueue_job(db, pdf_doc.id, JobStage.CLASSIFY, commit=False)
+
+def handle_classify(db: Session, job: ProcessingJob, pdf_doc) -> None:
+    """
+    分类阶段完成后添加渲染任务
+    """
+    classify_pdf_stage(db, pdf_doc.id, pdf_doc.file_path)
+    enqueue_job(db, pdf_doc.id, JobStage.RENDER, commit=False)
+
+def handle_render(db: Session, job: ProcessingJob, pdf_doc) -> None:
+    render_pdf_stage(db, pdf_doc.id, pdf_doc.file_path)
+
+def handle_ocr(db: Session, job: ProcessingJob, pdf_doc) -> None:
+    """
+    对任务参数中指定的页面执行OCR，已识别的页面除非要求重新识别否则跳过
+    """
+    payload = job.payload or {}
+    page_number = int(payload["page_number"])
+
+    page = db.query(PDFPage).filter(
+        PDFPage.document_id == pdf_doc.id,
+        PDFPage.page_number == page_number
+    ).first()
+    if not page:
+        raise ValueError(f"页码 {page_number} 不存在")
+    if page.ocr_status and not payload.get("again"):
+        logger.info(f"第{page_number}页已被处理，跳过: {pdf_doc.id}")
+        return
+
+    image_path = get_page_image_path(db, pdf_doc.id, page_number)
+    if not image_path:
+        raise FileNotFoundError(f"第{page_number}页的图片不存在")
+    run_page_ocr(db, pdf_doc, page_number, image_path, payload.get("use_cache", True), payload.get("backend"))
+
+# 各阶段的处理函数
+STAGE_HANDLERS = {
+    JobStage.PARSE: handle_parse,
+    JobStage.CLASSIFY: handle_classify,
+    JobStage.RENDER: handle_render,
+    JobStage.OCR: handle_ocr,
+}
+
+def _heartbeat(job_id: int, worker_id: str, stop_event: threading.Event) -> None:
+    """
+    任务执行期间定期续期可见性超时，避免长时间运行的任务（如大文档渲染）被其他工作进程重新领取
+    使用独立的会话，不影响执行任务的会话中的事务
+    """
+    while not stop_event.wait(JOB_HEARTBEAT_INTERVAL):
+        db = SessionLocal()
+        try:
+            if not extend_job(db, job_id, worker_id):
+                logger.warning(f"任务已不由当前工作进程持有，停止续期: {job_id} ({worker_id})")
+                return
+        except Exception as e:
+            # 数据库暂时不可用（如被写锁占用），下次再续期
+            logger.error(f"任务续期失败: {job_id}, 错误: {str(e)}")
+        finally:
+            db.close()
+
+def execute_job(db: Session, job: ProcessingJob) -> None:
+    """
+    执行一个已领取的任务，并记录完成或失败
+    执行期间由心跳线程续期；任务超时后被其他工作进程重新领取时，本次的执行结果不再记录
+    """
+    # 领取时的工作进程标识，执行过程中提交事务后重新加载的任务可能已被其他进程领取
+    worker_id = job.worker_id
+    stop_event = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job.id, worker_id, stop_event), daemon=True)
+    heartbeat.start()
+    try:
+        pdf_doc = get_pdf_document(db, job.document_id)
+        if not pdf_doc:
+            # 文档已被删除，任务无需执行
+            logger.warning(f"任务对应的文档不存在: {job.id} - {job.document_id}")
+        else:
+            STAGE_HANDLERS[job.stage](db, job, pdf_doc)
+        complete_job(db, job, worker_id)
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"任务执行失败: {job.id} - {job.document_id} {job.stage.value}")
+        status = fail_job(db, job, str(e), worker_id)
+        # 文档处理流程的任务最终失败时，标记文档状态为错误
+        if status == JobStatus.FAILED and job.stage != JobStage.OCR:
+            update_pdf_status(db, job.document_id, ProcessingStatus.ERROR, f"PDF处理失败: {str(e)}")
+    finally:
+        stop_event.set()
+        heartbeat.join()
+
+def run_once(worker_id: str = None, stages=None) -> bool:
+    """
+    领取并执行一个任务
+    :return: 是否执行了任务
+    """
+    db = SessionLocal()
+    try:
+        job = claim_job(db, worker_id, stages)
+        if not job:
+            return False
+        execute_job(db, job)
+        return True
+    finally:
+        db.close()
+
+def run_worker(worker_id: str = None, stages=None, stop_event: threading.Event = None, threads: int = 1) -> None:
+    """
+    工作进程主循环：持续领取并执行任务，没有任务时按轮询间隔等待
+    :param threads: 执行任务的线程数，OCR等以等待远程服务为主的阶段可以用多线程提高并发
+    """
+    worker_id = worker_id or default_worker_id()
+    stop_event = stop_event or threading.Event()
+
+    def loop(thread_id: str):
+        logger.info(f"任务工作线程启动: {thread_id}")
+        while not stop_event.is_set():
+            try:
+                if not run_once(thread_id, stages):
+                    stop_event.wait(JOB_POLL_INTERVAL)
+            except Exception as e:
+                # 数据库暂时不可用等异常，等待后继续
+                logger.error(f"任务工作进程异常: {str(e)}")
+                stop_event.wait(JOB_POLL_INTERVAL)
+        logger.info(f"任务工作线程退出: {thread_id}")
+
+    if threads <= 1:
+        loop(worker_id)
+        return
+
+    workers = [
+        threading.Thread(target=loop, args=(f"{worker_id}#{i}",), daemon=True)
+        for i in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
@@ -0,0 +1,491 @@
+"""
+文档和页面元数据的读穿透缓存
+
+状态轮询、文件信息和页面图片请求每次都要读取文档和页面记录，这些数据只在上传、处理、
+保存OCR结果和删除时变化。这里在进程内缓存查询结果（不可变的行对象，不缓存ORM对象），
+条目在TTL后过期，写入路径提交事务后按文档主动失效。
+
+多个API进程各自持有缓存，失效消息通过失效总线（METADATA_CACHE_BUS）在进程间传递：
+- local: 只在本进程内失效，适用于单进程部署，其他进程写入后最多等待TTL
+- sqlite: 失效记录写入单独的SQLite文件，各进程按 METADATA_CACHE_POLL_INTERVAL 读取新记录
+- file: 失效记录追加到日志文件，各进程按偏移量读取新增的行
+工作进程写入后同样发布失效消息，API进程读取缓存前检查总线。
+总线的读写在后台线程中执行（发布由发布线程完成，异步读取路径在线程池中检查总线），
+等待总线文件的锁时不会阻塞事件循环。
+"""
+import os
+import time
+import queue
+import asyncio
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 是否启用元数据缓存
+METADATA_CACHE_ENABLED = os.getenv("METADATA_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# 缓存条目的有效期（秒），没有收到失效消息时最多返回这么久之前的数据
+METADATA_CACHE_TTL = float(os.getenv("METADATA_CACHE_TTL", "30"))
+# 最多缓存的条目数，超过时淘汰最久未访问的条目
+METADATA_CACHE_MAX_ENTRIES = int(os.getenv("METADATA_CACHE_MAX_ENTRIES", "10000"))
+# 进程间失效总线：local / sqlite / file
+METADATA_CACHE_BUS = os.getenv("METADATA_CACHE_BUS", "sqlite").lower()
+# 总线文件路径，默认按总线类型放在当前目录
+METADATA_CACHE_BUS_PATH = os.getenv("METADATA_CACHE_BUS_PATH")
+# 检查总线新消息的最小间隔（秒）
+METADATA_CACHE_POLL_INTERVAL = float(os.getenv("METADATA_CACHE_POLL_INTERVAL", "0.5"))
+
+class InvalidationBus:
+    """
+    进程间失效总线基类
+    publish 发布已变化的文档ID，poll 返回其他进程（以及本进程）发布的新消息
+    """
+
+    name = ""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+
+    def publish(self, keys: Iterable[str]) -> None:
+        raise NotImplementedError
+
+    def poll(self) -> Optional[List[str]]:
+        """
+        :return: 上次读取后新发布的文档ID；可能丢失了消息（总线被清理或轮转）时返回None，调用方应清空缓存
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+class LocalBus(InvalidationBus):
+    """
+    进程内总线：不在进程间传递消息
+    """
+
+    name = "local"
+
+    def publish(self, keys: Iterable[str]) -> None:
+        pass
+
+    def poll(self) -> Optional[List[str]]:
+        return []
+
+class SQLiteBus(InvalidationBus):
+    """
+    SQLite总线：失效记录写入单独的数据库文件（不占用业务数据库的写锁），按自增ID读取新记录
+    超过保留时间的记录在发布时清理
+    """
+
+    name = "sqlite"
+    default_path = "./metadata_cache_bus.db"
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__(path or self.default_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # 保留时间远大于轮询间隔和TTL，正常运行的进程不会错过记录
+        self.retention = max(60.0, METADATA_CACHE_TTL * 10)
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._last_id = 0
+        self._last_prune = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        第一次使用时打开总线数据库（调用方需持有锁），只读取此后发布的消息
+        """
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_invalidations ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, doc_key TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._last_id = connection.execute("SELECT COALESCE(MAX(id), 0) FROM cache_invalidations").fetchone()[0]
+            self._connection = connection
+        return self._connection
+
+    def publish(self, keys: Iterable[str]) -> None:
+        now = time.time()
+        rows = [(key, now) for key in keys]
+        if not rows:
+            return
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.executemany("INSERT INTO cache_invalidations (doc_key, created_at) VALUES (?, ?)", rows)
+                if now - self._last_prune > self.retention / 2:
+                    connection.execute("DELETE FROM cache_invalidations WHERE created_at < ?", (now - self.retention,))
+                    self._last_prune = now
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def poll(self) -> Optional[List[str]]:
+        with self._lock:
+            if self._connection is None:
+                self._connect()
+                return []
+            rows = self._connection.execute(
+                "SELECT id, doc_key FROM cache_invalidations WHERE id > ? ORDER BY id", (self._last_id,)
+            ).fetchall()
+            if not rows:
+                return []
+            # 第一条新记录与上次读取的位置不连续：中间的记录已被清理
+            missed = rows[0][0] > self._last_id + 1 and self._last_id > 0
+            self._last_id = rows[-1][0]
+        return None if missed else [key for _, key in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+class FileBus(InvalidationBus):
+    """
+    文件总线：每条失效记录追加一行到日志文件（O_APPEND单次写入，多个进程同时追加不会交错），
+    各进程记录读取偏移量；文件超过大小上限时由发布方轮转，其他进程发现文件被替换后清空缓存
+    """
+
+    name = "file"
+    default_path = "./metadata_cache_bus.log"
+    max_bytes = 1024 * 1024
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__(path or self.default_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._inode, self._offset = self._stat()
+
+    def _stat(self) -> tuple:
+        try:
+            stat = os.stat(self.path)
+            return stat.st_ino, stat.st_size
+        except FileNotFoundError:
+            return None, 0
+
+    def publish(self, keys: Iterable[str]) -> None:
+        data = "".join(f"{key}\n" for key in keys).encode("utf-8")
+        if not data:
+            return
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > self.max_bytes:
+            try:
+                os.replace(self.path, self.path + ".1")
+            except FileNotFoundError:
+                # 其他进程已轮转
+                pass
+
+    def poll(self) -> Optional[List[str]]:
+        with self._lock:
+            inode, size = self._stat()
+            if inode != self._inode or size < self._offset:
+                if self._inode is None and self._offset == 0:
+                    # 总线文件首次创建，从头读取
+                    self._inode = inode
+                else:
+                    # 文件被轮转或替换，无法确认错过了哪些消息
+                    self._inode, self._offset = inode, size
+                    return None
+            if size == self._offset:
+                return []
+            try:
+                with open(self.path, "rb") as bus_file:
+                    bus_file.seek(self._offset)
+                    data = bus_file.read(size - self._offset)
+            except FileNotFoundError:
+                # 刚被轮转，下次读取时按文件替换处理
+                return []
+            # 只处理完整的行，未写完的行留到下次读取
+            end = data.rfind(b"\n") + 1
+            self._offset += end
+        return data[:end].decode("utf-8").splitlines()
+
+# 总线名称 -> 总线类
+INVALIDATION_BUSES: Dict[str, type] = {}
+
+def register_invalidation_bus(bus_class: type) -> type:
+    """
+    注册失效总线，同名总线会被替换
+    """
+    INVALIDATION_BUSES[bus_class.name] = bus_class
+    return bus_class
+
+for _bus_class in (LocalBus, SQLiteBus, FileBus):
+    register_invalidation_bus(_bus_class)
+
+def create_invalidation_bus(name: str = None, path: str = None) -> InvalidationBus:
+    """
+    按名称创建失效总线，未指定时使用 METADATA_CACHE_BUS 配置
+    """
+    name = name or METADATA_CACHE_BUS
+    bus_class = INVALIDATION_BUSES.get(name)
+    if bus_class is None:
+        raise ValueError(f"未知的缓存失效总线: {name}，可选: {', '.join(INVALIDATION_BUSES)}")
+    return bus_class(path or METADATA_CACHE_BUS_PATH)
+
+class MetadataCache:
+    """
+    带TTL的LRU缓存，键的第一项为文档ID，按文档整体失效
+    读取后写入缓存前检查加载期间文档是否被失效，避免把失效前读到的旧数据放回缓存
+    """
+
+    def __init__(self, ttl: float, max_entries: int, bus: InvalidationBus = None, poll_interval: float = 0.5):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.bus = bus or LocalBus()
+        self.poll_interval = poll_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # 键 -> (过期时间, 值)，按访问时间从旧到新排列
+        self._invalidated_at: Dict[str, float] = {}  # 文档ID -> 最近一次失效的时间
+        self._cleared_at = 0.0
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+        self._publish_queue = queue.Queue()
+        self._publisher: Optional[threading.Thread] = None
+
+    def _poll_due(self) -> bool:
+        """
+        是否到了检查总线的时间（到时间时记录本次检查）
+        """
+        now = time.monotonic()
+        if now - self._last_poll < self.poll_interval:
+            return False
+        self._last_poll = now
+        return True
+
+    def _poll_bus(self) -> None:
+        """
+        读取总线上的失效消息
+        """
+        try:
+            keys = self.bus.poll()
+        except Exception as e:
+            logger.error(f"读取缓存失效总线失败: {str(e)}")
+            keys = None
+        if keys is None:
+            self.clear()
+        elif keys:
+            self._invalidate_local(keys)
+
+    def get(self, key: tuple) -> Any:
+        """
+        查询缓存，命中时更新访问顺序
+        :return: 缓存的值，未命中或已过期返回None
+        """
+        if self._poll_due():
+            self._poll_bus()
+        return self._lookup(key)
+
+    async def get_async(self, key: tuple) -> Any:
+        """
+        get的异步版本，在线程池中检查总线
+        """
+        if self._poll_due():
+            await asyncio.to_thread(self._poll_bus)
+        return self._lookup(key)
+
+    def _lookup(self, key: tuple) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, value: Any, loaded_at: float) -> None:
+        """
+        写入缓存；loaded_at 之后文档被失效过（或加载耗时超过TTL）时不写入
+        :param loaded_at: 开始读取数据库的时间（time.monotonic）
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - loaded_at > self.ttl or loaded_at <= self._cleared_at:
+                return
+            if self._invalidated_at.get(key[0], 0.0) >= loaded_at:
+                return
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key: tuple, load: Callable[[], Any]) -> Any:
+        """
+        读取缓存，未命中时调用load读取并写入缓存（结果为None时不缓存）
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        loaded_at = time.monotonic()
+        value = load()
+        if value is not None:
+            self.put(key, value, loaded_at)
+        return value
+
+    async def get_or_load_async(self, key: tuple, load: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        get_or_load的异步版本，load返回可等待对象
+        """
+        value = await self.get_async(key)
+        if value is not None:
+            return value
+        loaded_at = time.monotonic()
+        value = await load()
+        if value is not None:
+            self.put(key, value, loaded_at)
+        return value
+
+    def _invalidate_local(self, file_ids: Iterable[str]) -> None:
+        now = time.monotonic()
+        file_ids = set(file_ids)
+        with self._lock:
+            for file_id in file_ids:
+                self._invalidated_at[file_id] = now
+            for key in [key for key in self._entries if key[0] in file_ids]:
+                del self._entries[key]
+            # 超过TTL的失效时间不再影响写入判断（加载超过TTL的结果本来就不写入）
+            if len(self._invalidated_at) > self.max_entries:
+                self._invalidated_at = {
+                    file_id: at for file_id, at in self._invalidated_at.items() if now - at <= self.ttl
+                }
+
+    def invalidate(self, file_ids: Iterable[str]) -> None:
+        """
+        失效文档的所有缓存条目，并通过总线通知其他进程（由发布线程发布，不等待写入总线）
+        """
+        file_ids = list(file_ids)
+        if not file_ids:
+            return
+        self._invalidate_local(file_ids)
+        with self._lock:
+            if self._publisher is None:
+                self._publisher = threading.Thread(target=self._run_publisher, name="metadata-cache-publisher", daemon=True)
+                self._publisher.start()
+        self._publish_queue.put(file_ids)
+
+    def _run_publisher(self) -> None:
+        """
+        发布线程：按顺序发布失效消息，等待期间积压的消息合并为一次写入
+        """
+        while True:
+            file_ids = self._publish_queue.get()
+            if file_ids is None:
+                return
+            stopping = False
+            while True:
+                try:
+                    more = self._publish_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    stopping = True
+                    break
+                file_ids.extend(more)
+            try:
+                self.bus.publish(dict.fromkeys(file_ids))
+            except Exception as e:
+                # 发布失败时其他进程的缓存在TTL后过期
+                logger.error(f"发布缓存失效消息失败: {str(e)}")
+            if stopping:
+                return
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        发布尚未发布的失效消息并关闭总线（进程退出前调用）
+        """
+        with self._lock:
+            publisher, self._publisher = self._publisher, None
+        if publisher is not None:
+            self._publish_queue.put(None)
+            publisher.join(timeout)
+        self.bus.close()
+
+    def clear(self) -> None:
+        """
+        清空本进程的缓存
+        """
+        with self._lock:
+            self._entries.clear()
+            self._invalidated_at.clear()
+            self._cleared_at = time.monotonic()
+
+    def stats(self) -> dict:
+        """
+        缓存统计：条目数、命中/未命中次数和命中率
+        """
+        total = self.hits + self.misses
+        return {
+            "bus": self.bus.name,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+# 全局元数据缓存实例
+metadata_cache = MetadataCache(
+    METADATA_CACHE_TTL,
+    METADATA_CACHE_MAX_ENTRIES,
+    create_invalidation_bus(),
+    METADATA_CACHE_POLL_INTERVAL
+)
+
+def cached(key: tuple, load: Callable[[], Any]) -> Any:
+    """
+    通过元数据缓存读取，未启用缓存时直接调用load
+    """
+    if not METADATA_CACHE_ENABLED:
+        return load()
+    return metadata_cache.get_or_load(key, load)
+
+async def cached_async(key: tuple, load: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    cached的异步版本
+    """
+    if not METADATA_CACHE_ENABLED:
+        return await load()
+    return await metadata_cache.get_or_load_async(key, load)
+
+_PENDING_KEY = "metadata_cache_invalidate"
+
+def invalidate_on_commit(db: Session, file_id: str) -> None:
+    """
+    记录会话中修改过的文档，事务提交后再失效缓存并发布失效消息
+    （提交前失效时，其他请求可能在提交前重新缓存旧数据）；事务回滚时丢弃
+    """
+    db.info.setdefault(_PENDING_KEY, set()).add(file_id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    file_ids = session.info.pop(_PENDING_KEY, None)
+    if file_ids and METADATA_CACHE_ENABLED:
+        metadata_cache.invalidate(file_ids)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
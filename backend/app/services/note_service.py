@@ -1,6 +1,8 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.models import Note, NoteResource, AISearchTask, KnowledgeCard, ResourceType, AISearchStatus
 import uuid
+import asyncio
 import logging
 import os
 import requests
@@ -8,7 +10,7 @@ import json
 
 logger = logging.getLogger(__name__)
 
-def create_note(db: Session, title: str, content: str = None) -> Note:
+async def create_note(db: AsyncSession, title: str, content: str = None) -> Note:
     """
     创建新笔记
     """
@@ -19,16 +21,16 @@ def create_note(db: Session, title: str, content: str = None) -> Note:
         content=content
     )
     db.add(note)
-    db.commit()
-    db.refresh(note)
+    await db.commit()
+    await db.refresh(note)
     logger.info(f"创建新笔记: {note_id} - {title}")
     return note
 
-def update_note(db: Session, note_id: str, title: str = None, content: str = None) -> Note:
+async def update_note(db: AsyncSession, note_id: str, title: str = None, content: str = None) -> Note:
     """
     更新笔记
     """
-    note = db.query(Note).filter(Note.id == note_id).first()
+    note = await db.get(Note, note_id)
     if not note:
         logger.warning(f"笔记不存在: {note_id}")
         return None
@@ -38,50 +40,50 @@ def update_note(db: Session, note_id: str, title: str = None, content: str = Non
     if content is not None:
         note.content = content
     
-    db.commit()
-    db.refresh(note)
+    await db.commit()
+    await db.refresh(note)
     logger.info(f"更新笔记: {note_id}")
     return note
 
-def delete_note(db: Session, note_id: str) -> bool:
+async def delete_note(db: AsyncSession, note_id: str) -> bool:
     """
     删除笔记及其相关资源
     """
-    note = db.query(Note).filter(Note.id == note_id).first()
+    note = await db.get(Note, note_id)
     if not note:
         logger.warning(f"笔记不存在: {note_id}")
         return False
     
     # 删除相关资源
-    db.query(NoteResource).filter(NoteResource.note_id == note_id).delete()
-    db.query(AISearchTask).filter(AISearchTask.note_id == note_id).delete()
-    db.query(KnowledgeCard).filter(KnowledgeCard.note_id == note_id).delete()
+    await db.execute(delete(NoteResource).where(NoteResource.note_id == note_id))
+    await db.execute(delete(AISearchTask).where(AISearchTask.note_id == note_id))
+    await db.execute(delete(KnowledgeCard).where(KnowledgeCard.note_id == note_id))
     
     # 删除笔记
-    db.delete(note)
-    db.commit()
+    await db.delete(note)
+    await db.commit()
     
     logger.info(f"删除笔记及其资源: {note_id}")
     return True
 
-def get_note(db: Session, note_id: str) -> Note:
+async def get_note(db: AsyncSession, note_id: str) -> Note:
     """
     获取笔记信息
     """
-    return db.query(Note).filter(Note.id == note_id).first()
+    return await db.get(Note, note_id)
 
-def get_all_notes(db: Session) -> list[Note]:
+async def get_all_notes(db: AsyncSession) -> list[Note]:
     """
     获取所有笔记列表
     """
-    return db.query(Note).order_by(Note.updated_at.desc()).all()
+    return (await db.scalars(select(Note).order_by(Note.updated_at.desc()))).all()
 
-def add_resource_to_note(db: Session, note_id: str, resource_type: ResourceType, resource_path: str, 
+async def add_resource_to_note(db: AsyncSession, note_id: str, resource_type: ResourceType, resource_path: str, 
                         original_filename: str = None, resource_metadata: dict = None) -> NoteResource:
     """
     向笔记添加资源
     """
-    note = get_note(db, note_id)
+    note = await get_note(db, note_id)
     if not note:
         logger.warning(f"笔记不存在: {note_id}")
         return None
@@ -94,17 +96,17 @@ def add_resource_to_note(db: Session, note_id: str, resource_type: ResourceType,
         resource_metadata=resource_metadata
     )
     db.add(resource)
-    db.commit()
-    db.refresh(resource)
+    await db.commit()
+    await db.refresh(resource)
     
     logger.info(f"向笔记添加资源: {note_id} - {resource_type.value}: {resource_path}")
     return resource
 
-def remove_resource_from_note(db: Session, resource_id: int) -> bool:
+async def remove_resource_from_note(db: AsyncSession, resource_id: int) -> bool:
     """
     从笔记中移除资源
     """
-    resource = db.query(NoteResource).filter(NoteResource.id == resource_id).first()
+    resource = await db.get(NoteResource, resource_id)
     if not resource:
         logger.warning(f"资源不存在: {resource_id}")
         return False
@@ -119,19 +121,19 @@ def remove_resource_from_note(db: Session, resource_id: int) -> bool:
                 logger.error(f"删除文件失败: {resource.resource_path} - {str(e)}")
     
     # 删除数据库记录
-    db.delete(resource)
-    db.commit()
+    await db.delete(resource)
+    await db.commit()
     
     logger.info(f"从笔记中移除资源: {resource_id}")
     return True
 
-def get_note_resources(db: Session, note_id: str) -> list[NoteResource]:
+async def get_note_resources(db: AsyncSession, note_id: str) -> list[NoteResource]:
     """
     获取笔记的所有资源
     """
-    return db.query(NoteResource).filter(NoteResource.note_id == note_id).all()
+    return (await db.scalars(select(NoteResource).where(NoteResource.note_id == note_id))).all()
 
-def create_ai_search_task(db: Session, note_id: str, search_query: str) -> AISearchTask:
+async def create_ai_search_task(db: AsyncSession, note_id: str, search_query: str) -> AISearchTask:
     """
     创建AI搜索任务
     """
@@ -143,18 +145,18 @@ def create_ai_search_task(db: Session, note_id: str, search_query: str) -> AISea
         status=AISearchStatus.PENDING
     )
     db.add(task)
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
     
     logger.info(f"创建AI搜索任务: {task_id} - 笔记: {note_id} - 查询: {search_query[:50]}...")
     return task
 
-def update_ai_search_task_status(db: Session, task_id: str, status: AISearchStatus, 
+async def update_ai_search_task_status(db: AsyncSession, task_id: str, status: AISearchStatus, 
                                  search_results: dict = None, error_message: str = None) -> AISearchTask:
     """
     更新AI搜索任务状态
     """
-    task = db.query(AISearchTask).filter(AISearchTask.id == task_id).first()
+    task = await db.get(AISearchTask, task_id)
     if not task:
         logger.warning(f"AI搜索任务不存在: {task_id}")
         return None
@@ -165,31 +167,33 @@ def update_ai_search_task_status(db: Session, task_id: str, status: AISearchStat
     if error_message is not None:
         task.error_message = error_message
     
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
     
     logger.info(f"更新AI搜索任务状态: {task_id} -> {status.value}")
     return task
 
-def get_ai_search_tasks(db: Session, note_id: str) -> list[AISearchTask]:
+async def get_ai_search_tasks(db: AsyncSession, note_id: str) -> list[AISearchTask]:
     """
     获取笔记的所有AI搜索任务
     """
-    return db.query(AISearchTask).filter(AISearchTask.note_id == note_id).order_by(AISearchTask.created_at.desc()).all()
+    return (await db.scalars(
+        select(AISearchTask).where(AISearchTask.note_id == note_id).order_by(AISearchTask.created_at.desc())
+    )).all()
 
-def perform_ai_search(db: Session, task_id: str) -> AISearchTask:
+async def perform_ai_search(db: AsyncSession, task_id: str) -> AISearchTask:
     """
     执行AI搜索任务
     
     注意：这里是一个模拟实现，实际项目中应该调用真实的AI搜索API
     """
-    task = db.query(AISearchTask).filter(AISearchTask.id == task_id).first()
+    task = await db.get(AISearchTask, task_id)
     if not task:
         logger.warning(f"AI搜索任务不存在: {task_id}")
         return None
     
     # 更新状态为处理中
-    task = update_ai_search_task_status(db, task_id, AISearchStatus.PROCESSING)
+    task = await update_ai_search_task_status(db, task_id, AISearchStatus.PROCESSING)
     
     try:
         # 模拟AI搜索过程
@@ -214,11 +218,10 @@ def perform_ai_search(db: Session, task_id: str) -> AISearchTask:
         }
         
         # 模拟网络请求延迟
-        import time
-        time.sleep(2)
+        await asyncio.sleep(2)
         
         # 更新任务状态为完成
-        task = update_ai_search_task_status(db, task_id, AISearchStatus.COMPLETED, search_results)
+        task = await update_ai_search_task_status(db, task_id, AISearchStatus.COMPLETED, search_results)
         
         # 将搜索结果作为资源添加到笔记
         search_result_resource = {
@@ -226,7 +229,7 @@ def perform_ai_search(db: Session, task_id: str) -> AISearchTask:
             "search_results": search_results,
             "task_id": task_id
         }
-        add_resource_to_note(
+        await add_resource_to_note(
             db=db,
             note_id=task.note_id,
             resource_type=ResourceType.URL,  # 使用URL类型存储搜索结果
@@ -237,23 +240,23 @@ def perform_ai_search(db: Session, task_id: str) -> AISearchTask:
         
     except Exception as e:
         logger.error(f"AI搜索任务失败: {task_id} - {str(e)}")
-        task = update_ai_search_task_status(db, task_id, AISearchStatus.ERROR, error_message=str(e))
+        task = await update_ai_search_task_status(db, task_id, AISearchStatus.ERROR, error_message=str(e))
     
     return task
 
-def generate_knowledge_card(db: Session, note_id: str) -> KnowledgeCard:
+async def generate_knowledge_card(db: AsyncSession, note_id: str) -> KnowledgeCard:
     """
     为笔记生成知识卡片
     
     注意：这里是一个模拟实现，实际项目中应该调用真实的AI API生成知识卡片
     """
-    note = db.query(Note).filter(Note.id == note_id).first()
+    note = await db.get(Note, note_id)
     if not note:
         logger.warning(f"笔记不存在: {note_id}")
         return None
     
     # 获取笔记内容和相关资源
-    resources = get_note_resources(db, note_id)
+    resources = await get_note_resources(db, note_id)
     
     # 模拟生成知识卡片
     logger.info(f"为笔记生成知识卡片: {note_id} - {note.title}")
@@ -278,8 +281,7 @@ def generate_knowledge_card(db: Session, note_id: str) -> KnowledgeCard:
         materials["resources"].append(resource_info)
     
     # 模拟AI生成知识卡片
-    import time
-    time.sleep(2)
+    await asyncio.sleep(2)
     
     card_id = str(uuid.uuid4())[:8]
     knowledge_card = KnowledgeCard(
@@ -292,14 +294,16 @@ def generate_knowledge_card(db: Session, note_id: str) -> KnowledgeCard:
     )
     
     db.add(knowledge_card)
-    db.commit()
-    db.refresh(knowledge_card)
+    await db.commit()
+    await db.refresh(knowledge_card)
     
     logger.info(f"知识卡片生成成功: {card_id} - 笔记: {note_id}")
     return knowledge_card
 
-def get_knowledge_cards(db: Session, note_id: str) -> list[KnowledgeCard]:
+async def get_knowledge_cards(db: AsyncSession, note_id: str) -> list[KnowledgeCard]:
     """
     获取笔记的所有知识卡片
     """
-    return db.query(KnowledgeCard).filter(KnowledgeCard.note_id == note_id).order_by(KnowledgeCard.created_at.desc()).all()
\ No newline at end of file
+    return (await db.scalars(
+        select(KnowledgeCard).where(KnowledgeCard.note_id == note_id).order_by(KnowledgeCard.created_at.desc())
+    )).all()
\ No newline at end of file
@@ -0,0 +1,270 @@
+import os
+import base64
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from app.services.ocr_clients import get_async_client, get_client, init_ocr_clients, close_async_ocr_clients
+from app.utils.image_encoding import image_media_type
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 默认使用的OCR后端，可在每次请求中单独指定
+OCR_BACKEND = os.getenv("OCR_BACKEND", "lmstudio")
+# 后端未单独配置时的默认超时（秒）和并发数
+OCR_DEFAULT_TIMEOUT = float(os.getenv("OCR_DEFAULT_TIMEOUT", "300"))
+OCR_DEFAULT_MAX_CONCURRENCY = int(os.getenv("OCR_DEFAULT_MAX_CONCURRENCY", "4"))
+
+class OCRBackendError(Exception):
+    """
+    OCR后端调用失败（连接失败、超时、返回格式错误等）
+    """
+    pass
+
+class OCRBackend:
+    """
+    OCR后端基类，所有后端实现同一个异步接口 recognize
+    每个后端有独立的并发信号量、超时时间和模型名称，配置读取环境变量:
+    OCR_<NAME>_MODEL / OCR_<NAME>_TIMEOUT / OCR_<NAME>_MAX_CONCURRENCY / OCR_<NAME>_PROMPT
+    """
+
+    name = ""
+    default_model = ""
+    default_prompt = "ocr识别，直接返回识别内容"
+
+    def __init__(self, model: str = None, prompt: str = None, timeout: float = None, max_concurrency: int = None):
+        prefix = f"OCR_{self.name.upper()}_"
+        self.model = model or os.getenv(prefix + "MODEL", self.default_model)
+        self.prompt = prompt or os.getenv(prefix + "PROMPT", self.default_prompt)
+        self.timeout = timeout or float(os.getenv(prefix + "TIMEOUT", str(OCR_DEFAULT_TIMEOUT)))
+        self.max_concurrency = max_concurrency or int(os.getenv(prefix + "MAX_CONCURRENCY", str(OCR_DEFAULT_MAX_CONCURRENCY)))
+        # asyncio信号量绑定在事件循环上，按事件循环分别创建
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def recognize(self, image_data: bytes, image_path: str = None) -> str:
+        """
+        识别页面图片中的文字，超过并发上限时排队等待，单次调用超过超时时间视为失败
+        :param image_data: 图片内容
+        :param image_path: 图片路径（本地模型直接读取文件时使用）
+        :return: 识别出的文本
+        """
+        async with self._semaphore():
+            try:
+                return await asyncio.wait_for(self._recognize(image_data, image_path), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                raise OCRBackendError(f"OCR后端 {self.name} 识别超时（{self.timeout}秒）")
+            except OCRBackendError:
+                raise
+            except Exception as e:
+                raise OCRBackendError(f"OCR后端 {self.name} 调用失败: {str(e)}") from e
+
+    async def _recognize(self, image_data: bytes, image_path: str = None) -> str:
+        raise NotImplementedError
+
+def _encode_image(image_data: bytes) -> str:
+    return base64.b64encode(image_data).decode("utf-8")
+
+def _choices_text(completion) -> str:
+    """
+    拼接OpenAI兼容接口返回的所有choice文本
+    """
+    return "".join(choice.message.content or "" for choice in completion.choices if choice.message)
+
+class LMStudioBackend(OCRBackend):
+    """
+    LM Studio本地视觉模型（OpenAI兼容接口）
+    """
+
+    name = "lmstudio"
+
+    def __init__(self, **kwargs):
+        from app.services.ocr_service import LM_STUDIO_MODEL, LM_STUDIO_PROMPT
+
+        self.default_model = LM_STUDIO_MODEL
+        self.default_prompt = LM_STUDIO_PROMPT
+        super().__init__(**kwargs)
+
+    async def _recognize(self, image_data: bytes, image_path: str = None) -> str:
+        completion = await get_async_client("lmstudio").chat.completions.create(
+            model=self.model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "image_url", "image_url": {"url": f"data:{image_media_type(image_data)};base64,{_encode_image(image_data)}"}},
+                        {"type": "text", "text": self.prompt},
+                    ],
+                },
+            ]
+        )
+        # 替换HTML特殊字符
+        return _choices_text(completion).replace("<", "&lt;").replace(">", "&gt;")
+
+class AliBackend(OCRBackend):
+    """
+    阿里云百炼视觉模型（DashScope OpenAI兼容接口）
+    """
+
+    name = "ali"
+    default_model = "qwen3-vl-plus"
+
+    async def _recognize(self, image_data: bytes, image_path: str = None) -> str:
+        completion = await get_async_client("ali").chat.completions.create(
+            model=self.model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "image_url", "image_url": {"url": f"data:{image_media_type(image_data)};base64,{_encode_image(image_data)}"}},
+                        {"type": "text", "text": self.prompt},
+                    ],
+                },
+            ],
+            stream=False,
+            extra_body={
+                'enable_thinking': False,
+                "thinking_budget": 81920
+            },
+        )
+        return _choices_text(completion)
+
+class OllamaBackend(OCRBackend):
+    """
+    Ollama本地视觉模型
+    """
+
+    name = "ollama"
+    default_model = "qwen3-vl:2b"
+    default_prompt = "识别图片文字，输出markdown格式"
+
+    async def _recognize(self, image_data: bytes, image_path: str = None) -> str:
+        completion = await get_async_client("ollama").generate(
+            model=self.model,
+            prompt=self.prompt,
+            images=[_encode_image(image_data)],
+            stream=False,
+            think=False
+        )
+        return completion["response"]
+
+class RemoteAPIBackend(OCRBackend):
+    """
+    远程OCR API（OCR_API_URL / OCR_API_KEY）
+    """
+
+    name = "api"
+    default_model = "document"
+
+    async def _recognize(self, image_data: bytes, image_path: str = None) -> str:
+        response = await get_async_client("api").post(
+            os.getenv("OCR_API_URL", "https://api.example.com/ocr"),
+            json={
+                "image": _encode_image(image_data),
+                "language": "auto",  # 自动检测语言
+                "model": self.model
+            },
+            headers={"Authorization": f"Bearer {os.getenv('OCR_API_KEY', '')}"}
+        )
+        if response.status_code != 200:
+            raise OCRBackendError(f"OCR API返回错误: 状态码={response.status_code}, 响应={response.text}")
+        result = response.json()
+        return result.get('text', '') or result.get('result', '')
+
+class EasyOCRBackend(OCRBackend):
+    """
+    EasyOCR本地识别，模型推理为CPU/GPU计算，在线程中执行
+    """
+
+    name = "easyocr"
+    default_model = "ch_sim+en"
+    default_prompt = ""
+
+    async def _recognize(self, image_data: bytes, image_path: str = None) -> str:
+        reader = get_client("easyocr")
+        # 打包存储的图片没有单独的文件，使用图片内容
+        source = image_path if image_path and os.path.isfile(image_path) else image_data
+        result = await asyncio.to_thread(reader.readtext, source, detail=0)
+        return "\n".join(result)
+
+# 后端名称 -> 后端实例
+OCR_BACKENDS: Dict[str, OCRBackend] = {}
+
+def register_backend(backend: OCRBackend) -> OCRBackend:
+    """
+    注册OCR后端，同名后端会被替换
+    """
+    OCR_BACKENDS[backend.name] = backend
+    return backend
+
+def get_ocr_backend(name: Optional[str] = None) -> OCRBackend:
+    """
+    按名称获取OCR后端，未指定时使用 OCR_BACKEND 配置的默认后端
+    """
+    name = name or OCR_BACKEND
+    backend = OCR_BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"未知的OCR后端: {name}，可选: {', '.join(OCR_BACKENDS)}")
+    return backend
+
+def list_ocr_backends() -> list:
+    """
+    列出已注册的OCR后端及其配置
+    """
+    return [
+        {
+            "name": backend.name,
+            "model": backend.model,
+            "timeout": backend.timeout,
+            "max_concurrency": backend.max_concurrency,
+            "default": backend.name == OCR_BACKEND
+        }
+        for backend in OCR_BACKENDS.values()
+    ]
+
+for _backend_class in (LMStudioBackend, AliBackend, OllamaBackend, RemoteAPIBackend, EasyOCRBackend):
+    register_backend(_backend_class())
+
+# 同步代码（任务工作线程）共用的事件循环，使同一进程内的OCR调用共享信号量和异步连接池
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="ocr-event-loop", daemon=True).start()
+    return _loop
+
+def recognize_sync(backend: OCRBackend, image_data: bytes, image_path: str = None) -> str:
+    """
+    在同步代码中调用OCR后端，阻塞当前线程直到识别完成
+    """
+    future = asyncio.run_coroutine_threadsafe(backend.recognize(image_data, image_path), _background_loop())
+    return future.result()
+
+def init_background_ocr_clients(names: str = None) -> None:
+    """
+    在同步代码共用的事件循环中预先创建异步OCR客户端（任务工作进程启动时调用）
+    :param names: 逗号分隔的客户端名称，默认读取 OCR_STARTUP_CLIENTS
+    """
+    asyncio.run_coroutine_threadsafe(init_ocr_clients(names), _background_loop()).result()
+
+def close_background_ocr_clients() -> None:
+    """
+    关闭同步代码共用的事件循环中的异步OCR客户端
+    """
+    if _loop is not None:
+        asyncio.run_coroutine_threadsafe(close_async_ocr_clients(), _loop).result()
@@ -0,0 +1,180 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, update, func, select
+from sqlalchemy.exc import IntegrityError
+from app.database.models import OCRCacheEntry, OCRCacheCounter
+from datetime import datetime
+from typing import Optional
+import os
+import hashlib
+import logging
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# OCR缓存总大小上限（按识别文本的UTF-8字节数计算），默认256MB
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+# 是否启用OCR缓存
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+def image_digest(image_data: bytes) -> str:
+    """
+    计算页面图片内容的SHA-256
+    """
+    return hashlib.sha256(image_data).hexdigest()
+
+def make_cache_key(image_hash: str, model: str, prompt: str) -> str:
+    """
+    由图片哈希、模型名称和提示词生成缓存键，任意一项变化都不会命中旧结果
+    """
+    return hashlib.sha256(f"{image_hash}\0{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+def _increment(db: Session, name: str, amount: int = 1) -> None:
+    """
+    累加统计计数（原子更新，多个工作进程同时写入也不会丢失）
+    """
+    result = db.execute(
+        update(OCRCacheCounter)
+        .where(OCRCacheCounter.name == name)
+        .values(value=OCRCacheCounter.value + amount)
+    )
+    if result.rowcount == 0:
+        try:
+            with db.begin_nested():
+                db.add(OCRCacheCounter(name=name, value=amount))
+        except IntegrityError:
+            # 其他进程已创建该计数，重新累加
+            db.execute(
+                update(OCRCacheCounter)
+                .where(OCRCacheCounter.name == name)
+                .values(value=OCRCacheCounter.value + amount)
+            )
+
+def _total_bytes(db: Session) -> int:
+    """
+    缓存总大小：由写入和淘汰维护的 bytes 计数，不统计缓存表
+    """
+    return db.query(OCRCacheCounter.value).filter(OCRCacheCounter.name == "bytes").scalar() or 0
+
+def get_cached_ocr(db: Session, image_hash: str, model: str, prompt: str) -> Optional[str]:
+    """
+    查询OCR缓存，命中时更新使用时间和命中次数
+    命中/未命中统计在调用方的事务中写入，由调用方提交（未命中时应在调用模型识别前提交，识别期间不占用写锁）
+    :return: 缓存的识别文本，未命中返回None
+    """
+    if not OCR_CACHE_ENABLED:
+        return None
+
+    cache_key = make_cache_key(image_hash, model, prompt)
+    entry = db.query(OCRCacheEntry).filter(OCRCacheEntry.cache_key == cache_key).first()
+    if entry is None:
+        _increment(db, "misses")
+        return None
+
+    db.execute(
+        update(OCRCacheEntry)
+        .where(OCRCacheEntry.cache_key == cache_key)
+        .values(hit_count=OCRCacheEntry.hit_count + 1, last_used_at=datetime.utcnow())
+    )
+    _increment(db, "hits")
+    logger.info(f"OCR缓存命中: 图片 {image_hash[:12]}, 模型 {model}")
+    return entry.text
+
+def put_cached_ocr(db: Session, image_hash: str, model: str, prompt: str, text: str) -> None:
+    """
+    保存OCR结果到缓存，超过大小上限时淘汰最久未使用的条目
+    与调用方的写操作在同一事务中，由调用方提交
+    """
+    if not OCR_CACHE_ENABLED or text is None:
+        return
+
+    cache_key = make_cache_key(image_hash, model, prompt)
+    size_bytes = len(text.encode("utf-8"))
+    now = datetime.utcnow()
+    entry = db.query(OCRCacheEntry).filter(OCRCacheEntry.cache_key == cache_key).first()
+    if entry:
+        added_bytes = size_bytes - entry.size_bytes
+        entry.text = text
+        entry.size_bytes = size_bytes
+        entry.last_used_at = now
+        db.flush()
+    else:
+        added_bytes = size_bytes
+        try:
+            with db.begin_nested():
+                db.add(OCRCacheEntry(
+                    cache_key=cache_key,
+                    image_hash=image_hash,
+                    model=model,
+                    text=text,
+                    size_bytes=size_bytes,
+                    hit_count=0,
+                    last_used_at=now
+                ))
+        except IntegrityError:
+            # 相同图片同时被识别（批量任务中相同的空白页、批量任务和单页请求同时执行等），
+            # 其他请求已写入该条目，保留已有结果，不重复计入缓存大小
+            logger.info(f"OCR缓存条目已由其他请求写入: 图片 {image_hash[:12]}, 模型 {model}")
+            return
+    _increment(db, "bytes", added_bytes)
+    evict_ocr_cache(db)
+
+def evict_ocr_cache(db: Session, max_bytes: int = None) -> int:
+    """
+    淘汰最久未使用的缓存条目，直到总大小不超过上限
+    先按使用时间累计大小算出需要淘汰的条目数，再用一条 DELETE 删除，不逐条删除
+    :return: 淘汰的条目数
+    """
+    max_bytes = OCR_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    total_bytes = _total_bytes(db)
+    if total_bytes <= max_bytes:
+        return 0
+
+    # 按最久未使用排列的累计大小，删除到累计大小刚好覆盖超出部分为止
+    order = (OCRCacheEntry.last_used_at, OCRCacheEntry.cache_key)
+    oldest = select(
+        OCRCacheEntry.size_bytes,
+        func.sum(OCRCacheEntry.size_bytes).over(order_by=order).label("cumulative")
+    ).subquery()
+    evicted, freed = db.execute(
+        select(func.count(), func.coalesce(func.sum(oldest.c.size_bytes), 0))
+        .where(oldest.c.cumulative - oldest.c.size_bytes < total_bytes - max_bytes)
+    ).one()
+    if not evicted:
+        return 0
+
+    db.execute(
+        delete(OCRCacheEntry).where(OCRCacheEntry.cache_key.in_(
+            select(OCRCacheEntry.cache_key).order_by(*order).limit(evicted)
+        )),
+        execution_options={"synchronize_session": False}
+    )
+    _increment(db, "bytes", -freed)
+    _increment(db, "evictions", evicted)
+    logger.info(f"OCR缓存淘汰 {evicted} 条，当前大小 {total_bytes - freed} 字节")
+    return evicted
+
+def get_ocr_cache_stats(db: Session) -> dict:
+    """
+    获取OCR缓存统计：条目数、总大小、命中/未命中次数和命中率
+    """
+    entries, total_bytes = db.query(
+        func.count(OCRCacheEntry.cache_key),
+        func.coalesce(func.sum(OCRCacheEntry.size_bytes), 0)
+    ).one()
+    counters = {name: value for name, value in db.query(OCRCacheCounter.name, OCRCacheCounter.value)}
+    hits = counters.get("hits", 0)
+    misses = counters.get("misses", 0)
+    lookups = hits + misses
+    return {
+        "enabled": OCR_CACHE_ENABLED,
+        "entries": entries,
+        "total_bytes": total_bytes,
+        "max_bytes": OCR_CACHE_MAX_BYTES,
+        "hits": hits,
+        "misses": misses,
+        "evictions": counters.get("evictions", 0),
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+    }
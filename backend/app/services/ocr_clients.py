@@ -0,0 +1,180 @@
+import os
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Any, Callable, Dict
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 各OCR后端的连接池上限（同一后端同时打开的连接数）
+OCR_LMSTUDIO_MAX_CONNECTIONS = int(os.getenv("OCR_LMSTUDIO_MAX_CONNECTIONS", "8"))
+OCR_ALI_MAX_CONNECTIONS = int(os.getenv("OCR_ALI_MAX_CONNECTIONS", "8"))
+OCR_OLLAMA_MAX_CONNECTIONS = int(os.getenv("OCR_OLLAMA_MAX_CONNECTIONS", "4"))
+OCR_API_MAX_CONNECTIONS = int(os.getenv("OCR_API_MAX_CONNECTIONS", "8"))
+# 请求超时（秒），视觉模型识别一页可能需要几十秒
+OCR_CLIENT_TIMEOUT = float(os.getenv("OCR_CLIENT_TIMEOUT", "300"))
+# 空闲连接保持时间（秒）
+OCR_KEEPALIVE_EXPIRY = float(os.getenv("OCR_KEEPALIVE_EXPIRY", "60"))
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+DASHSCOPE_BASE_URL = os.getenv("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+
+def _httpx_limits(max_connections: int):
+    import httpx
+
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=OCR_KEEPALIVE_EXPIRY
+    )
+
+def _create_easyocr_reader():
+    import easyocr
+
+    return easyocr.Reader(['ch_sim', 'en'])
+
+# 同步客户端名称 -> 创建函数（远程后端都使用异步客户端，只有本地模型easyocr在线程中同步调用）
+CLIENT_FACTORIES: Dict[str, Callable[[], Any]] = {
+    "easyocr": _create_easyocr_reader,
+}
+
+def _create_async_lmstudio_client():
+    import httpx
+    from openai import AsyncOpenAI
+    from app.services.ocr_service import LM_STUDIO_BASE_URL
+
+    return AsyncOpenAI(
+        base_url=LM_STUDIO_BASE_URL,
+        api_key="lm-studio",
+        http_client=httpx.AsyncClient(limits=_httpx_limits(OCR_LMSTUDIO_MAX_CONNECTIONS), timeout=OCR_CLIENT_TIMEOUT)
+    )
+
+def _create_async_ali_client():
+    import httpx
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(
+        api_key=os.getenv("DASHSCOPE_API_KEY"),
+        base_url=DASHSCOPE_BASE_URL,
+        http_client=httpx.AsyncClient(limits=_httpx_limits(OCR_ALI_MAX_CONNECTIONS), timeout=OCR_CLIENT_TIMEOUT)
+    )
+
+def _create_async_ollama_client():
+    from ollama import AsyncClient
+
+    return AsyncClient(
+        host=OLLAMA_HOST,
+        timeout=OCR_CLIENT_TIMEOUT,
+        limits=_httpx_limits(OCR_OLLAMA_MAX_CONNECTIONS)
+    )
+
+def _create_async_api_client():
+    import httpx
+
+    return httpx.AsyncClient(limits=_httpx_limits(OCR_API_MAX_CONNECTIONS), timeout=OCR_CLIENT_TIMEOUT)
+
+# 异步客户端名称 -> 创建函数（easyocr为本地模型，没有异步客户端）
+ASYNC_CLIENT_FACTORIES: Dict[str, Callable[[], Any]] = {
+    "lmstudio": _create_async_lmstudio_client,
+    "ali": _create_async_ali_client,
+    "ollama": _create_async_ollama_client,
+    "api": _create_async_api_client,
+}
+
+# 启动时预先创建的异步客户端，默认为 OCR_BACKEND 配置的默认后端（easyocr加载模型较慢且需要额外依赖，始终按需创建）
+DEFAULT_STARTUP_CLIENTS = os.getenv("OCR_STARTUP_CLIENTS", os.getenv("OCR_BACKEND", "lmstudio"))
+
+_clients: Dict[str, Any] = {}
+_lock = threading.Lock()
+# 异步客户端的连接池绑定在事件循环上，按事件循环分别保存
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+def get_client(name: str) -> Any:
+    """
+    获取长期复用的同步OCR客户端，首次使用时创建
+    :param name: 客户端名称: easyocr
+    """
+    client = _clients.get(name)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(name)
+        if client is None:
+            if name not in CLIENT_FACTORIES:
+                raise ValueError(f"未知的OCR客户端: {name}")
+            client = CLIENT_FACTORIES[name]()
+            _clients[name] = client
+            logger.info(f"创建OCR客户端: {name}")
+    return client
+
+def close_ocr_clients() -> None:
+    """
+    关闭所有同步OCR客户端
+    """
+    with _lock:
+        for name, client in _clients.items():
+            close = getattr(client, "close", None)
+            if close is None:
+                continue
+            try:
+                close()
+            except Exception as e:
+                logger.warning(f"关闭OCR客户端失败: {name}, 错误: {str(e)}")
+        _clients.clear()
+
+def get_async_client(name: str) -> Any:
+    """
+    获取当前事件循环中长期复用的异步OCR客户端，首次使用时创建
+    :param name: 客户端名称: lmstudio / ali / ollama / api
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(name)
+        if client is None:
+            if name not in ASYNC_CLIENT_FACTORIES:
+                raise ValueError(f"未知的异步OCR客户端: {name}")
+            client = ASYNC_CLIENT_FACTORIES[name]()
+            clients[name] = client
+            logger.info(f"创建异步OCR客户端: {name}")
+    return client
+
+async def init_ocr_clients(names: str = None) -> None:
+    """
+    启动时在当前事件循环中创建异步OCR客户端，同一进程内所有请求共享客户端及其连接池
+    创建失败（如缺少依赖）只记录日志，不影响启动
+    :param names: 逗号分隔的客户端名称，默认读取 OCR_STARTUP_CLIENTS
+    """
+    for name in (names or DEFAULT_STARTUP_CLIENTS).split(","):
+        name = name.strip()
+        if not name or name not in ASYNC_CLIENT_FACTORIES:
+            continue
+        try:
+            get_async_client(name)
+        except Exception as e:
+            logger.warning(f"OCR客户端创建失败: {name}, 错误: {str(e)}")
+
+async def close_async_ocr_clients() -> None:
+    """
+    关闭当前事件循环中的所有异步OCR客户端
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.pop(loop, {})
+    for name, client in clients.items():
+        # httpx.AsyncClient使用aclose，AsyncOpenAI和ollama.AsyncClient使用close
+        close = getattr(client, "aclose", None) or getattr(client, "close", None)
+        if close is None:
+            continue
+        try:
+            result = close()
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as e:
+            logger.warning(f"关闭异步OCR客户端失败: {name}, 错误: {str(e)}")
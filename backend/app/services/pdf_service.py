@@ -1,21 +1,44 @@
-from sqlalchemy.orm import Session
-from app.database.models import PDFDocument, PDFPage, ProcessingStatus
-from app.utils.pdf_processor import parse_pdf_info, extract_text_from_page
-from app.utils.image_converter import pdf_to_images
-from app.services.ocr_service import perform_ocr_on_image
+from sqlalchemy import String, and_, cast, func, insert, literal, or_, select, type_coerce, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, undefer
+from sqlalchemy.orm.attributes import set_committed_value
+from app.database.models import PDFDocument, PDFPage, PageAsset, ProcessingStatus, ProcessingJob
+from app.utils.pdf_processor import parse_pdf_info, extract_page_texts, sample_page_texts
+from app.utils.image_converter import pdf_to_images, render_page
+from app.utils.render_cache import render_cache, is_lazy_render
+from app.utils.image_variants import IMAGE_PREGENERATE_SIZES, create_image_variant, get_or_create_variant, variant_path
+from app.utils.image_encoding import encoding_for_path, page_image_filename
+from app.utils.page_store import is_pack_store, pack_image_dir, page_image_exists, read_page_image, remove_image_store
+from app.services.ocr_cache import image_digest, get_cached_ocr, put_cached_ocr
+from app.services.search_service import index_page, index_pages, remove_document_from_index, copy_document_index
+from app.services.metadata_cache import cached, cached_async, invalidate_on_commit
 import os
+import json
+import asyncio
+import base64
 import logging
+from datetime import datetime
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
-def create_pdf_record(db: Session, file_id: str, original_filename: str, file_path: str) -> PDFDocument:
+# 已完成解析和渲染、可以直接复用页面数据的状态
+# OCR进行中的文档状态为PROCESSING，需要额外确认页面图片已全部生成
+REUSABLE_STATUSES = (ProcessingStatus.IMAGES_GENERATED, ProcessingStatus.OCR_COMPLETED, ProcessingStatus.PROCESSING)
+# 仍在处理流程中的状态
+IN_PROGRESS_STATUSES = (ProcessingStatus.UPLOADED, ProcessingStatus.PROCESSING, ProcessingStatus.PARSED)
+# 图片清单中原图的类型，其他类型为图片尺寸名称（见 app.utils.image_variants.IMAGE_SIZES）
+ORIGINAL_ASSET = "original"
+
+def create_pdf_record(db: Session, file_id: str, original_filename: str, file_path: str, content_hash: str = None) -> PDFDocument:
     """
     在数据库中创建PDF记录
     """
     pdf_doc = PDFDocument(
         id=file_id,
         original_filename=original_filename,
-        file_path=file_path
+        file_path=file_path,
+        content_hash=content_hash
     )
     db.add(pdf_doc)
     db.commit()
@@ -32,162 +55,832 @@ def update_pdf_status(db: Session, file_id: str, status: ProcessingStatus, error
         pdf_doc.status = status
         if error_message:
             pdf_doc.error_message = error_message
+        invalidate_on_commit(db, file_id)
         db.commit()
         db.refresh(pdf_doc)
         logger.info(f"更新PDF状态: {file_id} -> {status}")
     return pdf_doc
 
-def classify_and_extract(pdf_path, threshold_per_page=20):
+def find_pdf_by_hash(db: Session, content_hash: str, exclude_id: str = None, processed_only: bool = False) -> PDFDocument:
+    """
+    按内容哈希查找已存在的PDF文档
+    :param content_hash: 文件内容SHA-256
+    :param exclude_id: 需要排除的文档ID（通常是当前文档自身）
+    :param processed_only: 只查找已完成解析、页面数据可复用的文档
+    :return: 找到的文档，优先返回处理进度最多的；不存在时返回None
+    """
+    if not content_hash:
+        return None
+
+    query = db.query(PDFDocument).filter(PDFDocument.content_hash == content_hash)
+    if exclude_id:
+        query = query.filter(PDFDocument.id != exclude_id)
+    if processed_only:
+        query = query.filter(PDFDocument.status.in_(REUSABLE_STATUSES))
+
+    candidates = query.order_by(PDFDocument.created_at).all()
+    if processed_only:
+        candidates = [doc for doc in candidates if is_reusable(db, doc)]
+    if not candidates:
+        return None
+
+    # 优先选择已OCR页数最多的文档作为复用来源
+    return max(candidates, key=lambda doc: doc.pages_processed or 0)
+
+def is_reusable(db: Session, pdf_doc: PDFDocument) -> bool:
+    """
+    文档的页面数据是否完整、可以被相同内容的文档复用
+    """
+    if pdf_doc.status in (ProcessingStatus.IMAGES_GENERATED, ProcessingStatus.OCR_COMPLETED):
+        return True
+    if pdf_doc.status != ProcessingStatus.PROCESSING or not pdf_doc.total_pages:
+        return False
+    # 处理中的文档：所有页面都已生成图片（渲染完成后进入OCR阶段）才可复用
+    return (pdf_doc.pages_rendered or 0) >= pdf_doc.total_pages
+
+def has_pending_twin(db: Session, pdf_doc: PDFDocument) -> bool:
+    """
+    是否存在更早上传、内容相同且仍在处理中的文档
+    """
+    if not pdf_doc.content_hash:
+        return False
+    twins = db.query(PDFDocument).filter(
+        PDFDocument.content_hash == pdf_doc.content_hash,
+        PDFDocument.id != pdf_doc.id,
+        PDFDocument.status.in_(IN_PROGRESS_STATUSES)
+    ).all()
+    # 按 (上传时间, ID) 判断先后，同一时间上传的文档也只会有一个先处理
+    own_order = (pdf_doc.created_at, pdf_doc.id)
+    return any(
+        (twin.created_at, twin.id) < own_order and not is_reusable(db, twin)
+        for twin in twins
+    )
+
+def clone_pdf_document(db: Session, file_id: str, source: PDFDocument) -> PDFDocument:
+    """
+    从内容相同的已处理文档复制解析结果：页数、类型、元数据、页面图片路径和清单、OCR文本
+    图片文件不复制，页面记录直接引用来源文档的图片路径
+    """
+    pdf_doc = db.query(PDFDocument).filter(PDFDocument.id == file_id).first()
+    if not pdf_doc:
+        return None
+
+    pdf_doc.total_pages = source.total_pages
+    pdf_doc.pdf_type = source.pdf_type
+    pdf_doc.pdf_metadata = source.pdf_metadata
+    pdf_doc.status = source.status
+
+    # 清理可能存在的旧页面记录后，用一条 INSERT ... SELECT 复制来源页面
+    remove_document_from_index(db, file_id)
+    db.query(PDFPage).filter(PDFPage.document_id == file_id).delete()
+    db.query(PageAsset).filter(PageAsset.document_id == file_id).delete()
+    db.execute(insert(PDFPage).from_select(
+        ["document_id", "page_number", "image_path", "ocr_text", "ocr_status"],
+        select(
+            literal(file_id),
+            PDFPage.page_number,
+            PDFPage.image_path,
+            PDFPage.ocr_text,
+            PDFPage.ocr_status
+        ).where(PDFPage.document_id == source.id)
+    ))
+    # 图片清单同样指向来源文档的图片
+    db.execute(insert(PageAsset).from_select(
+        ["document_id", "page_number", "variant", "path", "format", "size_bytes", "content_hash"],
+        select(
+            literal(file_id),
+            PageAsset.page_number,
+            PageAsset.variant,
+            PageAsset.path,
+            PageAsset.format,
+            PageAsset.size_bytes,
+            PageAsset.content_hash
+        ).where(PageAsset.document_id == source.id)
+    ))
+    copy_document_index(db, source.id, file_id)
+    # 按复制到的页面设置进度计数（事务已持有写锁，与复制的页面一致）
+    pdf_doc.pages_processed, pdf_doc.pages_rendered = _count_page_progress(db, file_id)
+
+    invalidate_on_commit(db, file_id)
+    db.commit()
+    db.refresh(pdf_doc)
+    logger.info(f"复用相同内容文档的处理结果: {source.id} -> {file_id}, 页数: {source.total_pages}")
+    return pdf_doc
+
+def delete_pdf_document(db: Session, pdf_doc: PDFDocument) -> None:
+    """
+    删除PDF文档记录，按引用计数释放共享的存储
+    PDF文件只在没有其他文档共享时删除；图片目录只在没有其他文档的页面引用时删除
+    """
+    file_id = pdf_doc.id
+    file_path = pdf_doc.file_path
+    images_root = os.getenv("IMAGES_DIR", "./images")
+
+    # 收集页面引用的图片目录（复用的页面可能指向来源文档的目录）
+    image_dirs = {file_id}
+    for (image_path,) in db.query(PDFPage.image_path).filter(
+        PDFPage.document_id == file_id,
+        PDFPage.image_path != None
+    ).distinct():
+        image_dirs.add(os.path.dirname(image_path))
+
+    # 先删除全文索引、页面记录、图片清单和处理任务，再删除文档记录
+    remove_document_from_index(db, file_id)
+    db.query(PDFPage).filter(PDFPage.document_id == file_id).delete()
+    db.query(PageAsset).filter(PageAsset.document_id == file_id).delete()
+    db.query(ProcessingJob).filter(ProcessingJob.document_id == file_id).delete()
+    db.delete(pdf_doc)
+    invalidate_on_commit(db, file_id)
+    db.commit()
+    logger.info(f"成功删除PDF文档记录: {file_id}")
+
+    # 删除物理文件
+    file_references = db.query(PDFDocument).filter(PDFDocument.file_path == file_path).count()
+    if file_references > 0:
+        logger.info(f"PDF文件仍被 {file_references} 个文档引用，保留: {file_path}")
+    elif os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+            logger.info(f"成功删除PDF文件: {file_path}")
+        except Exception as e:
+            logger.error(f"删除PDF文件失败: {str(e)}")
+
+    # 删除相关的图片文件夹（或打包文件）
+    for image_dir in image_dirs:
+        dir_references = db.query(PDFPage).filter(PDFPage.image_path.like(f"{image_dir}/%")).count()
+        if dir_references > 0:
+            logger.info(f"图片文件夹仍被 {dir_references} 个页面引用，保留: {image_dir}")
+            continue
+        image_dir = os.path.join(images_root, image_dir)
+        try:
+            remove_image_store(image_dir)
+            if is_lazy_render():
+                render_cache.forget_dir(image_dir)
+            logger.info(f"成功删除图片文件夹: {image_dir}")
+        except Exception as e:
+            logger.error(f"删除图片文件夹失败: {str(e)}")
+
+def _page_asset_row(file_id: str, page_number: int, variant: str, image_path: str, images_root: str, describe: bool = True) -> dict:
+    """
+    构造页面图片清单记录
+    :param image_path: 图片文件路径
+    :param describe: 是否读取图片记录大小和哈希（按需渲染模式下图片尚未生成）
+    """
+    row = {
+        "document_id": file_id,
+        "page_number": page_number,
+        "variant": variant,
+        "path": os.path.relpath(image_path, images_root),
+        "format": encoding_for_path(image_path).format,
+        "size_bytes": None,
+        "content_hash": None
+    }
+    if describe:
+        image_data, row["content_hash"] = _read_page_image(image_path)
+        row["size_bytes"] = len(image_data)
+    return row
+
+def _page_image_query(file_id: str, page_number: int):
+    # 按 (document_id, page_number) 唯一索引查找页面和图片清单中的原图，清单中没有时使用页面记录的图片路径
+    return select(func.coalesce(PageAsset.path, PDFPage.image_path), PDFDocument.file_path).select_from(PDFPage).join(
+        PDFDocument, PDFDocument.id == PDFPage.document_id
+    ).outerjoin(
+        PageAsset, and_(
+            PageAsset.document_id == PDFPage.document_id,
+            PageAsset.page_number == PDFPage.page_number,
+            PageAsset.variant == ORIGINAL_ASSET
+        )
+    ).where(
+        PDFPage.document_id == file_id,
+        PDFPage.page_number == page_number
+    )
+
+def _resolve_page_image(file_id: str, page_number: int, page_image_path: Optional[str], pdf_path: Optional[str]) -> Optional[str]:
+    """
+    根据页面记录中的图片路径查找图片文件，按需渲染模式下图片不存在时即时渲染（读写文件，可能耗时）
+    """
+    images_root = os.getenv("IMAGES_DIR", "./images")
+    if page_image_path:
+        image_path = os.path.join(images_root, page_image_path)
+        if is_lazy_render():
+            if not pdf_path or not os.path.exists(pdf_path):
+                return None
+            # 按记录的扩展名渲染，修改 PAGE_IMAGE_FORMAT 前记录的页面仍使用原来的格式
+            return render_cache.get_or_render(
+                image_path,
+                lambda: render_page(pdf_path, os.path.dirname(image_path), page_number, encoding=encoding_for_path(image_path))
+            )
+        if page_image_exists(image_path):
+            return image_path
+
+    # 清单和页面记录中都没有图片路径时（渲染尚未完成或旧数据），按默认命名查找
+    image_path = os.path.join(images_root, file_id, page_image_filename(page_number))
+    if page_image_exists(image_path):
+        return image_path
+    return None
+
+def _resolve_page_image_variant(file_id: str, page_number: int, page_image_path: Optional[str], pdf_path: Optional[str], size: Optional[str]) -> Optional[str]:
+    """
+    查找页面原图，需要其他尺寸时从原图生成（按需渲染模式下计入渲染缓存的磁盘预算）
+    """
+    image_path = _resolve_page_image(file_id, page_number, page_image_path, pdf_path)
+    if not image_path or not size:
+        return image_path
+    if is_lazy_render():
+        return render_cache.get_or_render(
+            variant_path(image_path, size),
+            lambda: create_image_variant(image_path, size)
+        )
+    return get_or_create_variant(image_path, size)
+
+def get_page_image_path(db: Session, file_id: str, page_number: int) -> str:
+    """
+    获取页面图片的文件路径
+    优先使用页面记录中的图片路径（复用的文档指向来源文档的图片），其次按默认命名查找；
+    按需渲染模式下图片不存在时即时渲染并放入渲染缓存
+    :return: 图片路径，不存在时返回None
+    """
+    row = db.execute(_page_image_query(file_id, page_number)).first()
+    return _resolve_page_image(file_id, page_number, *(row or (None, None)))
+
+async def get_page_image_path_async(db: AsyncSession, file_id: str, page_number: int, size: Optional[str] = None) -> str:
+    """
+    get_page_image_path的异步版本，查找、渲染和缩放图片在线程池中执行
+    页面的图片路径经过元数据缓存（页面浏览时每张图片都要查询）；同步版本供工作进程使用，不经过缓存
+    :param size: 图片尺寸（见 app.utils.image_variants.IMAGE_SIZES），None表示原图
+    """
+    async def load():
+        return (await db.execute(_page_image_query(file_id, page_number))).first()
+    row = await cached_async((file_id, "image", page_number), load)
+    return await asyncio.to_thread(_resolve_page_image_variant, file_id, page_number, *(row or (None, None)), size)
+
+def classify_and_extract(pdf_path, threshold_per_page=20, sample_size=20):
     """
     判断PDF类型并提取文本
+    只打开一次文档，在全文范围内均匀采样页面（而不是只看前几页）
     :param pdf_path: PDF文件路径
     :param threshold_per_page: 每页文本长度阈值，用于判断是否为图片型
-    :return: 字典，包含类型和提取的文本（如果是文本型）
+    :param sample_size: 采样页数
+    :return: 字典，包含类型、提取的文本（如果是文本型）以及各采样页的文本长度
     """
     result = {
         "type": None,
         "text": "",
-        "pages": []
+        "pages": [],
+        "page_text_lengths": {}
     }
 
     try:
-        # 1. 打开文档
-        total_text_length = 0
-        page_texts = []
-
-        # 2. 遍历前20页
-        for page_num in range(0, 20):
-            # 提取纯文本，并去除首尾空白字符
-            text = extract_text_from_page(pdf_path, page_num)
-            logger.info(f"第 {page_num} 页文本长度: {text}")
-
-            if text:
-                # 统计该页文本长度
-                page_texts.append(text)
-                total_text_length += len(text)
-        
-        # 3. 计算平均值并判断类型
-        len_texts = 1 if len(page_texts) == 0 else len(page_texts)
-        avg_text_length = total_text_length / len_texts
+        # 1. 打开文档并采样页面文本
+        page_texts = sample_page_texts(pdf_path, sample_size)
+        result["page_text_lengths"] = {page: len(text) for page, text in page_texts.items()}
+        logger.info(f"采样页文本长度: {result['page_text_lengths']}")
+
+        # 2. 计算所有采样页的平均文本长度并判断类型
+        total_text_length = sum(result["page_text_lengths"].values())
+        avg_text_length = total_text_length / max(len(page_texts), 1)
         
         if avg_text_length < threshold_per_page:
             result["type"] = "image-based" # 图片型
-            print(f"判定结果：图片型 PDF (平均每页文本长度: {avg_text_length:.2f})")
+            logger.info(f"判定结果：图片型 PDF (平均每页文本长度: {avg_text_length:.2f})")
         else:
             result["type"] = "text-based" # 文本型
-            result["text"] = "\n--- 分页符 ---\n".join(page_texts)
-            result["pages"] = page_texts # 保存每页内容的列表
-            print(f"判定结果：文本型 PDF (平均每页文本长度: {avg_text_length:.2f})")
+            non_empty_texts = [text for text in page_texts.values() if text]
+            result["text"] = "\n--- 分页符 ---\n".join(non_empty_texts)
+            result["pages"] = non_empty_texts # 保存每页内容的列表
+            logger.info(f"判定结果：文本型 PDF (平均每页文本长度: {avg_text_length:.2f})")
             
     except Exception as e:
-        print(f"处理出错: {e}")
+        logger.error(f"处理出错: {e}")
         result["type"] = "error"
     
     return result
 
+def parse_pdf_stage(db: Session, file_id: str, file_path: str) -> bool:
+    """
+    解析阶段：解析PDF基本信息并为每一页创建记录
+    已有相同内容的文档处理完成时直接复用其结果
+    :return: 是否需要继续后续阶段（复用结果时返回False）
+    """
+    # 如果已有相同内容的文档处理完成，直接复用其结果
+    pdf_doc = get_pdf_document(db, file_id)
+    if not pdf_doc:
+        raise ValueError(f"PDF文档不存在: {file_id}")
+    source = find_pdf_by_hash(db, pdf_doc.content_hash, exclude_id=file_id, processed_only=True)
+    if source:
+        clone_pdf_document(db, file_id, source)
+        return False
+
+    # 更新状态为处理中
+    update_pdf_status(db, file_id, ProcessingStatus.PROCESSING)
+    
+    # 解析PDF信息
+    pdf_info = parse_pdf_info(file_path)
+
+    # 更新PDF文档信息
+    pdf_doc.total_pages = pdf_info['total_pages']
+    pdf_doc.pdf_metadata = str(pdf_info['metadata'])
+    logger.info(f"PDF文档 {file_id} 总页数: {pdf_info['total_pages']}")
+    
+    # 为每一页创建记录（重试时先清理上次未完成的记录），批量插入
+    remove_document_from_index(db, file_id)
+    db.query(PDFPage).filter(PDFPage.document_id == file_id).delete()
+    db.query(PageAsset).filter(PageAsset.document_id == file_id).delete()
+    lazy_render = is_lazy_render()
+    page_rows = [
+        {
+            "document_id": file_id,
+            "page_number": page_number,  # 页码从1开始
+            # 按需渲染模式下只记录图片位置，首次访问时再渲染
+            "image_path": os.path.join(file_id, page_image_filename(page_number)) if lazy_render else None,
+            "ocr_status": False
+        }
+        for page_number in range(1, pdf_info['total_pages'] + 1)
+    ]
+    if page_rows:
+        db.execute(insert(PDFPage), page_rows)
+    if lazy_render and page_rows:
+        images_root = os.getenv("IMAGES_DIR", "./images")
+        db.execute(insert(PageAsset), [
+            _page_asset_row(file_id, row["page_number"], ORIGINAL_ASSET, os.path.join(images_root, row["image_path"]), images_root, describe=False)
+            for row in page_rows
+        ])
+
+    # 页面记录、进度计数和解析完成状态在同一个事务中提交
+    pdf_doc.pages_processed = 0
+    pdf_doc.pages_rendered = len(page_rows) if lazy_render else 0
+    pdf_doc.status = ProcessingStatus.PARSED
+    invalidate_on_commit(db, file_id)
+    db.commit()
+    logger.info(f"PDF解析完成: {file_id}, 页数: {pdf_info['total_pages']}")
+    return True
+
+def classify_pdf_stage(db: Session, file_id: str, file_path: str) -> str:
+    """
+    分类阶段：判断PDF类型，文本型PDF直接提取每页文本作为识别结果
+    :return: PDF类型
+    """
+    pdf_doc = get_pdf_document(db, file_id)
+    if not pdf_doc:
+        raise ValueError(f"PDF文档不存在: {file_id}")
+
+    pdf_type = classify_and_extract(file_path)
+    pdf_doc.pdf_type = pdf_type['type']
+    invalidate_on_commit(db, file_id)
+    db.commit()
+
+    if pdf_doc.pdf_type == "text-based":
+        # 未识别的页面直接提取文本作为识别结果：一次查询页面、一次打开文档、一次批量更新
+        pending_pages = dict(db.query(PDFPage.page_number, PDFPage.id).filter(
+            PDFPage.document_id == file_id,
+            PDFPage.ocr_status == False
+        ).all())
+        page_texts = extract_page_texts(file_path, sorted(pending_pages))
+        logger.info(f"文本型PDF提取文本: {file_id}, 共 {len(page_texts)} 页")
+        if page_texts:
+            db.execute(update(PDFPage), [
+                {"id": pending_pages[page_number], "ocr_text": text, "ocr_status": True}
+                for page_number, text in page_texts.items()
+            ])
+            index_pages(db, [
+                (pending_pages[page_number], file_id, page_number, text)
+                for page_number, text in page_texts.items()
+            ])
+            update_page_counters(db, file_id, processed=len(page_texts))
+        db.commit()
+    return pdf_doc.pdf_type
+
+def render_pdf_stage(db: Session, file_id: str, file_path: str) -> int:
+    """
+    渲染阶段：将PDF每一页转换为图片并记录图片路径和图片清单（按需渲染模式下跳过）
+    :return: 生成的图片数量
+    """
+    if is_lazy_render():
+        # 页面图片在首次访问时生成，视为图片已就绪
+        update_pdf_status(db, file_id, ProcessingStatus.IMAGES_GENERATED)
+        logger.info(f"按需渲染模式，跳过预渲染: {file_id}")
+        return 0
+
+    # 生成图片目录
+    images_dir = os.path.join(os.getenv("IMAGES_DIR", "./images"), file_id)
+    
+    # 转换PDF为图片
+    image_paths = pdf_to_images(file_path, images_dir)
+    
+    # 检查是否生成了图片
+    if image_paths:
+        # 批量更新数据库中的图片路径（保存相对路径）
+        page_ids = dict(db.query(PDFPage.page_number, PDFPage.id).filter(PDFPage.document_id == file_id).all())
+        images_root = os.getenv("IMAGES_DIR", "./images")
+        image_rows = [
+            {"id": page_ids[page_number], "image_path": os.path.relpath(image_path, images_root)}
+            for page_number, image_path in enumerate(image_paths, start=1)
+            if page_number in page_ids
+        ]
+        if image_rows:
+            db.execute(update(PDFPage), image_rows)
+
+        # 记录图片清单：原图和渲染时预生成的各尺寸图片
+        db.query(PageAsset).filter(PageAsset.document_id == file_id).delete()
+        asset_rows = []
+        for page_number, image_path in enumerate(image_paths, start=1):
+            asset_rows.append(_page_asset_row(file_id, page_number, ORIGINAL_ASSET, image_path, images_root))
+            for size in IMAGE_PREGENERATE_SIZES:
+                asset_rows.append(_page_asset_row(file_id, page_number, size, variant_path(image_path, size), images_root))
+        db.execute(insert(PageAsset), asset_rows)
+
+        # 图片路径、图片清单、已生成图片页数和图片生成完成状态在同一个事务中提交
+        pdf_doc = get_pdf_document(db, file_id)
+        pdf_doc.pages_rendered = len(image_rows)
+        pdf_doc.status = ProcessingStatus.IMAGES_GENERATED
+        invalidate_on_commit(db, file_id)
+        db.commit()
+        logger.info(f"PDF图片生成完成: {file_id}, 生成了 {len(image_paths)} 张图片")
+
+        # 打包存储：图片路径不变，打包后从打包文件读取；打包失败时保留单独的文件
+        if is_pack_store():
+            try:
+                pack_image_dir(images_dir)
+            except Exception as e:
+                logger.error(f"打包页面图片失败: {images_dir}, 错误: {str(e)}")
+    else:
+        # 如果没有生成图片，更新状态但不中断处理
+        logger.warning(f"PDF图片生成失败或未生成图片: {file_id}")
+    return len(image_paths)
+
 def process_pdf(db: Session, file_id: str, file_path: str) -> None:
     """
-    处理PDF文件：解析并保存信息到数据库，然后生成图片
+    处理PDF文件：依次执行解析、分类和渲染阶段
     """
     try:
-        # 更新状态为处理中
-        update_pdf_status(db, file_id, ProcessingStatus.PROCESSING)
-        
-        # 解析PDF信息
-        pdf_info = parse_pdf_info(file_path)
-        pdf_type = classify_and_extract(file_path)
-
-        # 更新PDF文档信息
-        pdf_doc = db.query(PDFDocument).filter(PDFDocument.id == file_id).first()
-        if pdf_doc:
-            pdf_doc.total_pages = pdf_info['total_pages']
-            pdf_doc.pdf_type = pdf_type['type']
-            pdf_doc.pdf_metadata = str(pdf_info['metadata'])
-
-            logger.info(f"PDF文档 {file_id} 总页数: {pdf_info['total_pages']}")
-            
-            # 为每一页创建记录
-            for page_number in range(pdf_info['total_pages']):
-                pdf_page = PDFPage(
-                    document_id = file_id,
-                    page_number = page_number + 1  # 页码从1开始
-                )
-                db.add(pdf_page)
-            
-            db.commit()
-            
-            # 更新状态为解析完成
-            update_pdf_status(db, file_id, ProcessingStatus.PARSED)
-            logger.info(f"PDF解析完成: {file_id}, 页数: {pdf_info['total_pages']}")
-            
-            # 生成图片目录
-            images_dir = os.path.join(os.getenv("IMAGES_DIR", "./images"), file_id)
-            
-            # 转换PDF为图片
-            image_paths = pdf_to_images(file_path, images_dir)
-            
-            # 检查是否生成了图片
-            if image_paths:
-                # 更新数据库中的图片路径
-                for i, image_path in enumerate(image_paths):
-                    page_number = i + 1
-                    pdf_page = db.query(PDFPage).filter(
-                        PDFPage.document_id == file_id,
-                        PDFPage.page_number == page_number
-                    ).first()
-                    
-                    if pdf_page:
-                        # 保存相对路径
-                        relative_path = os.path.relpath(image_path, os.getenv("IMAGES_DIR", "./images"))
-                        pdf_page.image_path = relative_path
-                
-                db.commit()
-                
-                # 更新状态为图片生成完成
-                update_pdf_status(db, file_id, ProcessingStatus.IMAGES_GENERATED)
-                logger.info(f"PDF图片生成完成: {file_id}, 生成了 {len(image_paths)} 张图片")
-            else:
-                # 如果没有生成图片，更新状态但不中断处理
-                logger.warning(f"PDF图片生成失败或未生成图片: {file_id}")
-                # 继续处理，但跳过OCR步骤
-            
-            # TODO: 实现OCR步骤
-            if pdf_doc.pdf_type == "text-based":
-                # 对每一页执行OCR
-                for page_number in range(pdf_info['total_pages']):
-                    pdf_page = db.query(PDFPage).filter(
-                        PDFPage.document_id == file_id,
-                        PDFPage.page_number == page_number + 1
-                    ).first()
-
-                    logger.info(f"处理PDF页面 {page_number + 1} 进行OCR")
-                    
-                    if pdf_page and not pdf_page.ocr_status:
-                       # 只直接将pdf转为文本并保存
-                       page_text = extract_text_from_page(file_path, page_number + 1)
-                       pdf_page.ocr_text = page_text
-                       pdf_page.ocr_status = True
-        db.commit()
+        if parse_pdf_stage(db, file_id, file_path):
+            classify_pdf_stage(db, file_id, file_path)
+            render_pdf_stage(db, file_id, file_path)
     except Exception as e:
-        if pdf_doc.pdf_type == "text-based":
-            # 回滚数据库操作
-            db.rollback()
-            error_msg = f"PDF OCR处理失败: {str(e)}"
-            logger.error(error_msg)
-            update_pdf_status(db, file_id, ProcessingStatus.ERROR, error_msg)
-        
+        # 回滚数据库操作
+        db.rollback()
         error_msg = f"PDF处理失败: {str(e)}"
         logger.error(error_msg)
         update_pdf_status(db, file_id, ProcessingStatus.ERROR, error_msg)
 
+def _read_page_image(image_path: str) -> tuple:
+    """
+    读取页面图片（单独的文件或打包文件中的图片）并计算哈希
+    :return: (图片内容, 图片哈希)
+    """
+    image_data = read_page_image(image_path)
+    if image_data is None:
+        raise FileNotFoundError(f"页面图片不存在: {image_path}")
+    return image_data, image_digest(image_data)
+
+def run_page_ocr(db: Session, pdf_doc: PDFDocument, page_number: int, image_path: str, use_cache: bool = True, backend: str = None) -> str:
+    """
+    对页面图片执行OCR识别，保存结果并更新文档处理状态
+    相同图片、模型和提示词的识别结果从OCR缓存中读取，不再重复调用模型
+    同步版本，供任务工作线程使用
+    :param pdf_doc: PDF文档
+    :param page_number: 页码（从1开始）
+    :param image_path: 页面图片路径
+    :param use_cache: 是否使用OCR缓存，False时强制重新识别并刷新缓存
+    :param backend: OCR后端名称，默认使用 OCR_BACKEND 配置
+    :return: 识别出的文本
+    """
+    from app.services.ocr_backends import get_ocr_backend, recognize_sync
+
+    ocr_backend = get_ocr_backend(backend)
+    image_data, image_hash = _read_page_image(image_path)
+
+    recognized_text = get_cached_ocr(db, image_hash, ocr_backend.model, ocr_backend.prompt) if use_cache else None
+    if recognized_text is None:
+        # 提交未命中统计后再调用模型，识别期间不占用数据库写锁
+        db.commit()
+        recognized_text = recognize_sync(ocr_backend, image_data, image_path)
+        put_cached_ocr(db, image_hash, ocr_backend.model, ocr_backend.prompt, recognized_text)
+    return save_page_ocr(db, pdf_doc, page_number, recognized_text)
+
+async def run_page_ocr_async(db: AsyncSession, pdf_doc: PDFDocument, page_number: int, image_path: str, use_cache: bool = True, backend: str = None) -> str:
+    """
+    run_page_ocr的异步版本，等待OCR后端和数据库时不占用线程，供API请求使用
+    缓存读写和结果保存复用同步版本的逻辑，通过 run_sync 在异步会话上执行
+    """
+    from app.services.ocr_backends import get_ocr_backend
+
+    ocr_backend = get_ocr_backend(backend)
+    image_data, image_hash = await asyncio.to_thread(_read_page_image, image_path)
+
+    recognized_text = None
+    if use_cache:
+        recognized_text = await db.run_sync(get_cached_ocr, image_hash, ocr_backend.model, ocr_backend.prompt)
+    if recognized_text is None:
+        # 提交未命中统计后再调用模型，识别期间不占用数据库写锁
+        await db.commit()
+        recognized_text = await ocr_backend.recognize(image_data, image_path)
+        await db.run_sync(put_cached_ocr, image_hash, ocr_backend.model, ocr_backend.prompt, recognized_text)
+    return await db.run_sync(save_page_ocr, pdf_doc, page_number, recognized_text)
+
+def save_page_ocr(db: Session, pdf_doc: PDFDocument, page_number: int, recognized_text: str) -> str:
+    """
+    保存页面OCR结果，并根据已识别页数更新文档处理状态
+    """
+    file_id = pdf_doc.id
+
+    # 确保识别文本不为空
+    if not recognized_text.strip():
+        logger.warning("OCR识别结果为空")
+    
+    try:
+        page = db.query(PDFPage).filter(
+            PDFPage.document_id == file_id,
+            PDFPage.page_number == page_number
+        ).first()
+        if page:
+            # 更新已存在的页面记录
+            page.ocr_text = recognized_text
+            page.updated_at = datetime.now()
+            logger.info(f"准备更新页面 {page_number} 的OCR结果")
+        else:
+            # 创建新的页面记录
+            page = PDFPage(
+                document_id=file_id,
+                page_number=page_number,
+                ocr_text=recognized_text,
+                ocr_status=False
+            )
+            db.add(page)
+            logger.info(f"准备创建页面 {page_number} 的OCR记录")
+        mark_page_processed(db, page)
+        invalidate_on_commit(db, file_id)
+        db.flush()
+        # 更新全文索引
+        index_page(db, page)
+        
+        # 检查是否所有页面都已完成OCR（读取文档的已OCR页数，不统计页面表）
+        total_pages = pdf_doc.total_pages
+        processed_pages = pdf_doc.pages_processed
+        
+        # 如果所有页面都已处理，更新文档状态
+        if processed_pages >= total_pages:
+            pdf_doc.status = ProcessingStatus.OCR_COMPLETED
+            logger.info(f"文档 {file_id} 所有页面OCR已完成")
+        elif pdf_doc.status != ProcessingStatus.PROCESSING:
+            # 如果还有页面未处理，确保状态为处理中
+            pdf_doc.status = ProcessingStatus.PROCESSING
+            logger.info(f"文档 {file_id} 更新为处理中状态")
+        
+        # 提交事务
+        db.commit()
+        logger.info(f"成功保存页面 {page_number} 的OCR结果到数据库")
+        logger.info(f"当前文档进度: {processed_pages}/{total_pages} 页已完成OCR")
+    except Exception as e:
+        # 发生错误时回滚事务
+        db.rollback()
+        logger.error(f"保存OCR结果到数据库失败: {str(e)}")
+        # 重新抛出异常，让上层处理
+        raise
+    return recognized_text
+
+def update_page_counters(db: Session, file_id: str, processed: int = 0, rendered: int = 0) -> None:
+    """
+    增减文档的已OCR页数和已生成图片页数（在调用方的事务中执行，由调用方提交）
+    使用 UPDATE ... SET n = n + k，多个工作进程同时更新同一文档时计数不会丢失
+    """
+    if not processed and not rendered:
+        return
+    invalidate_on_commit(db, file_id)
+    db.execute(
+        update(PDFDocument).where(PDFDocument.id == file_id).values(
+            pages_processed=PDFDocument.pages_processed + processed,
+            pages_rendered=PDFDocument.pages_rendered + rendered
+        ),
+        # 会话中已加载的文档对象重新读取计数，不按内存中的旧值计算
+        execution_options={"synchronize_session": "fetch"}
+    )
+
+def mark_page_processed(db: Session, page: PDFPage) -> bool:
+    """
+    将页面标记为已OCR，页面原来未完成时同时增加文档的已OCR页数
+    是否首次标记由带条件的UPDATE判断，不依据会话中已加载的页面状态：
+    同一页面同时被识别两次（批量任务和单页请求等）时只有一次会增加计数
+    :return: 是否为首次标记
+    """
+    if page.id is None:
+        # 新建的页面记录先写入以获得ID
+        db.flush()
+    result = db.execute(
+        update(PDFPage).where(PDFPage.id == page.id, PDFPage.ocr_status == False).values(ocr_status=True),
+        execution_options={"synchronize_session": False}
+    )
+    # 会话中的页面对象同步为已OCR（不再产生写入）
+    set_committed_value(page, "ocr_status", True)
+    if result.rowcount != 1:
+        return False
+    update_page_counters(db, page.document_id, processed=1)
+    return True
+
+def _count_page_progress(db: Session, file_id: str) -> tuple:
+    """
+    统计文档页面的 (已OCR页数, 已有图片页数)，用于整体重建计数
+    """
+    processed, rendered = db.execute(
+        select(
+            func.count(PDFPage.id).filter(PDFPage.ocr_status == True),
+            func.count(PDFPage.image_path)
+        ).where(PDFPage.document_id == file_id)
+    ).one()
+    return processed, rendered
+
 def get_pdf_document(db: Session, file_id: str) -> PDFDocument:
     """
     获取PDF文档信息
     """
     return db.query(PDFDocument).filter(PDFDocument.id == file_id).first()
 
-def get_pdf_pages(db: Session, file_id: str) -> list[PDFPage]:
+async def get_pdf_document_async(db: AsyncSession, file_id: str) -> PDFDocument:
+    """
+    get_pdf_document的异步版本
+    """
+    return await db.get(PDFDocument, file_id)
+
+def _document_meta_query(file_id: str):
+    return select(
+        PDFDocument.id,
+        PDFDocument.original_filename,
+        PDFDocument.file_path,
+        PDFDocument.content_hash,
+        PDFDocument.status,
+        PDFDocument.pdf_type,
+        PDFDocument.total_pages,
+        PDFDocument.error_message,
+        PDFDocument.pages_processed,
+        PDFDocument.pages_rendered,
+        PDFDocument.created_at,
+        PDFDocument.updated_at
+    ).where(PDFDocument.id == file_id)
+
+def get_document_meta(db: Session, file_id: str):
+    """
+    获取文档元数据（状态轮询、文件信息、下载等只读请求使用），按主键读取一行，页数直接使用文档上的计数
+    结果经过元数据缓存，文档在写入路径提交后失效；需要修改文档时使用 get_pdf_document
+    :return: 包含 id、original_filename、file_path、content_hash、status、pdf_type、total_pages、pages_processed、
+             pages_rendered、error_message、created_at、updated_at 的行；文档不存在时返回None
+    """
+    return cached((file_id, "document"), lambda: db.execute(_document_meta_query(file_id)).first())
+
+async def get_document_meta_async(db: AsyncSession, file_id: str):
+    """
+    get_document_meta的异步版本
+    """
+    async def load():
+        return (await db.execute(_document_meta_query(file_id))).first()
+    return await cached_async((file_id, "document"), load)
+
+def _page_summaries_query(file_id: str, include_text: bool):
+    columns = [
+        PDFPage.id,
+        PDFPage.document_id,
+        PDFPage.page_number,
+        PDFPage.image_path,
+        PDFPage.ocr_status,
+        PDFPage.created_at,
+        PDFPage.updated_at
+    ]
+    if include_text:
+        columns.append(PDFPage.ocr_text)
+    return select(*columns).where(PDFPage.document_id == file_id).order_by(PDFPage.page_number)
+
+def get_page_summaries(db: Session, file_id: str, include_text: bool = False) -> list:
+    """
+    获取文档各页的摘要信息（页码、图片路径、识别状态等），按页码排序
+    不含识别文本的结果经过元数据缓存，识别文本体积较大，每次从数据库读取
+    :param include_text: 是否同时返回识别文本，默认不读取
+    """
+    if include_text:
+        return db.execute(_page_summaries_query(file_id, True)).all()
+    return list(cached((file_id, "pages"), lambda: tuple(db.execute(_page_summaries_query(file_id, False)).all())))
+
+async def get_page_summaries_async(db: AsyncSession, file_id: str, include_text: bool = False) -> list:
+    """
+    get_page_summaries的异步版本
+    """
+    if include_text:
+        return (await db.execute(_page_summaries_query(file_id, True))).all()
+
+    async def load():
+        return tuple((await db.execute(_page_summaries_query(file_id, False))).all())
+    return list(await cached_async((file_id, "pages"), load))
+
+def encode_list_cursor(created_key: str, file_id: str) -> str:
+    """
+    生成文件列表的分页游标（上一页最后一条记录的 created_at 和 id）
+    """
+    return base64.urlsafe_b64encode(json.dumps([created_key, file_id]).encode("utf-8")).decode("ascii")
+
+def decode_list_cursor(cursor: str) -> tuple:
+    """
+    解析文件列表的分页游标，格式错误时抛出ValueError
+    """
+    try:
+        created_key, file_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(created_key), str(file_id)
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+def _list_documents_query(limit: int, cursor: str = None, status: Optional[ProcessingStatus] = None):
+    # 游标保存 created_at 在数据库中的原始文本，SQLite按文本比较时间，避免格式不一致导致比较错误
+    created_key = cast(PDFDocument.created_at, String)
+
+    query = select(
+        PDFDocument.id,
+        PDFDocument.original_filename,
+        PDFDocument.status,
+        PDFDocument.total_pages,
+        PDFDocument.error_message,
+        PDFDocument.created_at,
+        PDFDocument.updated_at,
+        PDFDocument.pages_processed,
+        PDFDocument.pages_rendered,
+        created_key.label("created_key")
+    )
+    if status is not None:
+        query = query.where(PDFDocument.status == status)
+    if cursor:
+        cursor_created, cursor_id = decode_list_cursor(cursor)
+        cursor_created = type_coerce(cursor_created, String)
+        query = query.where(or_(
+            PDFDocument.created_at < cursor_created,
+            and_(PDFDocument.created_at == cursor_created, PDFDocument.id < cursor_id)
+        ))
+    # 多取一条用于判断是否还有下一页
+    return query.order_by(PDFDocument.created_at.desc(), PDFDocument.id.desc()).limit(limit + 1)
+
+def _paginate_documents(rows: list, limit: int) -> tuple:
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_list_cursor(rows[-1].created_key, rows[-1].id)
+    return rows, next_cursor
+
+def list_pdf_documents(db: Session, limit: int = 50, cursor: str = None, status: Optional[ProcessingStatus] = None) -> tuple:
+    """
+    按创建时间倒序分页获取PDF文件列表
+    使用 (created_at, id) 游标分页，翻页耗时与文件总数无关
+    :param limit: 每页数量
+    :param cursor: 上一页返回的游标，None表示第一页
+    :param status: 只返回指定处理状态的文件
+    :return: (文件列表, 下一页游标，没有更多时为None)
+    """
+    rows = db.execute(_list_documents_query(limit, cursor, status)).all()
+    return _paginate_documents(rows, limit)
+
+async def list_pdf_documents_async(db: AsyncSession, limit: int = 50, cursor: str = None, status: Optional[ProcessingStatus] = None) -> tuple:
+    """
+    list_pdf_documents的异步版本
+    """
+    rows = (await db.execute(_list_documents_query(limit, cursor, status))).all()
+    return _paginate_documents(rows, limit)
+
+def _count_documents_query(status: Optional[ProcessingStatus] = None):
+    query = select(func.count(PDFDocument.id))
+    if status is not None:
+        query = query.where(PDFDocument.status == status)
+    return query
+
+def count_pdf_documents(db: Session, status: Optional[ProcessingStatus] = None) -> int:
+    """
+    统计PDF文件数量
+    """
+    return db.execute(_count_documents_query(status)).scalar()
+
+async def count_pdf_documents_async(db: AsyncSession, status: Optional[ProcessingStatus] = None) -> int:
+    """
+    count_pdf_documents的异步版本
+    """
+    return (await db.execute(_count_documents_query(status))).scalar()
+
+def _pdf_pages_query(file_id: str, with_text: bool = False, page_number: int = None):
+    query = select(PDFPage).where(PDFPage.document_id == file_id)
+    if page_number is not None:
+        query = query.where(PDFPage.page_number == page_number)
+    if with_text:
+        query = query.options(undefer(PDFPage.ocr_text))
+    return query.order_by(PDFPage.page_number)
+
+def get_pdf_pages(db: Session, file_id: str, with_text: bool = False) -> list[PDFPage]:
     """
     获取PDF的所有页面
+    :param with_text: 是否在同一次查询中加载识别文本（默认延迟加载，需要读取所有页文本时应传True）
+    """
+    return db.scalars(_pdf_pages_query(file_id, with_text)).all()
+
+async def get_pdf_pages_async(db: AsyncSession, file_id: str, with_text: bool = False) -> list[PDFPage]:
+    """
+    get_pdf_pages的异步版本
+    异步会话不能在访问属性时延迟加载，需要读取识别文本时必须传 with_text=True
+    """
+    return (await db.scalars(_pdf_pages_query(file_id, with_text))).all()
+
+async def get_pdf_page_async(db: AsyncSession, file_id: str, page_number: int, with_text: bool = False) -> Optional[PDFPage]:
+    """
+    获取PDF的指定页面，不存在时返回None
     """
-    return db.query(PDFPage).filter(PDFPage.document_id == file_id).order_by(PDFPage.page_number).all()
\ No newline at end of file
+    return (await db.scalars(_pdf_pages_query(file_id, with_text, page_number))).first()
@@ -0,0 +1,257 @@
+import re
+import logging
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import Column, Integer, MetaData, String, Table, Text, delete, insert, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.database.database import IS_SQLITE
+from app.database.models import PDFDocument, PDFPage
+
+logger = logging.getLogger(__name__)
+
+# 页面全文索引（SQLite FTS5虚拟表），rowid 与 pdf_pages.id 相同
+# 索引中保存分词后的文本副本，用于生成摘要片段
+SEARCH_TABLE = "pdf_page_fts"
+_search_metadata = MetaData()
+page_search_index = Table(
+    SEARCH_TABLE,
+    _search_metadata,
+    Column("rowid", Integer, primary_key=True),
+    Column("text", Text),
+    Column("document_id", String),
+    Column("page_number", Integer),
+)
+
+# 中日韩文字没有空格分词，unicode61分词器会把连续的汉字当成一个词
+# 写入索引前在每个字前后插入分隔符，查询时按短语匹配连续的字
+# 分隔符使用不可见的零宽字符（U+2060），分词器按分隔处理，生成摘要时整体去掉，原文中的空格保持不变
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_CJK_CHAR = re.compile(f"([{_CJK}])")
+_SEPARATOR = "\u2060"
+_SEPARATORS = re.compile(f"{_SEPARATOR}+")
+_SEPARATOR_AT_SPACE = re.compile(f"{_SEPARATOR}? {_SEPARATOR}?")
+_SPACES = re.compile(r"\s+")
+
+# 摘要片段的高亮标记和长度（词数，汉字按字计）
+SNIPPET_OPEN = "<mark>"
+SNIPPET_CLOSE = "</mark>"
+SNIPPET_TOKENS = 32
+
+def segment_text(content: Optional[str]) -> str:
+    """
+    把文本转换为索引使用的分词形式：汉字等逐字分隔，其余空白合并
+    """
+    if not content:
+        return ""
+    segmented = _SPACES.sub(" ", _CJK_CHAR.sub(rf"{_SEPARATOR}\1{_SEPARATOR}", content.replace(_SEPARATOR, "")))
+    # 空白处和首尾已经分隔，不再插入分隔符
+    segmented = _SEPARATOR_AT_SPACE.sub(" ", _SEPARATORS.sub(_SEPARATOR, segmented))
+    return segmented.strip(f" {_SEPARATOR}")
+
+def _restore_snippet(snippet: str) -> str:
+    """
+    去掉分词时在汉字前后插入的分隔符
+    """
+    return (snippet or "").replace(_SEPARATOR, "")
+
+def build_match_query(query: str) -> str:
+    """
+    把用户输入转换为FTS5查询：按空白拆分为多个词，每个词作为短语匹配，多个词同时出现
+    所有内容都放在引号内，用户输入的运算符不会被当作查询语法
+    """
+    phrases = []
+    for term in query.split():
+        segmented = segment_text(term)
+        if segmented:
+            phrases.append('"' + segmented.replace('"', '""') + '"')
+    return " ".join(phrases)
+
+def create_search_index(bind) -> None:
+    """
+    创建全文索引虚拟表（已存在时跳过），非SQLite数据库不创建
+    """
+    if not IS_SQLITE:
+        return
+    statement = text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        "text, document_id UNINDEXED, page_number UNINDEXED, tokenize='unicode61')"
+    )
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            conn.execute(statement)
+    else:
+        bind.execute(statement)
+
+def rebuild_search_index(conn: Connection) -> int:
+    """
+    根据所有已有识别文本的页面重建全文索引
+    :return: 写入索引的页数
+    """
+    if not IS_SQLITE:
+        return 0
+    create_search_index(conn)
+    conn.execute(delete(page_search_index))
+    indexed = 0
+    # 按列类型读取（压缩保存的文本读取时解压）
+    rows = conn.execute(
+        select(PDFPage.id, PDFPage.document_id, PDFPage.page_number, PDFPage.ocr_text).where(PDFPage.ocr_text != None)
+    )
+    while True:
+        batch = rows.fetchmany(1000)
+        if not batch:
+            break
+        batch = [row for row in batch if row.ocr_text and row.ocr_text.strip()]
+        if batch:
+            conn.execute(insert(page_search_index), [
+                {"rowid": row.id, "text": segment_text(row.ocr_text), "document_id": row.document_id, "page_number": row.page_number}
+                for row in batch
+            ])
+        indexed += len(batch)
+    return indexed
+
+def index_pages(db: Session, pages: Iterable[Tuple[int, str, int, Optional[str]]]) -> None:
+    """
+    更新页面的全文索引（在调用方的事务中执行，由调用方提交）
+    :param pages: (页面ID, 文档ID, 页码, 识别文本) 列表，文本为空时从索引中移除
+    """
+    if not IS_SQLITE:
+        return
+    pages = list(pages)
+    if not pages:
+        return
+    db.execute(delete(page_search_index).where(page_search_index.c.rowid.in_([page[0] for page in pages])))
+    rows = [
+        {"rowid": page_id, "text": segment_text(content), "document_id": document_id, "page_number": page_number}
+        for page_id, document_id, page_number, content in pages
+        if content and content.strip()
+    ]
+    if rows:
+        db.execute(insert(page_search_index), rows)
+
+def index_page(db: Session, page: PDFPage) -> None:
+    """
+    更新单个页面的全文索引，页面需已写入数据库（有ID）
+    """
+    index_pages(db, [(page.id, page.document_id, page.page_number, page.ocr_text)])
+
+def remove_document_from_index(db: Session, file_id: str) -> None:
+    """
+    从全文索引中移除文档的所有页面（按页面ID删除，不扫描索引）
+    """
+    if not IS_SQLITE:
+        return
+    page_ids = db.query(PDFPage.id).filter(PDFPage.document_id == file_id)
+    db.execute(delete(page_search_index).where(page_search_index.c.rowid.in_(page_ids.scalar_subquery())))
+
+def copy_document_index(db: Session, source_id: str, file_id: str) -> None:
+    """
+    复用相同内容文档的结果时，按页码复制来源文档的索引内容
+    """
+    if not IS_SQLITE:
+        return
+    remove_document_from_index(db, file_id)
+    db.execute(text(f"""
+        INSERT INTO {SEARCH_TABLE} (rowid, text, document_id, page_number)
+        SELECT target.id, source_index.text, target.document_id, target.page_number
+        FROM pdf_pages AS target
+        JOIN pdf_pages AS source ON source.document_id = :source_id AND source.page_number = target.page_number
+        JOIN {SEARCH_TABLE} AS source_index ON source_index.rowid = source.id
+        WHERE target.document_id = :file_id
+    """), {"source_id": source_id, "file_id": file_id})
+
+def _search_query(match_query: str, query: str, limit: int, offset: int, file_id: str = None):
+    """
+    构造搜索语句：SQLite使用FTS5索引按相关度排序，其他数据库按子串匹配
+    """
+    if not IS_SQLITE:
+        return _like_search_query(query, limit, offset, file_id)
+
+    document_filter = "AND f.document_id = :file_id" if file_id else ""
+    return text(f"""
+        SELECT f.document_id, f.page_number, d.original_filename,
+               snippet({SEARCH_TABLE}, 0, :open, :close, '…', :tokens) AS snippet,
+               bm25({SEARCH_TABLE}) AS score
+        FROM {SEARCH_TABLE} AS f
+        JOIN pdf_documents AS d ON d.id = f.document_id
+        WHERE {SEARCH_TABLE} MATCH :query {document_filter}
+        ORDER BY score
+        LIMIT :limit OFFSET :offset
+    """).bindparams(
+        open=SNIPPET_OPEN,
+        close=SNIPPET_CLOSE,
+        tokens=SNIPPET_TOKENS,
+        query=match_query,
+        limit=limit,
+        offset=offset,
+        **({"file_id": file_id} if file_id else {})
+    )
+
+def _search_results(rows, query: str) -> List[dict]:
+    if not IS_SQLITE:
+        return _like_search_results(rows, query)
+    return [
+        {
+            "file_id": row.document_id,
+            "original_filename": row.original_filename,
+            "page_number": row.page_number,
+            "snippet": _restore_snippet(row.snippet),
+            # bm25越小越相关，取反使分数越大越相关
+            "score": round(-row.score, 6)
+        }
+        for row in rows
+    ]
+
+def search_pages(db: Session, query: str, limit: int = 20, offset: int = 0, file_id: str = None) -> List[dict]:
+    """
+    全文搜索页面识别文本，按相关度排序
+    :param query: 搜索内容，多个词用空格分隔（需同时出现）
+    :param file_id: 只搜索指定文档
+    :return: [{file_id, original_filename, page_number, snippet, score}]
+    """
+    match_query = build_match_query(query)
+    if not match_query:
+        return []
+    rows = db.execute(_search_query(match_query, query, limit, offset, file_id))
+    return _search_results(rows, query)
+
+async def search_pages_async(db: AsyncSession, query: str, limit: int = 20, offset: int = 0, file_id: str = None) -> List[dict]:
+    """
+    search_pages的异步版本
+    """
+    match_query = build_match_query(query)
+    if not match_query:
+        return []
+    rows = await db.execute(_search_query(match_query, query, limit, offset, file_id))
+    return _search_results(rows, query)
+
+def _like_search_query(query: str, limit: int, offset: int, file_id: str = None):
+    """
+    非SQLite数据库没有FTS5索引，按子串匹配搜索（不排序相关度）
+    """
+    statement = select(PDFPage.document_id, PDFPage.page_number, PDFPage.ocr_text, PDFDocument.original_filename).join(
+        PDFDocument, PDFDocument.id == PDFPage.document_id
+    )
+    for term in query.split():
+        statement = statement.where(PDFPage.ocr_text.ilike(f"%{term}%"))
+    if file_id:
+        statement = statement.where(PDFPage.document_id == file_id)
+    return statement.order_by(PDFPage.document_id, PDFPage.page_number).limit(limit).offset(offset)
+
+def _like_search_results(rows, query: str) -> List[dict]:
+    results = []
+    first_term = query.split()[0]
+    for row in rows:
+        position = row.ocr_text.lower().find(first_term.lower())
+        start = max(position - SNIPPET_TOKENS, 0)
+        end = position + len(first_term) + SNIPPET_TOKENS
+        snippet = row.ocr_text[start:position] + SNIPPET_OPEN + row.ocr_text[position:position + len(first_term)] \
+            + SNIPPET_CLOSE + row.ocr_text[position + len(first_term):end]
+        results.append({
+            "file_id": row.document_id,
+            "original_filename": row.original_filename,
+            "page_number": row.page_number,
+            "snippet": snippet,
+            "score": None
+        })
+    return results
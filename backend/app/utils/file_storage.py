@@ -0,0 +1,148 @@
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+from typing import Tuple
+from fastapi import Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+# 上传文件分块写入磁盘的大小，默认1MB
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", "1048576"))
+# multipart请求体中除文件内容外的分隔符和各部分头部允许的大小，按 Content-Length 预先检查时计入
+MULTIPART_OVERHEAD = 64 * 1024
+
+class FileTooLargeError(ValueError):
+    """
+    上传文件超过大小限制
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"文件大小超过限制 ({max_size / 1048576}MB)")
+
+class InvalidUploadError(ValueError):
+    """
+    上传请求格式错误（不是multipart请求、缺少文件字段或请求体不完整）
+    """
+    pass
+
+class _UploadPartReader:
+    """
+    multipart解析回调：记录各部分的头部，只收集指定字段的文件内容
+    """
+
+    def __init__(self, field_name: str, max_size: int):
+        self.field_name = field_name.encode("utf-8")
+        self.max_size = max_size
+        self.filename = None
+        self.size = 0
+        self.complete = False
+        self.pending = bytearray()  # 本次写入解析器的数据中属于文件的部分
+        self._in_file = False
+        self._header_field = b""
+        self._header_value = b""
+        self._headers = {}
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        }
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        # 只接收第一个同名的文件字段
+        if options.get(b"name") == self.field_name and b"filename" in options and self.filename is None:
+            self.filename = options[b"filename"].decode("utf-8", errors="replace")
+            self._in_file = True
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self._in_file:
+            return
+        self.size += end - start
+        if self.size > self.max_size:
+            raise FileTooLargeError(self.max_size)
+        self.pending += data[start:end]
+
+    def _on_part_end(self) -> None:
+        if self._in_file:
+            self._in_file = False
+            self.complete = True
+
+async def save_upload_stream(request: Request, target_dir: str, max_size: int, field_name: str = "file",
+                             chunk_size: int = None) -> Tuple[str, str, int, str]:
+    """
+    直接从请求体流式解析multipart上传，将文件字段写入磁盘，同时计算内容哈希
+    不经过 UploadFile（Starlette会先把整个请求体接收到临时文件），文件只写入一次；
+    Content-Length 超过限制时不读取请求体直接拒绝，没有 Content-Length（分块传输）时在接收过程中
+    一旦超过大小限制立即中止并删除临时文件。内存占用与文件大小无关，写入磁盘在线程池中执行，不阻塞事件循环
+    :param request: 上传请求（multipart/form-data）
+    :param target_dir: 临时文件所在目录（与最终存放目录相同，便于原子重命名）
+    :param max_size: 最大文件大小（字节）
+    :param field_name: 文件字段名
+    :param chunk_size: 写入磁盘的分块大小（字节）
+    :return: (临时文件路径, 原始文件名, 文件大小, SHA-256十六进制哈希)
+    :raises FileTooLargeError: 文件超过大小限制
+    :raises InvalidUploadError: 请求格式错误
+    """
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_size + MULTIPART_OVERHEAD:
+        raise FileTooLargeError(max_size)
+
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise InvalidUploadError("请求必须是包含文件的 multipart/form-data")
+
+    os.makedirs(target_dir, exist_ok=True)
+    reader = _UploadPartReader(field_name, max_size)
+    parser = MultipartParser(options[b"boundary"], reader.callbacks())
+    hasher = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(prefix=".upload_", suffix=".part", dir=target_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for body in request.stream():
+                parser.write(body)
+                # 积累到分块大小后再写入，减少线程切换
+                if len(reader.pending) >= chunk_size:
+                    data = bytes(reader.pending)
+                    reader.pending.clear()
+                    hasher.update(data)
+                    await asyncio.to_thread(f.write, data)
+            parser.finalize()
+            if reader.pending:
+                data = bytes(reader.pending)
+                hasher.update(data)
+                await asyncio.to_thread(f.write, data)
+        if reader.filename is None:
+            raise InvalidUploadError(f"缺少文件字段: {field_name}")
+        if not reader.complete:
+            raise InvalidUploadError("上传的请求体不完整")
+    except BaseException:
+        # 出错（包括超过大小限制、客户端断开）时清理不完整的临时文件
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return tmp_path, reader.filename, reader.size, hasher.hexdigest()
@@ -0,0 +1,147 @@
+import os
+import re
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Union
+from urllib.parse import quote
+from dotenv import load_dotenv
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+# 加载环境变量
+load_dotenv()
+
+# 非内容寻址资源（页面图片等）的浏览器缓存时间（秒），过期后用ETag重新验证
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "86400"))
+# 内容寻址资源（地址对应的内容不会变化）可以永久缓存
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def make_etag(*parts) -> str:
+    """
+    由内容哈希等标识生成强ETag
+    """
+    digest = hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    If-None-Match 使用弱比较（忽略 W/ 前缀），可以包含多个ETag或 *
+    """
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """
+    判断客户端缓存是否仍然有效；有 If-None-Match 时忽略 If-Modified-Since
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def _cache_headers(etag: str, mtime: float, immutable: bool) -> dict:
+    return {
+        "etag": etag,
+        "last-modified": formatdate(mtime, usegmt=True),
+        "cache-control": IMMUTABLE_CACHE_CONTROL if immutable else f"public, max-age={HTTP_CACHE_MAX_AGE}"
+    }
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def _parse_range(http_range: str, size: int):
+    """
+    解析单个字节范围
+    :return: (起始, 结束) 闭区间；多个范围或格式无法识别时返回None（返回完整内容）；范围无法满足时返回False
+    """
+    match = _RANGE_PATTERN.match(http_range.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    start, end = match.groups()
+    if start == "":
+        # bytes=-N 表示最后N个字节
+        length = int(end)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+def cached_bytes_response(
+    request: Request,
+    data: Union[bytes, memoryview],
+    mtime: float,
+    content_key: tuple,
+    immutable: bool = False,
+    media_type: Optional[str] = None,
+    filename: Optional[str] = None
+) -> Response:
+    """
+    cached_file_response 的内存数据版本（打包文件中的页面图片），数据直接作为响应体发送，不复制
+    支持单个字节范围的Range请求，多个范围时返回完整内容
+    :param mtime: 数据的修改时间（Last-Modified）
+    :param content_key: 标识内容的键，与数据大小一起生成ETag
+    """
+    size = len(data)
+    etag = make_etag(*content_key, size)
+    headers = _cache_headers(etag, mtime, immutable)
+    headers["accept-ranges"] = "bytes"
+    if filename is not None:
+        headers["content-disposition"] = f"attachment; filename*=utf-8''{quote(filename)}"
+
+    if _not_modified(request, etag, mtime):
+        return Response(status_code=304, headers=headers)
+
+    http_range = request.headers.get("range")
+    http_if_range = request.headers.get("if-range")
+    if http_range and (http_if_range is None or http_if_range in (etag, headers["last-modified"])):
+        byte_range = _parse_range(http_range, size)
+        if byte_range is False:
+            return Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+        if byte_range:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            return Response(content=data[start:end + 1], status_code=206, headers=headers, media_type=media_type)
+
+    return Response(content=data, headers=headers, media_type=media_type)
+
+def cached_file_response(
+    request: Request,
+    path: str,
+    content_key: Optional[tuple] = None,
+    immutable: bool = False,
+    media_type: Optional[str] = None,
+    filename: Optional[str] = None
+) -> Response:
+    """
+    返回带缓存验证头的文件响应
+    - 客户端缓存有效时返回304，不读取文件
+    - Range/If-Range 请求由 FileResponse 按字节范围返回（206），If-Range 与这里的ETag比较
+    :param content_key: 标识文件内容的键（如文档内容哈希、页码和图片尺寸），与文件大小一起生成ETag，
+                        文件重新生成（按需渲染模式下被淘汰后重新渲染）时ETag不变；None时使用文件修改时间
+    :param immutable: 内容寻址的资源，设置永久缓存；否则缓存 HTTP_CACHE_MAX_AGE 秒后重新验证
+    """
+    stat_result = os.stat(path)
+    etag = make_etag(*(content_key or (stat_result.st_mtime,)), stat_result.st_size)
+    headers = _cache_headers(etag, stat_result.st_mtime, immutable)
+
+    if _not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(
+        path=path,
+        headers=headers,
+        media_type=media_type,
+        filename=filename,
+        stat_result=stat_result
+    )
@@ -1,7 +1,14 @@
 import os
-from typing import List, Optional, Dict, Any
+import threading
+import multiprocessing
+from typing import List, Optional, Dict, Any, Tuple
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
+from app.utils.image_variants import IMAGE_PREGENERATE_SIZES, save_image_variants
+from app.utils.image_encoding import (
+    PageImageEncoding, PAGE_IMAGE_ENCODING, page_image_filename, pixmap_to_image, encode_page_image
+)
 
 # 尝试导入PyMuPDF (fitz)
 HAS_PYMUPDF = False
@@ -21,13 +28,99 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
-def pdf_to_images(pdf_path: str, output_dir: str, dpi: int = 300) -> List[str]:
+def default_render_workers(pipeline_processes: int = None) -> int:
+    """
+    每个处理流程工作进程的默认渲染进程数：CPU核数按处理流程工作进程数平分，避免多个进程同时渲染时超额占用CPU
+    :param pipeline_processes: 处理流程工作进程数，默认读取 JOB_WORKER_CONCURRENCY
+    """
+    if pipeline_processes is None:
+        pipeline_processes = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+    return max(1, (os.cpu_count() or 1) // max(1, pipeline_processes))
+
+# 渲染进程数，<=1 时使用单进程串行渲染
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS") or default_render_workers())
+# 页数少于该值时不启用多进程（进程启动开销大于收益）
+RENDER_PARALLEL_MIN_PAGES = int(os.getenv("RENDER_PARALLEL_MIN_PAGES", "8"))
+
+def _render_page_range(
+    pdf_path: str,
+    output_dir: str,
+    start: int,
+    end: int,
+    dpi: int,
+    encoding: Optional[PageImageEncoding] = None,
+    pregenerate: bool = True
+) -> List[str]:
+    """
+    渲染指定页码区间 [start, end) 的页面，每次调用打开独立的fitz文档句柄
+    （fitz文档对象不能跨进程共享，多进程模式下由每个工作进程自行打开）
+    :param pdf_path: PDF文件路径
+    :param output_dir: 输出图片目录
+    :param start: 起始页索引（从0开始，包含）
+    :param end: 结束页索引（不包含）
+    :param dpi: 图片分辨率
+    :param encoding: 图片编码方式，None时使用 PAGE_IMAGE_FORMAT 配置
+    :param pregenerate: 是否同时生成 IMAGE_PREGENERATE_SIZES 配置的缩略图
+    :return: 按页码顺序生成的图片文件路径列表
+    """
+    encoding = encoding or PAGE_IMAGE_ENCODING
+    pregenerate_sizes = IMAGE_PREGENERATE_SIZES if pregenerate else []
+    # 计算缩放因子，PyMuPDF的默认DPI约为72
+    zoom = dpi / 72.0
+    matrix = fitz.Matrix(zoom, zoom)
+    colorspace = fitz.csGRAY if encoding.grayscale else fitz.csRGB
+
+    image_paths = []
+    pdf_document = fitz.open(pdf_path)
+    try:
+        for page_number in range(start, end):
+            # 将页面转换为图片
+            pix = pdf_document[page_number].get_pixmap(matrix=matrix, colorspace=colorspace)
+
+            # 构造图片文件名并保存
+            image_path = os.path.join(output_dir, page_image_filename(page_number + 1, encoding))
+            img = pixmap_to_image(pix) if pregenerate_sizes or encoding.uses_pillow else None
+            # 先写入临时文件再改名，同时读取该图片的请求不会读到不完整的文件
+            tmp_path = f"{image_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                encode_page_image(pix, tmp_path, encoding, img)
+                os.replace(tmp_path, image_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            image_paths.append(image_path)
+            # 同时生成缩略图等常用尺寸，复用已渲染的像素，不再重新解码原图
+            if pregenerate_sizes:
+                save_image_variants(img, image_path, pregenerate_sizes)
+            logger.debug(f"生成图片: {image_path}")
+    finally:
+        pdf_document.close()
+    return image_paths
+
+def _split_page_ranges(total_pages: int, workers: int) -> List[Tuple[int, int]]:
+    """
+    将页码切分为连续的区间，每个工作进程负责若干个区间
+    区间数量多于进程数，避免某个进程分到的页面特别复杂而拖慢整体
+    """
+    chunks = min(total_pages, workers * 4)
+    size, remainder = divmod(total_pages, chunks)
+    ranges = []
+    start = 0
+    for i in range(chunks):
+        end = start + size + (1 if i < remainder else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+def pdf_to_images(pdf_path: str, output_dir: str, dpi: int = 300, workers: Optional[int] = None) -> List[str]:
     """
     将PDF文件的每一页转换为图片
     :param pdf_path: PDF文件路径
     :param output_dir: 输出图片目录
     :param dpi: 图片分辨率 (PyMuPDF使用zoom参数，这里进行换算)
-    :return: 生成的图片文件路径列表
+    :param workers: 渲染进程数，默认读取 RENDER_WORKERS；<=1 时串行渲染
+    :return: 生成的图片文件路径列表（按页码顺序）
     """
     try:
         # 确保输出目录存在
@@ -41,36 +134,30 @@ def pdf_to_images(pdf_path: str, output_dir: str, dpi: int = 300) -> List[str]:
         
         # 如果PyMuPDF可用，则使用它进行转换
         if HAS_PYMUPDF:
-            # 打开PDF文档
-            pdf_document = fitz.open(pdf_path)
-            pdf_filename = os.path.splitext(os.path.basename(pdf_path))[0]
-            image_paths = []
-            
-            # 计算缩放因子，PyMuPDF的默认DPI约为72
-            zoom = dpi / 72.0
-            matrix = fitz.Matrix(zoom, zoom)
-            
-            logger.info(f"开始使用PyMuPDF转换PDF为图片: {pdf_path}, 总页数: {len(pdf_document)}")
-            
-            # 遍历每一页
-            for page_number in range(len(pdf_document)):
-                # 获取页面
-                page = pdf_document[page_number]
-                
-                # 将页面转换为图片
-                pix = page.get_pixmap(matrix=matrix)
-                
-                # 构造图片文件名
-                image_filename = f"p_{page_number + 1}.png"
-                image_path = os.path.join(output_dir, image_filename)
-                
-                # 保存图片
-                pix.save(image_path)
-                image_paths.append(image_path)
-                logger.info(f"生成图片: {image_path}")
-            
-            # 关闭PDF文档
-            pdf_document.close()
+            # 获取总页数
+            with fitz.open(pdf_path) as pdf_document:
+                total_pages = len(pdf_document)
+
+            if workers is None:
+                workers = RENDER_WORKERS
+            workers = max(1, min(workers, total_pages))
+
+            if workers > 1 and total_pages >= RENDER_PARALLEL_MIN_PAGES:
+                logger.info(f"开始使用PyMuPDF多进程转换PDF为图片: {pdf_path}, 总页数: {total_pages}, 进程数: {workers}")
+                ranges = _split_page_ranges(total_pages, workers)
+                image_paths = []
+                # 工作进程中已有心跳等线程和数据库连接，fork可能复制到持有中的锁，使用spawn启动渲染进程
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    futures = [
+                        executor.submit(_render_page_range, pdf_path, output_dir, start, end, dpi)
+                        for start, end in ranges
+                    ]
+                    # 按提交顺序收集结果，保证图片路径与页码顺序一致
+                    for future in futures:
+                        image_paths.extend(future.result())
+            else:
+                logger.info(f"开始使用PyMuPDF转换PDF为图片: {pdf_path}, 总页数: {total_pages}")
+                image_paths = _render_page_range(pdf_path, output_dir, 0, total_pages, dpi)
             
             logger.info(f"PDF转换完成: {pdf_path}, 生成了 {len(image_paths)} 张图片")
             return image_paths
@@ -87,6 +174,23 @@ def pdf_to_images(pdf_path: str, output_dir: str, dpi: int = 300) -> List[str]:
         logger.error(f"PDF处理失败: {pdf_path}, 错误: {str(e)}")
         raise
 
+def render_page(pdf_path: str, output_dir: str, page_number: int, dpi: int = 300, encoding: Optional[PageImageEncoding] = None) -> str:
+    """
+    渲染PDF的单个页面（按需渲染模式使用）
+    只生成原图，不预生成缩略图：缩略图在请求时通过渲染缓存生成，计入缓存预算
+    :param pdf_path: PDF文件路径
+    :param output_dir: 输出图片目录
+    :param page_number: 页码（从1开始）
+    :param dpi: 图片分辨率
+    :param encoding: 图片编码方式，None时使用 PAGE_IMAGE_FORMAT 配置
+    :return: 生成的图片文件路径
+    """
+    if not HAS_PYMUPDF:
+        raise RuntimeError("PyMuPDF不可用，无法渲染PDF页面")
+
+    os.makedirs(output_dir, exist_ok=True)
+    return _render_page_range(pdf_path, output_dir, page_number - 1, page_number, dpi, encoding, pregenerate=False)[0]
+
 def get_pdf_info_using_pypdf2(pdf_path: str) -> Dict[str, Any]:
     """
     使用PyPDF2获取PDF的基本信息
@@ -114,7 +218,7 @@ def optimize_image(image_path: str, max_width: int = None, max_height: int = Non
     :param image_path: 图片路径
     :param max_width: 最大宽度
     :param max_height: 最大高度
-    :param quality: 图片质量
+    :param quality: 图片质量（只用于JPEG/WebP等有损格式，PNG为无损格式，使用 optimize 压缩）
     :return: 优化后的图片路径
     """
     try:
@@ -135,8 +239,14 @@ def optimize_image(image_path: str, max_width: int = None, max_height: int = Non
                 if new_size != (width, height):
                     img = img.resize(new_size, Image.LANCZOS)
             
-            # 保存优化后的图片
-            img.save(image_path, 'PNG', quality=quality)
+            # 按原来的格式保存优化后的图片
+            image_format = Image.registered_extensions().get(os.path.splitext(image_path)[1].lower(), img.format)
+            if image_format == 'PNG':
+                img.save(image_path, 'PNG', optimize=True)
+            else:
+                if image_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+                    img = img.convert('RGB')
+                img.save(image_path, image_format, quality=quality)
             logger.info(f"图片优化完成: {image_path}")
         
         return image_path
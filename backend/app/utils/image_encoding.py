@@ -0,0 +1,148 @@
+import os
+import logging
+from typing import NamedTuple, Optional
+from PIL import Image
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 扩展名 -> (Pillow格式, 媒体类型)
+_FORMATS = {
+    "png": (".png", "PNG", "image/png"),
+    "webp": (".webp", "WEBP", "image/webp"),
+    "jpeg": (".jpg", "JPEG", "image/jpeg")
+}
+# JPEG未指定质量时的默认值
+DEFAULT_JPEG_QUALITY = 90
+
+class PageImageEncoding(NamedTuple):
+    """
+    页面原图的编码方式
+    """
+    format: str  # png / webp / jpeg
+    compress_level: Optional[int] = None  # PNG的zlib压缩级别，None表示使用PyMuPDF内置的PNG编码
+    quality: Optional[int] = None  # WebP/JPEG的有损压缩质量，WebP为None时无损
+    grayscale: bool = False  # 按灰度渲染（扫描的黑白文档像素数据只有彩色的1/3）
+
+    @property
+    def extension(self) -> str:
+        return _FORMATS[self.format][0]
+
+    @property
+    def media_type(self) -> str:
+        return _FORMATS[self.format][2]
+
+    @property
+    def uses_pillow(self) -> bool:
+        """
+        是否需要转换为Pillow图片编码（只有默认的PNG直接由PyMuPDF编码）
+        """
+        return self.format != "png" or self.compress_level is not None
+
+    def __str__(self) -> str:
+        if self.format == "png":
+            spec = "png" if self.compress_level is None else f"png:{self.compress_level}"
+        else:
+            spec = f"{self.format}:{'lossless' if self.quality is None else self.quality}"
+        return f"{spec}+gray" if self.grayscale else spec
+
+def parse_image_encoding(spec: str, grayscale: bool = False) -> PageImageEncoding:
+    """
+    解析编码配置
+    :param spec: png | png:<0-9> | webp:lossless | webp:<1-100> | jpeg[:<1-100>]（jpg同jpeg）
+    :param grayscale: 是否按灰度渲染
+    :raises ValueError: 配置无效
+    """
+    name, _, option = spec.strip().lower().partition(":")
+    name = "jpeg" if name == "jpg" else name
+    if name not in _FORMATS:
+        raise ValueError(f"不支持的页面图片格式: {spec}，可选: png、webp、jpeg")
+
+    if name == "png":
+        if not option:
+            return PageImageEncoding("png", grayscale=grayscale)
+        if not option.isdigit() or not 0 <= int(option) <= 9:
+            raise ValueError(f"PNG压缩级别必须是0-9: {spec}")
+        return PageImageEncoding("png", compress_level=int(option), grayscale=grayscale)
+
+    if name == "webp" and option in ("", "lossless"):
+        return PageImageEncoding("webp", grayscale=grayscale)
+    if not option:
+        return PageImageEncoding(name, quality=DEFAULT_JPEG_QUALITY, grayscale=grayscale)
+    if not option.isdigit() or not 1 <= int(option) <= 100:
+        raise ValueError(f"图片质量必须是1-100: {spec}")
+    return PageImageEncoding(name, quality=int(option), grayscale=grayscale)
+
+def _load_page_image_encoding() -> PageImageEncoding:
+    grayscale = os.getenv("PAGE_IMAGE_GRAYSCALE", "false").lower() == "true"
+    try:
+        return parse_image_encoding(os.getenv("PAGE_IMAGE_FORMAT", "png"), grayscale)
+    except ValueError as e:
+        logger.warning(f"{str(e)}，使用png")
+        return PageImageEncoding("png", grayscale=grayscale)
+
+# 页面原图的编码方式，默认PyMuPDF编码的PNG；有损格式会影响OCR识别效果，
+# 可以先用 python -m benchmarks.image_encoding_benchmark 对比文件大小和编码耗时
+PAGE_IMAGE_ENCODING = _load_page_image_encoding()
+
+def page_image_filename(page_number: int, encoding: PageImageEncoding = None) -> str:
+    """
+    页面原图的文件名，例如 p_1.png
+    """
+    return f"p_{page_number}{(encoding or PAGE_IMAGE_ENCODING).extension}"
+
+def encoding_for_path(image_path: str) -> PageImageEncoding:
+    """
+    按文件扩展名确定编码方式：与当前配置相同时使用配置，否则使用该格式的默认参数
+    （修改配置前记录的图片路径仍按原来的格式渲染）
+    """
+    extension = os.path.splitext(image_path)[1].lower()
+    if extension == PAGE_IMAGE_ENCODING.extension:
+        return PAGE_IMAGE_ENCODING
+    for name, (format_extension, _, _) in _FORMATS.items():
+        if extension == format_extension or (name == "jpeg" and extension == ".jpeg"):
+            return parse_image_encoding(name, PAGE_IMAGE_ENCODING.grayscale)
+    return PageImageEncoding("png", grayscale=PAGE_IMAGE_ENCODING.grayscale)
+
+def image_media_type(image_data: bytes) -> str:
+    """
+    按文件头判断图片的媒体类型（OCR请求的data URL使用），无法识别时按PNG处理
+    """
+    if image_data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/png"
+
+def pixmap_to_image(pix) -> Image.Image:
+    """
+    把PyMuPDF渲染的像素转换为Pillow图片（不经过编码）
+    """
+    if pix.n == 1:
+        return Image.frombytes("L", (pix.width, pix.height), pix.samples)
+    return Image.frombytes("RGBA" if pix.alpha else "RGB", (pix.width, pix.height), pix.samples)
+
+def encode_page_image(pix, image_path: str, encoding: PageImageEncoding = None, img: Image.Image = None) -> None:
+    """
+    按编码方式保存渲染的页面
+    :param pix: PyMuPDF渲染的像素
+    :param image_path: 保存路径（可以是临时文件，格式由编码方式决定，不按扩展名判断）
+    :param img: 已由 pixmap_to_image 转换的图片，避免重复转换
+    """
+    encoding = encoding or PAGE_IMAGE_ENCODING
+    if not encoding.uses_pillow:
+        pix.save(image_path, output="png")
+        return
+
+    img = img or pixmap_to_image(pix)
+    if encoding.format == "png":
+        img.save(image_path, "PNG", compress_level=encoding.compress_level)
+    elif encoding.format == "webp" and encoding.quality is None:
+        img.save(image_path, "WEBP", lossless=True)
+    else:
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(image_path, _FORMATS[encoding.format][1], quality=encoding.quality)
@@ -0,0 +1,140 @@
+import os
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+from PIL import Image
+from dotenv import load_dotenv
+from app.utils.page_store import open_page_image, page_image_exists
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 页面图片的多尺寸版本（缩略图、屏幕尺寸、原尺寸），按宽度缩放，原图（300DPI PNG）保留给OCR和下载使用
+# 尺寸名称 -> 最大宽度（像素），None表示保持原尺寸只重新编码
+IMAGE_SIZES: Dict[str, Optional[int]] = {
+    "thumb": int(os.getenv("IMAGE_THUMB_WIDTH", "320")),
+    "screen": int(os.getenv("IMAGE_SCREEN_WIDTH", "1600")),
+    "full": None
+}
+# 编码格式：webp / jpeg
+IMAGE_VARIANT_FORMAT = os.getenv("IMAGE_VARIANT_FORMAT", "webp").lower()
+IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+# 渲染页面时同时生成的尺寸（逗号分隔），其余尺寸在第一次访问时生成
+IMAGE_PREGENERATE_SIZES = [
+    name.strip() for name in os.getenv("IMAGE_PREGENERATE_SIZES", "thumb").split(",")
+    if name.strip() in IMAGE_SIZES
+]
+
+_FORMATS = {
+    "webp": ("WEBP", ".webp", "image/webp"),
+    "jpeg": ("JPEG", ".jpg", "image/jpeg")
+}
+if IMAGE_VARIANT_FORMAT not in _FORMATS:
+    logger.warning(f"不支持的图片格式: {IMAGE_VARIANT_FORMAT}，使用webp")
+    IMAGE_VARIANT_FORMAT = "webp"
+
+# 同一图片的并发请求只生成一次
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+def resolve_image_size(size: Optional[str] = None, width: Optional[int] = None) -> Optional[str]:
+    """
+    根据请求参数选择图片尺寸
+    :param size: 尺寸名称（thumb/screen/full）
+    :param width: 需要的宽度（像素），选择宽度不小于该值的最小尺寸
+    :return: 尺寸名称；两个参数都未指定时返回None，表示使用原图
+    """
+    if size:
+        if size not in IMAGE_SIZES:
+            raise ValueError(f"未知的图片尺寸: {size}，可选: {', '.join(IMAGE_SIZES)}")
+        return size
+    if width is None:
+        return None
+    if width <= 0:
+        raise ValueError("图片宽度必须大于0")
+    candidates = sorted(
+        (max_width if max_width is not None else float("inf"), name)
+        for name, max_width in IMAGE_SIZES.items()
+    )
+    return next(name for max_width, name in candidates if max_width >= width)
+
+def variant_path(image_path: str, size: str) -> str:
+    """
+    原图对应的指定尺寸图片路径，与原图放在同一目录，例如 p_1.png -> p_1.thumb.webp
+    """
+    base, _ = os.path.splitext(image_path)
+    return f"{base}.{size}{_FORMATS[IMAGE_VARIANT_FORMAT][1]}"
+
+def variant_media_type() -> str:
+    return _FORMATS[IMAGE_VARIANT_FORMAT][2]
+
+def variant_signature(size: str) -> str:
+    """
+    指定尺寸图片的编码参数，参数变化后生成的图片内容不同（用于ETag）
+    """
+    return f"{size}:{IMAGE_SIZES[size]}:{IMAGE_VARIANT_FORMAT}:{IMAGE_VARIANT_QUALITY}"
+
+def save_image_variants(img: Image.Image, image_path: str, sizes: Iterable[str]) -> List[str]:
+    """
+    把已解码的页面图片按各尺寸缩放、编码并保存（写入临时文件后改名，读取方不会读到不完整的文件）
+    :param img: 原尺寸页面图片
+    :param image_path: 原图路径，用于确定各尺寸图片的路径
+    :return: 生成的图片路径列表
+    """
+    image_format = _FORMATS[IMAGE_VARIANT_FORMAT][0]
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    # 图片目录打包后已删除，按需生成的图片重新写入该目录
+    os.makedirs(os.path.dirname(image_path) or ".", exist_ok=True)
+    paths = []
+    for size in sizes:
+        max_width = IMAGE_SIZES[size]
+        variant = img
+        if max_width is not None and img.width > max_width:
+            # reducing_gap 先按整数倍快速缩小再精细缩放，缩放300DPI页面时明显更快
+            variant = img.resize(
+                (max_width, max(1, round(img.height * max_width / img.width))),
+                Image.LANCZOS,
+                reducing_gap=2.0
+            )
+        path = variant_path(image_path, size)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        variant.save(tmp_path, image_format, quality=IMAGE_VARIANT_QUALITY)
+        os.replace(tmp_path, path)
+        paths.append(path)
+    return paths
+
+def create_image_variant(image_path: str, size: str) -> str:
+    """
+    从原图生成指定尺寸的图片
+    :return: 生成的图片路径
+    """
+    with open_page_image(image_path) as image_file, Image.open(image_file) as img:
+        img.load()
+        return save_image_variants(img, image_path, [size])[0]
+
+def get_or_create_variant(image_path: str, size: str) -> str:
+    """
+    获取原图的指定尺寸版本，不存在时生成
+    同一文档的原图内容不会变化，已生成的图片直接使用
+    :return: 图片路径
+    """
+    path = variant_path(image_path, size)
+    # 已生成的图片可能已经打包
+    if page_image_exists(path):
+        return path
+
+    with _locks_guard:
+        lock = _locks.setdefault(path, threading.Lock())
+    with lock:
+        try:
+            if not page_image_exists(path):
+                create_image_variant(image_path, size)
+                logger.debug(f"生成页面图片: {path}")
+            return path
+        finally:
+            with _locks_guard:
+                _locks.pop(path, None)
@@ -0,0 +1,313 @@
+"""
+页面图片打包存储
+
+每个文档的图片目录（IMAGES_DIR/<file_id>/p_N.png 等）可以打包为一个文件 IMAGES_DIR/<file_id>.pack，
+减少大量小文件占用的inode、备份和目录遍历开销。读取时通过 mmap 映射整个文件，按索引直接切片，不复制数据。
+
+图片路径（页面记录、图片清单中的路径）保持不变：<目录>/<文件名> 不存在时，从 <目录>.pack 中按文件名查找。
+打包后按需生成的其他尺寸图片仍写入原目录，再次打包时合并到打包文件中。
+
+文件格式（整数均为小端）:
+    头部 16 字节: 魔数 b"PGPK" | 版本 u16 | 保留 u16 | 索引偏移 u64
+    图片数据: 依次存放
+    索引: 条目数 u32，每个条目: 文件名长度 u16 | 文件名(UTF-8) | 偏移 u64 | 长度 u64
+"""
+import io
+import os
+import mmap
+import struct
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Tuple, Union
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 页面图片存储方式：files 每页一个文件；pack 渲染完成后打包为每个文档一个文件（按需渲染模式下不打包）
+PAGE_STORE = os.getenv("PAGE_STORE", "files").lower()
+# 同时保持映射的打包文件数量
+PAGE_PACK_OPEN_MAX = int(os.getenv("PAGE_PACK_OPEN_MAX", "256"))
+
+PACK_EXTENSION = ".pack"
+_MAGIC = b"PGPK"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHHQ")
+_COUNT = struct.Struct("<I")
+_NAME_LENGTH = struct.Struct("<H")
+_ENTRY = struct.Struct("<QQ")
+
+class PackFormatError(Exception):
+    """
+    打包文件格式错误（文件损坏或不是打包文件）
+    """
+    pass
+
+def is_pack_store() -> bool:
+    """
+    是否在渲染完成后打包页面图片
+    """
+    return PAGE_STORE == "pack"
+
+def pack_path_for(image_dir: str) -> str:
+    """
+    图片目录对应的打包文件路径，例如 images/<file_id> -> images/<file_id>.pack
+    """
+    return os.path.normpath(image_dir) + PACK_EXTENSION
+
+class PagePack:
+    """
+    只读的打包文件，整个文件映射到内存，按文件名返回图片数据的切片
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as pack_file:
+            stat_result = os.fstat(pack_file.fileno())
+            self.signature = (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
+            self.mtime = stat_result.st_mtime
+            if stat_result.st_size < _HEADER.size:
+                raise PackFormatError(f"打包文件不完整: {path}")
+            # 映射在文件关闭后仍然有效
+            self._map = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        self.entries = self._read_index()
+
+    def _read_index(self) -> Dict[str, Tuple[int, int]]:
+        magic, version, _, index_offset = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise PackFormatError(f"不是有效的打包文件: {self.path}")
+        (count,) = _COUNT.unpack_from(self._map, index_offset)
+        position = index_offset + _COUNT.size
+        entries = {}
+        for _ in range(count):
+            (name_length,) = _NAME_LENGTH.unpack_from(self._map, position)
+            position += _NAME_LENGTH.size
+            name = bytes(self._map[position:position + name_length]).decode("utf-8")
+            position += name_length
+            offset, length = _ENTRY.unpack_from(self._map, position)
+            position += _ENTRY.size
+            if offset + length > index_offset:
+                raise PackFormatError(f"打包文件索引损坏: {self.path}")
+            entries[name] = (offset, length)
+        return entries
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def get(self, name: str) -> Optional[memoryview]:
+        """
+        获取图片数据（映射内存的切片，不复制）
+        """
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        offset, length = entry
+        return self._view[offset:offset + length]
+
+def write_pack(path: str, files: List[Tuple[str, Union[str, bytes, memoryview]]]) -> int:
+    """
+    写入打包文件（先写临时文件再改名，读取方不会读到不完整的文件）
+    :param files: (文件名, 文件路径或数据) 列表
+    :return: 写入的条目数
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    entries = []
+    try:
+        with open(tmp_path, "wb") as pack_file:
+            pack_file.write(_HEADER.pack(_MAGIC, _VERSION, 0, 0))
+            for name, source in files:
+                offset = pack_file.tell()
+                if isinstance(source, str):
+                    with open(source, "rb") as source_file:
+                        shutil.copyfileobj(source_file, pack_file)
+                else:
+                    pack_file.write(source)
+                entries.append((name, offset, pack_file.tell() - offset))
+
+            index_offset = pack_file.tell()
+            pack_file.write(_COUNT.pack(len(entries)))
+            for name, offset, length in entries:
+                encoded = name.encode("utf-8")
+                pack_file.write(_NAME_LENGTH.pack(len(encoded)) + encoded + _ENTRY.pack(offset, length))
+            pack_file.seek(0)
+            pack_file.write(_HEADER.pack(_MAGIC, _VERSION, 0, index_offset))
+            pack_file.flush()
+            os.fsync(pack_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(entries)
+
+class PackCache:
+    """
+    已映射的打包文件（按最近使用保留 PAGE_PACK_OPEN_MAX 个）
+    每次读取检查文件的inode和修改时间，打包文件被重新生成后重新映射
+    """
+
+    def __init__(self, max_open: int = PAGE_PACK_OPEN_MAX):
+        self.max_open = max_open
+        self._packs: "OrderedDict[str, PagePack]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> Optional[PagePack]:
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            self.discard(path)
+            return None
+        signature = (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
+
+        with self._lock:
+            pack = self._packs.get(path)
+            if pack is not None and pack.signature == signature:
+                self._packs.move_to_end(path)
+                return pack
+
+        pack = PagePack(path)
+        with self._lock:
+            self._packs[path] = pack
+            self._packs.move_to_end(path)
+            # 超出数量时只移除引用，正在发送的切片仍可使用，映射在没有引用后释放
+            while len(self._packs) > self.max_open:
+                self._packs.popitem(last=False)
+        return pack
+
+    def discard(self, path: str) -> None:
+        with self._lock:
+            self._packs.pop(path, None)
+
+# 全局打包文件缓存
+pack_cache = PackCache()
+
+class PackedImage(NamedTuple):
+    """
+    打包文件中的图片
+    """
+    data: memoryview  # 映射内存的切片
+    mtime: float  # 打包文件的修改时间
+
+def find_page_image(image_path: str) -> Union[str, PackedImage, None]:
+    """
+    查找页面图片：单独的文件存在时返回文件路径，否则从所在目录的打包文件中查找
+    :return: 文件路径、PackedImage 或 None
+    """
+    if os.path.isfile(image_path):
+        return image_path
+    pack = pack_cache.get(pack_path_for(os.path.dirname(image_path)))
+    if pack is None:
+        return None
+    data = pack.get(os.path.basename(image_path))
+    return PackedImage(data, pack.mtime) if data is not None else None
+
+def page_image_exists(image_path: str) -> bool:
+    return find_page_image(image_path) is not None
+
+def read_page_image(image_path: str) -> Optional[bytes]:
+    """
+    读取页面图片的内容（单独的文件或打包文件中的图片）
+    """
+    for _ in range(2):
+        image = find_page_image(image_path)
+        if image is None:
+            return None
+        if isinstance(image, PackedImage):
+            return image.data.tobytes()
+        try:
+            with open(image, "rb") as image_file:
+                return image_file.read()
+        except FileNotFoundError:
+            # 文件刚被打包删除，再从打包文件读取
+            continue
+    return None
+
+def open_page_image(image_path: str) -> BinaryIO:
+    """
+    以文件对象打开页面图片（供Pillow等按文件读取的库使用）
+    :raises FileNotFoundError: 图片不存在
+    """
+    image = find_page_image(image_path)
+    if image is None:
+        raise FileNotFoundError(image_path)
+    if isinstance(image, str):
+        return open(image, "rb")
+    return io.BytesIO(image.data)
+
+def pack_image_dir(image_dir: str) -> int:
+    """
+    把图片目录打包为 <目录>.pack，合并已有打包文件中的图片（目录中的同名文件优先），完成后删除目录
+    :return: 打包文件中的图片数
+    """
+    pack_path = pack_path_for(image_dir)
+    files: Dict[str, Union[str, memoryview]] = {}
+    existing = pack_cache.get(pack_path) if os.path.exists(pack_path) else None
+    if existing is not None:
+        files.update((name, existing.get(name)) for name in existing.entries)
+    loose = []
+    if os.path.isdir(image_dir):
+        for entry in os.scandir(image_dir):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                files[entry.name] = entry.path
+                loose.append(entry.path)
+    if not loose:
+        return len(files)
+
+    count = write_pack(pack_path, sorted(files.items(), key=lambda item: _page_sort_key(item[0])))
+    pack_cache.discard(pack_path)
+    for path in loose:
+        os.remove(path)
+    try:
+        os.rmdir(image_dir)
+    except OSError:
+        # 打包期间又生成了新图片，留到下次打包
+        pass
+    logger.info(f"打包页面图片: {image_dir} -> {pack_path}, {count} 张")
+    return count
+
+def unpack_image_dir(image_dir: str) -> int:
+    """
+    把 <目录>.pack 解包为单独的文件，完成后删除打包文件
+    :return: 解包的图片数
+    """
+    pack_path = pack_path_for(image_dir)
+    pack = pack_cache.get(pack_path)
+    if pack is None:
+        return 0
+    os.makedirs(image_dir, exist_ok=True)
+    for name in pack.entries:
+        target = os.path.join(image_dir, name)
+        if not os.path.exists(target):
+            tmp_path = f"{target}.tmp"
+            with open(tmp_path, "wb") as image_file:
+                image_file.write(pack.get(name))
+            os.replace(tmp_path, target)
+    count = len(pack.entries)
+    pack_cache.discard(pack_path)
+    os.remove(pack_path)
+    logger.info(f"解包页面图片: {pack_path} -> {image_dir}, {count} 张")
+    return count
+
+def remove_image_store(image_dir: str) -> None:
+    """
+    删除文档的图片目录和打包文件
+    """
+    if os.path.isdir(image_dir):
+        shutil.rmtree(image_dir)
+    pack_path = pack_path_for(image_dir)
+    pack_cache.discard(pack_path)
+    if os.path.exists(pack_path):
+        os.remove(pack_path)
+
+def _page_sort_key(name: str):
+    """
+    按页码排列图片（p_2.png 在 p_10.png 之前），同一页的原图和各尺寸图片相邻
+    """
+    stem = name.split(".", 1)[0]
+    number = stem[2:] if stem.startswith("p_") else ""
+    return (int(number) if number.isdigit() else float("inf"), name)
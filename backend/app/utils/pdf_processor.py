@@ -1,10 +1,18 @@
 import PyPDF2
 import logging
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 
 logger = logging.getLogger(__name__)
 
+# 优先使用PyMuPDF提取文本，速度远快于PyPDF2
+HAS_PYMUPDF = False
+try:
+    import fitz  # PyMuPDF
+    HAS_PYMUPDF = True
+except ImportError:
+    logger.warning("PyMuPDF库未安装，文本采样将使用PyPDF2")
+
 def parse_pdf_info(file_path: str) -> Dict[str, Any]:
     """
     解析PDF文件，获取基本信息
@@ -49,6 +57,66 @@ def extract_text_from_page(file_path: str, page_number: int) -> Optional[str]:
         logger.error(f"提取页面文本失败: 文件={file_path}, 页码={page_number}, 错误: {str(e)}")
         return None
 
+def spread_page_indexes(total_pages: int, sample_size: int) -> List[int]:
+    """
+    在整个文档范围内均匀选取页码索引（从0开始），总是包含首页和末页
+    :param total_pages: 总页数
+    :param sample_size: 采样页数
+    :return: 升序排列、无重复的页码索引列表
+    """
+    if total_pages <= 0 or sample_size <= 0:
+        return []
+    if total_pages <= sample_size:
+        return list(range(total_pages))
+    if sample_size == 1:
+        return [0]
+    step = (total_pages - 1) / (sample_size - 1)
+    return sorted({round(i * step) for i in range(sample_size)})
+
+def sample_page_texts(file_path: str, sample_size: int = 20) -> Dict[int, str]:
+    """
+    只打开一次文档，在全文范围内均匀采样若干页并提取文本
+    :param file_path: PDF文件路径
+    :param sample_size: 采样页数
+    :return: {页码(从1开始): 去除首尾空白后的文本}
+    """
+    texts = {}
+    if HAS_PYMUPDF:
+        with fitz.open(file_path) as document:
+            for index in spread_page_indexes(len(document), sample_size):
+                texts[index + 1] = (document[index].get_text("text") or "").strip()
+        return texts
+
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for index in spread_page_indexes(len(reader.pages), sample_size):
+            texts[index + 1] = (reader.pages[index].extract_text() or "").strip()
+    return texts
+
+def extract_page_texts(file_path: str, page_numbers: Optional[List[int]] = None) -> Dict[int, str]:
+    """
+    只打开一次文档，提取多个页面的文本
+    :param file_path: PDF文件路径
+    :param page_numbers: 页码列表（从1开始），None表示全部页面
+    :return: {页码(从1开始): 文本}
+    """
+    texts = {}
+    if HAS_PYMUPDF:
+        with fitz.open(file_path) as document:
+            numbers = page_numbers if page_numbers is not None else range(1, len(document) + 1)
+            for page_number in numbers:
+                if 1 <= page_number <= len(document):
+                    texts[page_number] = document[page_number - 1].get_text("text") or ""
+        return texts
+
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        numbers = page_numbers if page_numbers is not None else range(1, len(reader.pages) + 1)
+        for page_number in numbers:
+            if 1 <= page_number <= len(reader.pages):
+                texts[page_number] = reader.pages[page_number - 1].extract_text() or ""
+    return texts
+
 def extract_pdf_metadata(meta):
     """
     读取并打印PDF文件的元数据
@@ -0,0 +1,223 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Callable, List, Optional
+from dotenv import load_dotenv
+from app.utils.page_store import page_image_exists
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 渲染模式：eager 上传处理时渲染全部页面；lazy 首次访问时才渲染单页
+RENDER_MODE = os.getenv("RENDER_MODE", "eager").lower()
+# 渲染缓存磁盘预算，默认5GB（API进程和所有工作进程合计）
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+# 渲染缓存索引：按需渲染生成的图片及其大小和访问时间，所有进程共用
+RENDER_CACHE_INDEX = os.getenv("RENDER_CACHE_INDEX") or os.path.join(os.getenv("IMAGES_DIR", "./images"), ".render_cache.db")
+# 同一图片两次记录访问时间的最小间隔（秒），减少命中时的写入
+RENDER_CACHE_TOUCH_INTERVAL = float(os.getenv("RENDER_CACHE_TOUCH_INTERVAL", "60"))
+
+def is_lazy_render() -> bool:
+    """
+    是否启用按需渲染模式
+    """
+    return RENDER_MODE == "lazy"
+
+class RenderCache:
+    """
+    页面图片渲染缓存
+    只管理按需渲染生成的图片：每个图片的大小和最近访问时间记录在单独的SQLite索引中，
+    API进程和各工作进程共用索引和磁盘预算，总大小超过预算时删除最久未访问（LRU）的图片。
+    不在索引中的图片（预渲染模式生成的图片、打包文件中的图片）直接使用，不计入预算，也不会被淘汰
+    """
+
+    def __init__(self, index_path: str, max_bytes: int):
+        self.index_path = index_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._render_locks = {}
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        第一次使用时打开索引数据库（调用方需持有锁）
+        """
+        if self._connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+            connection = sqlite3.connect(self.index_path, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS render_cache_files ("
+                "path TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_render_cache_files_last_used ON render_cache_files (last_used)")
+            # 总大小由登记和淘汰维护，不统计索引表
+            connection.execute("CREATE TABLE IF NOT EXISTS render_cache_totals (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            connection.execute("INSERT OR IGNORE INTO render_cache_totals (name, value) VALUES ('bytes', 0)")
+            self._connection = connection
+        return self._connection
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.abspath(path)
+
+    @property
+    def total_bytes(self) -> int:
+        """
+        缓存中图片的总大小（所有进程合计）
+        """
+        with self._lock:
+            return self._connect().execute("SELECT value FROM render_cache_totals WHERE name = 'bytes'").fetchone()[0]
+
+    def get(self, path: str) -> Optional[str]:
+        """
+        查询缓存，命中时更新访问时间
+        :return: 图片路径；图片不在缓存中（未渲染、已被淘汰或不是渲染缓存生成的）时返回None
+        """
+        key = self._key(path)
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT size, last_used FROM render_cache_files WHERE path = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            size, last_used = row
+            if not os.path.isfile(path):
+                # 图片已被删除（如文档删除），移除索引记录
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    if connection.execute("DELETE FROM render_cache_files WHERE path = ?", (key,)).rowcount:
+                        connection.execute("UPDATE render_cache_totals SET value = value - ? WHERE name = 'bytes'", (size,))
+                    connection.execute("COMMIT")
+                except Exception:
+                    connection.execute("ROLLBACK")
+                    raise
+                return None
+            if now - last_used > RENDER_CACHE_TOUCH_INTERVAL:
+                connection.execute("UPDATE render_cache_files SET last_used = ? WHERE path = ?", (now, key))
+        return path
+
+    def put(self, path: str) -> None:
+        """
+        登记新渲染的图片，总大小超过预算时淘汰最久未访问的图片
+        """
+        key = self._key(path)
+        size = os.path.getsize(path)
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute("SELECT size FROM render_cache_files WHERE path = ?", (key,)).fetchone()
+                connection.execute(
+                    "INSERT OR REPLACE INTO render_cache_files (path, size, last_used) VALUES (?, ?, ?)",
+                    (key, size, time.time())
+                )
+                connection.execute(
+                    "UPDATE render_cache_totals SET value = value + ? WHERE name = 'bytes'",
+                    (size - (row[0] if row else 0),)
+                )
+                total = connection.execute("SELECT value FROM render_cache_totals WHERE name = 'bytes'").fetchone()[0]
+                evicted = self._evict(connection, total, keep=key)
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+        # 索引已提交后再删除文件，其他进程不会再从索引命中这些图片
+        for evicted_path in evicted:
+            try:
+                os.remove(evicted_path)
+                logger.debug(f"渲染缓存淘汰: {evicted_path}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"渲染缓存淘汰失败: {evicted_path}, 错误: {str(e)}")
+
+    def _evict(self, connection: sqlite3.Connection, total: int, keep: str, batch_size: int = 256) -> List[str]:
+        """
+        从索引中移除最久未访问的图片，直到总大小不超过预算（在调用方的事务中执行）
+        :return: 需要删除的图片路径
+        """
+        evicted = []
+        freed = 0
+        while total - freed > self.max_bytes:
+            rows = connection.execute(
+                "SELECT path, size FROM render_cache_files WHERE path != ? ORDER BY last_used LIMIT ?",
+                (keep, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            batch = []
+            for path, size in rows:
+                if total - freed <= self.max_bytes:
+                    break
+                batch.append((path,))
+                freed += size
+            connection.executemany("DELETE FROM render_cache_files WHERE path = ?", batch)
+            evicted.extend(path for (path,) in batch)
+        if freed:
+            connection.execute("UPDATE render_cache_totals SET value = value - ? WHERE name = 'bytes'", (freed,))
+        return evicted
+
+    def forget_dir(self, image_dir: str) -> None:
+        """
+        移除目录下所有图片的索引记录（文档图片目录被删除时调用）
+        """
+        prefix = os.path.join(self._key(image_dir), "")
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                freed = connection.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM render_cache_files WHERE substr(path, 1, ?) = ?",
+                    (len(prefix), prefix)
+                ).fetchone()[0]
+                connection.execute("DELETE FROM render_cache_files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+                connection.execute("UPDATE render_cache_totals SET value = value - ? WHERE name = 'bytes'", (freed,))
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def get_or_render(self, path: str, render: Callable[[], str]) -> str:
+        """
+        读取缓存中的图片，不存在时调用render生成并登记
+        同一路径的并发请求只渲染一次；render需要先写入临时文件再改名，读取方不会读到不完整的图片
+        :param path: 图片路径
+        :param render: 渲染函数，返回生成的图片路径
+        :return: 图片路径
+        """
+        cached = self.get(path)
+        if cached:
+            return cached
+
+        with self._lock:
+            render_lock = self._render_locks.setdefault(path, threading.Lock())
+        with render_lock:
+            try:
+                cached = self.get(path)
+                if cached:
+                    return cached
+                # 不是渲染缓存生成的图片（预渲染模式下生成后切换为按需渲染等），直接使用
+                if page_image_exists(path):
+                    return path
+                rendered_path = render()
+                self.put(rendered_path)
+                return rendered_path
+            finally:
+                with self._lock:
+                    self._render_locks.pop(path, None)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+# 全局渲染缓存实例
+render_cache = RenderCache(RENDER_CACHE_INDEX, RENDER_CACHE_MAX_BYTES)
@@ -0,0 +1,220 @@
+"""
+API并发基准测试：混合负载下对比同步会话与异步会话的请求延迟
+
+在同一个事件循环中并发发送请求（与单进程uvicorn相同）：
+- 轻量请求：状态轮询 GET /api/file/status/{id}
+- 重量请求：读取大文档全部页面文本 GET /api/file/{id}/info、全文搜索 GET /api/search
+- 写入请求：保存页面文本 POST /api/file/content/{id}
+同时用单独的连接定期持有写事务（--lock-ms），模拟工作进程批量写入页面记录时API写入需要等待SQLite写锁。
+同步模式使用原来的写法（async路由中直接调用同步会话，查询期间阻塞事件循环），
+异步模式使用当前的路由。输出各类请求的 p50/p95/p99/最大延迟和吞吐量。
+
+同步模式下并发请求数超过连接池上限（默认 5 + 10）时，事件循环会阻塞在获取连接上，
+直到其他请求归还连接（它们需要事件循环才能完成），最长等待连接池超时（30秒），
+因此默认并发数低于连接池上限。
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.concurrency_benchmark [--pages 2000] [--duration 10] [--light 8] [--heavy 2] [--writers 2]
+        [--lock-ms 200] [--lock-interval 1]
+
+数据库使用临时目录中的SQLite文件，不影响 DATABASE_URL 配置的数据库
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+# 在导入应用模块之前指定临时数据库
+_tmp_dir = tempfile.mkdtemp(prefix="concurrency_bench_")
+_db_path = os.path.join(_tmp_dir, 'bench.db')
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+os.environ["RENDER_MODE"] = "lazy"
+os.environ["METADATA_CACHE_BUS_PATH"] = os.path.join(_tmp_dir, "cache_bus.db")
+
+import httpx
+from fastapi import APIRouter, Depends, FastAPI
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.database.database import SessionLocal, dispose_async_engine, get_db
+from app.database.db_init import init_database
+from app.database.models import PDFDocument, PDFPage, ProcessingStatus
+from app.routes import pdf, search
+from app.services.search_service import rebuild_search_index, search_pages
+
+# pdf_service 模块（app.services 包中同名属性被服务实例覆盖，从sys.modules获取）
+pdf_service = sys.modules["app.services.pdf_service"]
+
+WORDS = "数据库 系统 查询 索引 事务 并发 日志 恢复 database query index page buffer lock".split()
+
+# 同步模式：与改造前相同，async路由中直接使用同步会话
+legacy_router = APIRouter()
+
+@legacy_router.get("/file/status/{file_id}")
+async def legacy_status(file_id: str, db: Session = Depends(get_db)):
+    progress = db.execute(pdf_service._document_meta_query(file_id)).first()
+    return {"file_id": file_id, "status": progress.status.value, "pages_processed": progress.pages_processed}
+
+@legacy_router.get("/file/{file_id}/info")
+async def legacy_info(file_id: str, db: Session = Depends(get_db)):
+    pages = pdf_service.get_page_summaries(db, file_id, include_text=True)
+    return {"file_id": file_id, "pages": [
+        {
+            "id": p.id,
+            "document_id": p.document_id,
+            "page_number": p.page_number,
+            "ocr_text": p.ocr_text,
+            "image_url": "images/" + p.image_path,
+            "ocr_status": p.ocr_status,
+            "created_at": p.created_at,
+            "updated_at": p.updated_at
+        }
+        for p in pages
+    ]}
+
+@legacy_router.get("/search")
+async def legacy_search(q: str, db: Session = Depends(get_db)):
+    return {"results": search_pages(db, q)}
+
+@legacy_router.post("/file/content/{file_id}")
+async def legacy_save_text(file_id: str, item: pdf.TextItem, db: Session = Depends(get_db)):
+    page = db.query(PDFPage).filter(PDFPage.document_id == file_id, PDFPage.page_number == item.page_number).first()
+    page.ocr_text = item.content
+    pdf.index_page(db, page)
+    db.commit()
+    return {"status": "success"}
+
+
+def build_app(mode: str) -> FastAPI:
+    app = FastAPI()
+    if mode == "sync":
+        app.include_router(legacy_router, prefix="/api")
+    else:
+        app.include_router(pdf.router, prefix="/api/file")
+        app.include_router(search.router, prefix="/api")
+    return app
+
+
+def seed(pages: int) -> None:
+    """
+    写入一个大文档（重量请求读取）和若干小文档（状态轮询），页面带识别文本
+    """
+    db = SessionLocal()
+    try:
+        for file_id, total in (("big", pages), *((f"small{i}", 20) for i in range(20))):
+            db.add(PDFDocument(id=file_id, original_filename=f"{file_id}.pdf", file_path="missing.pdf",
+                               status=ProcessingStatus.PROCESSING, total_pages=total))
+            db.flush()
+            db.execute(insert(PDFPage), [
+                {
+                    "document_id": file_id,
+                    "page_number": n,
+                    "image_path": os.path.join(file_id, f"p_{n}.png"),
+                    "ocr_text": " ".join(WORDS[(n * 7 + k) % len(WORDS)] for k in range(300)),
+                    "ocr_status": True
+                }
+                for n in range(1, total + 1)
+            ])
+        db.commit()
+        rebuild_search_index(db.connection())
+        db.commit()
+    finally:
+        db.close()
+
+
+def hold_write_lock(stop: threading.Event, lock_ms: int, interval: float) -> None:
+    """
+    模拟工作进程的批量写入：定期开启写事务并持有 lock_ms 毫秒
+    """
+    connection = sqlite3.connect(_db_path, isolation_level=None)
+    try:
+        while not stop.wait(interval):
+            connection.execute("BEGIN IMMEDIATE")
+            time.sleep(lock_ms / 1000)
+            connection.execute("COMMIT")
+    finally:
+        connection.close()
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+
+
+async def run(mode: str, args) -> dict:
+    latencies = {"light": [], "heavy": [], "write": []}
+    transport = httpx.ASGITransport(app=build_app(mode))
+    deadline = time.perf_counter() + args.duration
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def worker(kind: str, index: int):
+            n = 0
+            while time.perf_counter() < deadline:
+                n += 1
+                start = time.perf_counter()
+                if kind == "light":
+                    response = await client.get(f"/api/file/status/small{(index + n) % 20}")
+                elif kind == "heavy" and n % 2:
+                    response = await client.get("/api/file/big/info")
+                elif kind == "heavy":
+                    response = await client.get("/api/search", params={"q": WORDS[n % len(WORDS)]})
+                else:
+                    response = await client.post(f"/api/file/content/small{index}",
+                                                 json={"content": f"rev {n} 数据库", "page_number": n % 20 + 1})
+                response.raise_for_status()
+                latencies[kind].append(time.perf_counter() - start)
+
+        stop = threading.Event()
+        locker = threading.Thread(target=hold_write_lock, args=(stop, args.lock_ms, args.lock_interval))
+        if args.lock_ms > 0:
+            locker.start()
+        try:
+            await asyncio.gather(
+                *(worker("light", i) for i in range(args.light)),
+                *(worker("heavy", i) for i in range(args.heavy)),
+                *(worker("write", i) for i in range(args.writers))
+            )
+        finally:
+            stop.set()
+            if locker.is_alive():
+                locker.join()
+    await dispose_async_engine()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API并发基准测试")
+    parser.add_argument("--pages", type=int, default=2000, help="大文档的页数")
+    parser.add_argument("--duration", type=float, default=10, help="每种模式的测试时长（秒）")
+    parser.add_argument("--light", type=int, default=8, help="状态轮询并发数")
+    parser.add_argument("--heavy", type=int, default=2, help="重量请求并发数")
+    parser.add_argument("--writers", type=int, default=2, help="写入并发数")
+    parser.add_argument("--lock-ms", type=int, default=200, help="模拟工作进程每次持有写锁的时间（毫秒），0表示不模拟")
+    parser.add_argument("--lock-interval", type=float, default=1, help="模拟工作进程写入的间隔（秒）")
+    args = parser.parse_args()
+
+    try:
+        init_database()
+        seed(args.pages)
+        print(f"pages: {args.pages}, duration: {args.duration}s, light: {args.light}, heavy: {args.heavy}, "
+              f"writers: {args.writers}, worker lock: {args.lock_ms}ms every {args.lock_interval}s")
+        print(f"{'mode':>6} {'kind':>6} {'count':>7} {'req/s':>8} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'maxms':>8}")
+        for mode in ("sync", "async"):
+            latencies = asyncio.run(run(mode, args))
+            for kind, values in latencies.items():
+                if not values:
+                    continue
+                print(f"{mode:>6} {kind:>6} {len(values):>7} {len(values) / args.duration:>8.1f} "
+                      f"{percentile(values, 0.5):>8.1f} {percentile(values, 0.95):>8.1f} "
+                      f"{percentile(values, 0.99):>8.1f} {max(values) * 1000:>8.1f}")
+    finally:
+        shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+页面图片编码基准测试：对比各种 PAGE_IMAGE_FORMAT 编码方式的每页文件大小和编码耗时
+
+每页只渲染一次（彩色和灰度各一次），再用各编码方式保存同一份像素，统计：
+- 每页平均字节数及与默认PNG的比例
+- 每页平均编码耗时和p95（不含渲染耗时，渲染耗时单独列出）
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.image_encoding_benchmark [PDF路径 ...] [--pages 20] [--dpi 300]
+        [--formats png,png:1,png:9,webp:lossless,webp:80,jpeg:90] [--modes color,gray]
+
+未指定PDF时生成测试文档：一半页面是矢量文字和图形，一半是模拟的扫描页（带噪点和底色的位图）
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageFilter
+
+from app.utils.image_encoding import parse_image_encoding, encode_page_image, pixmap_to_image
+
+DEFAULT_FORMATS = "png,png:1,png:6,png:9,webp:lossless,webp:90,webp:75,jpeg:90,jpeg:75"
+
+
+def _scanned_page_image(page_number: int) -> Image.Image:
+    """
+    模拟扫描页：150DPI渲染文字页后加上纸张底色、噪点和轻微模糊
+    """
+    document = fitz.open()
+    page = document.new_page()
+    for line in range(45):
+        page.insert_text((50, 50 + line * 16), f"Scanned page {page_number} line {line + 1} " * 3, fontsize=9)
+    pix = page.get_pixmap(matrix=fitz.Matrix(150 / 72, 150 / 72), colorspace=fitz.csGRAY)
+    document.close()
+
+    img = Image.frombytes("L", (pix.width, pix.height), pix.samples).filter(ImageFilter.GaussianBlur(0.6))
+    noise = Image.effect_noise(img.size, 24)
+    img = Image.blend(img, noise, 0.12)
+    paper = Image.new("RGB", img.size, (242, 236, 222))
+    return Image.composite(paper, Image.merge("RGB", (img, img, img)), img.point(lambda v: 255 if v > 200 else 0))
+
+
+def make_sample_pdf(path: str, pages: int) -> None:
+    """
+    生成测试用PDF，奇数页为矢量文字和图形，偶数页为模拟的扫描位图
+    """
+    document = fitz.open()
+    for i in range(pages):
+        page = document.new_page()
+        if i % 2:
+            img = _scanned_page_image(i + 1)
+            image_path = f"{path}.{i}.png"
+            img.save(image_path)
+            page.insert_image(page.rect, filename=image_path)
+            os.remove(image_path)
+        else:
+            for line in range(40):
+                page.insert_text((50, 60 + line * 18), f"Page {i + 1} line {line + 1} " * 4, fontsize=10)
+            for j in range(20):
+                rect = fitz.Rect(50 + j * 20, 500, 120 + j * 20, 700)
+                page.draw_rect(rect, color=(0, 0, 0), fill=(j / 20, 0.5, 1 - j / 20))
+    document.save(path)
+    document.close()
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="页面图片编码基准测试")
+    parser.add_argument("pdfs", nargs="*", help="PDF文件路径，不指定则生成测试文件")
+    parser.add_argument("--pages", type=int, default=20, help="每个PDF最多测试的页数（生成测试PDF时为总页数）")
+    parser.add_argument("--dpi", type=int, default=300, help="渲染DPI")
+    parser.add_argument("--formats", default=DEFAULT_FORMATS, help="逗号分隔的编码方式，格式同 PAGE_IMAGE_FORMAT")
+    parser.add_argument("--modes", default="color,gray", help="逗号分隔的渲染模式：color / gray")
+    args = parser.parse_args()
+
+    modes = [mode for mode in args.modes.split(",") if mode]
+    encodings = [
+        parse_image_encoding(spec, grayscale=(mode == "gray"))
+        for mode in modes for spec in args.formats.split(",") if spec
+    ]
+
+    tmp_dir = tempfile.mkdtemp(prefix="image_encoding_bench_")
+    try:
+        pdf_paths = args.pdfs
+        if not pdf_paths:
+            pdf_paths = [os.path.join(tmp_dir, "sample.pdf")]
+            make_sample_pdf(pdf_paths[0], args.pages)
+
+        sizes = {encoding: [] for encoding in encodings}
+        durations = {encoding: [] for encoding in encodings}
+        render_durations = {mode: [] for mode in modes}
+        matrix = fitz.Matrix(args.dpi / 72, args.dpi / 72)
+        output_path = os.path.join(tmp_dir, "page")
+
+        for pdf_path in pdf_paths:
+            document = fitz.open(pdf_path)
+            try:
+                for page_index in range(min(args.pages, document.page_count)):
+                    for mode in modes:
+                        start = time.perf_counter()
+                        pix = document[page_index].get_pixmap(
+                            matrix=matrix, colorspace=fitz.csGRAY if mode == "gray" else fitz.csRGB
+                        )
+                        render_durations[mode].append(time.perf_counter() - start)
+                        for encoding in encodings:
+                            if encoding.grayscale != (mode == "gray"):
+                                continue
+                            # 与渲染流程相同：需要Pillow编码时先转换像素（计入编码耗时）
+                            start = time.perf_counter()
+                            img = pixmap_to_image(pix) if encoding.uses_pillow else None
+                            encode_page_image(pix, output_path + encoding.extension, encoding, img)
+                            durations[encoding].append(time.perf_counter() - start)
+                            sizes[encoding].append(os.path.getsize(output_path + encoding.extension))
+            finally:
+                document.close()
+
+        page_count = len(render_durations[modes[0]])
+        print(f"pdfs: {len(pdf_paths)}, pages: {page_count}, dpi: {args.dpi}")
+        for mode in modes:
+            print(f"render {mode}: {sum(render_durations[mode]) / page_count * 1000:.1f} ms/page")
+        baseline = sum(sizes[encodings[0]]) / page_count
+        print(f"{'encoding':>20} {'KB/page':>9} {'ratio':>6} {'encode ms':>10} {'p95 ms':>8}")
+        for encoding in encodings:
+            bytes_per_page = sum(sizes[encoding]) / page_count
+            print(f"{str(encoding):>20} {bytes_per_page / 1024:>9.1f} {bytes_per_page / baseline:>6.2f} "
+                  f"{sum(durations[encoding]) / page_count * 1000:>10.1f} {percentile(durations[encoding], 0.95) * 1000:>8.1f}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
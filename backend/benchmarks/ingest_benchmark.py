@@ -0,0 +1,143 @@
+"""
+PDF入库基准测试：对比逐行写入页面记录与批量写入的耗时（每1000页）
+
+测试解析、分类（文本型PDF提取文本）、记录图片路径三个阶段的数据库写入，
+图片渲染本身不计入（使用按需渲染模式，图片路径单独批量写入）。
+默认预先读取PDF（页数、采样文本、各页文本），只比较数据库写入的耗时；
+--with-pdf 时每次都重新读取PDF，测量端到端耗时。
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.ingest_benchmark [--pages 1000] [--repeat 3] [--with-pdf]
+
+数据库使用临时目录中的SQLite文件，不影响 DATABASE_URL 配置的数据库
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# 在导入应用模块之前指定临时数据库
+_tmp_dir = tempfile.mkdtemp(prefix="ingest_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+os.environ["RENDER_MODE"] = "lazy"
+
+from sqlalchemy import update
+
+import app.utils.pdf_processor as pdf_processor
+from app.database.database import SessionLocal
+from app.database.db_init import init_database
+from app.database.models import PDFDocument, PDFPage, ProcessingStatus
+from app.services.pdf_service import parse_pdf_stage, classify_pdf_stage
+from benchmarks.render_benchmark import make_sample_pdf
+
+# pdf_service 模块（app.services 包中同名属性被服务实例覆盖，从sys.modules获取）
+pdf_service = sys.modules["app.services.pdf_service"]
+
+
+def cache_pdf_reads(pdf_path: str) -> None:
+    """
+    预先读取PDF，并让解析、分类、文本提取函数直接返回读取结果
+    """
+    info = pdf_processor.parse_pdf_info(pdf_path)
+    classified = pdf_service.classify_and_extract(pdf_path)
+    texts = pdf_processor.extract_page_texts(pdf_path)
+    pdf_service.parse_pdf_info = lambda path: info
+    pdf_service.classify_and_extract = lambda path: classified
+    pdf_service.extract_page_texts = lambda path, page_numbers=None: {n: texts[n] for n in (page_numbers or texts)}
+
+
+def legacy_ingest(db, file_id: str, pdf_path: str) -> None:
+    """
+    原来的写入方式：逐个添加页面对象，每页一次查询更新文本和图片路径
+    """
+    pdf_doc = db.query(PDFDocument).filter(PDFDocument.id == file_id).first()
+    pdf_info = pdf_service.parse_pdf_info(pdf_path)
+    pdf_doc.total_pages = pdf_info['total_pages']
+    for page_number in range(pdf_info['total_pages']):
+        db.add(PDFPage(document_id=file_id, page_number=page_number + 1))
+    db.commit()
+
+    pdf_doc.pdf_type = pdf_service.classify_and_extract(pdf_path)['type']
+    db.commit()
+    # 文本提取只打开一次文档，只比较数据库写入的差异
+    page_texts = pdf_service.extract_page_texts(pdf_path)
+    for page_number in range(pdf_doc.total_pages):
+        pdf_page = db.query(PDFPage).filter(
+            PDFPage.document_id == file_id,
+            PDFPage.page_number == page_number + 1
+        ).first()
+        if pdf_page and not pdf_page.ocr_status:
+            pdf_page.ocr_text = page_texts.get(page_number + 1)
+            pdf_page.ocr_status = True
+    db.commit()
+
+    for page_number in range(1, pdf_doc.total_pages + 1):
+        pdf_page = db.query(PDFPage).filter(
+            PDFPage.document_id == file_id,
+            PDFPage.page_number == page_number
+        ).first()
+        if pdf_page:
+            pdf_page.image_path = os.path.join(file_id, f"p_{page_number}.png")
+    db.commit()
+
+
+def bulk_ingest(db, file_id: str, pdf_path: str) -> None:
+    """
+    当前的写入方式：批量插入页面记录，批量更新文本和图片路径
+    """
+    parse_pdf_stage(db, file_id, pdf_path)
+    classify_pdf_stage(db, file_id, pdf_path)
+    # 与渲染阶段相同的批量图片路径更新
+    page_ids = db.query(PDFPage.page_number, PDFPage.id).filter(PDFPage.document_id == file_id).all()
+    db.execute(update(PDFPage), [
+        {"id": page_id, "image_path": os.path.join(file_id, f"p_{page_number}.png")}
+        for page_number, page_id in page_ids
+    ])
+    db.commit()
+
+
+def run(ingest, pdf_path: str, file_id: str) -> float:
+    db = SessionLocal()
+    try:
+        db.add(PDFDocument(id=file_id, original_filename="sample.pdf", file_path=pdf_path,
+                           status=ProcessingStatus.UPLOADED))
+        db.commit()
+        start = time.perf_counter()
+        ingest(db, file_id, pdf_path)
+        elapsed = time.perf_counter() - start
+        pages = db.query(PDFPage).filter(PDFPage.document_id == file_id, PDFPage.ocr_status == True).count()
+        assert pages > 0, "页面记录写入失败"
+        return elapsed
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF入库基准测试")
+    parser.add_argument("--pages", type=int, default=1000, help="测试PDF的页数")
+    parser.add_argument("--repeat", type=int, default=3, help="每种方式重复次数，取最好成绩")
+    parser.add_argument("--with-pdf", action="store_true", help="计入读取PDF的耗时")
+    args = parser.parse_args()
+
+    try:
+        init_database()
+        pdf_path = os.path.join(_tmp_dir, "sample.pdf")
+        make_sample_pdf(pdf_path, args.pages)
+        if not args.with_pdf:
+            cache_pdf_reads(pdf_path)
+
+        print(f"pages: {args.pages}, repeat: {args.repeat}, with pdf reads: {args.with_pdf}")
+        print(f"{'mode':>8} {'seconds':>9} {'s/1000p':>9} {'speedup':>8}")
+        results = {}
+        for name, ingest in (("legacy", legacy_ingest), ("bulk", bulk_ingest)):
+            results[name] = min(run(ingest, pdf_path, f"{name}-{i}") for i in range(args.repeat))
+        for name, elapsed in results.items():
+            print(f"{name:>8} {elapsed:>9.2f} {elapsed / args.pages * 1000:>9.2f} {results['legacy'] / elapsed:>7.2f}x")
+    finally:
+        shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
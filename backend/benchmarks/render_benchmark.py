@@ -0,0 +1,75 @@
+"""
+PDF渲染基准测试：对比串行渲染与多进程渲染的耗时
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.render_benchmark [PDF路径] [--pages 200] [--dpi 300] [--workers 1,2,4,8]
+
+未指定PDF路径时，会生成一个包含文字和图形的测试PDF
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+from app.utils.image_converter import pdf_to_images, RENDER_WORKERS
+
+
+def make_sample_pdf(path: str, pages: int) -> None:
+    """
+    生成测试用PDF，每页包含多行文字和若干矢量图形，模拟扫描书籍的渲染负载
+    """
+    document = fitz.open()
+    for i in range(pages):
+        page = document.new_page()
+        for line in range(40):
+            page.insert_text((50, 60 + line * 18), f"Page {i + 1} line {line + 1} " * 4, fontsize=10)
+        for j in range(20):
+            rect = fitz.Rect(50 + j * 20, 500, 120 + j * 20, 700)
+            page.draw_rect(rect, color=(0, 0, 0), fill=(j / 20, 0.5, 1 - j / 20))
+    document.save(path)
+    document.close()
+
+
+def run(pdf_path: str, dpi: int, workers: int, output_root: str):
+    output_dir = os.path.join(output_root, f"w{workers}")
+    start = time.perf_counter()
+    image_paths = pdf_to_images(pdf_path, output_dir, dpi=dpi, workers=workers)
+    elapsed = time.perf_counter() - start
+    shutil.rmtree(output_dir, ignore_errors=True)
+    return elapsed, len(image_paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF渲染基准测试")
+    parser.add_argument("pdf", nargs="?", help="PDF文件路径，不指定则生成测试文件")
+    parser.add_argument("--pages", type=int, default=100, help="生成测试PDF的页数")
+    parser.add_argument("--dpi", type=int, default=300, help="渲染DPI")
+    parser.add_argument("--workers", default=f"1,2,4,{RENDER_WORKERS}", help="逗号分隔的进程数列表，1为串行")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="render_bench_")
+    try:
+        pdf_path = args.pdf
+        if not pdf_path:
+            pdf_path = os.path.join(tmp_dir, "sample.pdf")
+            make_sample_pdf(pdf_path, args.pages)
+
+        worker_counts = sorted({int(w) for w in args.workers.split(",") if w})
+        print(f"PDF: {pdf_path}, DPI: {args.dpi}, CPU: {os.cpu_count()}")
+        print(f"{'workers':>8} {'pages':>6} {'seconds':>9} {'pages/s':>8} {'speedup':>8}")
+
+        baseline = None
+        for workers in worker_counts:
+            elapsed, pages = run(pdf_path, args.dpi, workers, tmp_dir)
+            if baseline is None:
+                baseline = elapsed
+            print(f"{workers:>8} {pages:>6} {elapsed:>9.2f} {pages / elapsed:>8.1f} {baseline / elapsed:>7.2f}x")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
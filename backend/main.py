@@ -4,6 +4,9 @@ import os
 from dotenv import load_dotenv
 import logging
 from app.database.db_init import init_database
+from app.database.database import dispose_async_engine
+from app.services.ocr_clients import init_ocr_clients, close_ocr_clients, close_async_ocr_clients
+from app.services.metadata_cache import metadata_cache
 
 # 加载环境变量
 load_dotenv()
@@ -29,8 +32,19 @@ app = FastAPI(
 async def startup_event():
     logger.info("应用启动，初始化数据库...")
     init_database()
+    logger.info("初始化OCR客户端...")
+    # 异步客户端的连接池绑定在事件循环上，在应用的事件循环中创建
+    await init_ocr_clients()
     logger.info("应用启动完成")
 
+# 应用关闭事件
+@app.on_event("shutdown")
+async def shutdown_event():
+    close_ocr_clients()
+    await close_async_ocr_clients()
+    await dispose_async_engine()
+    metadata_cache.close()
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -38,6 +52,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 跨域的PDF查看器需要读取这些响应头才能按范围分段加载
+    expose_headers=["Accept-Ranges", "Content-Range", "Content-Length", "ETag", "Last-Modified"],
 )
 
 @app.get("/")
@@ -49,9 +65,10 @@ async def health_check():
     return {"status": "healthy"}
 
 # 导入路由
-from app.routes import pdf, notes
+from app.routes import pdf, notes, search
 app.include_router(pdf.router, prefix="/api/file", tags=["file"])
 app.include_router(notes.router, prefix="/api", tags=["notes"])
+app.include_router(search.router, prefix="/api", tags=["search"])
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,91 @@
+"""
+页面图片打包工具：把 IMAGES_DIR 下每个文档的图片目录（<file_id>/p_N.png ...）转换为打包文件 <file_id>.pack，
+或把打包文件还原为图片目录。图片路径不变，数据库不需要修改；服务运行期间也可以执行。
+
+用法（在 backend 目录下执行）:
+    python pack_images.py                       # 打包所有文档的图片目录
+    python pack_images.py <file_id> ...         # 只打包指定文档
+    python pack_images.py --unpack [<file_id> ...]
+    python pack_images.py --dry-run             # 只统计，不修改
+
+新渲染的文档是否自动打包由 PAGE_STORE=pack 控制
+"""
+import os
+import logging
+import argparse
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _dir_stats(image_dir: str) -> tuple:
+    """
+    统计图片目录中的文件数和总大小
+    """
+    count = size = 0
+    for entry in os.scandir(image_dir):
+        if entry.is_file():
+            count += 1
+            size += entry.stat().st_size
+    return count, size
+
+def main():
+    parser = argparse.ArgumentParser(description="页面图片打包工具")
+    parser.add_argument("file_ids", nargs="*", help="文档ID，不指定时处理所有文档")
+    parser.add_argument("--unpack", action="store_true", help="把打包文件还原为图片目录")
+    parser.add_argument("--dry-run", action="store_true", help="只统计需要处理的目录，不修改")
+    parser.add_argument("--force", action="store_true", help="按需渲染模式下也打包（渲染缓存不管理打包文件）")
+    args = parser.parse_args()
+
+    from app.utils.page_store import PACK_EXTENSION, pack_image_dir, unpack_image_dir
+    from app.utils.render_cache import is_lazy_render
+
+    images_root = os.getenv("IMAGES_DIR", "./images")
+    if not os.path.isdir(images_root):
+        logger.error(f"图片目录不存在: {images_root}")
+        return
+    if is_lazy_render() and not args.unpack and not args.force:
+        logger.error("按需渲染模式下页面图片由渲染缓存管理，不打包；确认需要打包时使用 --force")
+        return
+
+    if args.file_ids:
+        file_ids = args.file_ids
+    elif args.unpack:
+        file_ids = sorted(name[:-len(PACK_EXTENSION)] for name in os.listdir(images_root) if name.endswith(PACK_EXTENSION))
+    else:
+        file_ids = sorted(entry.name for entry in os.scandir(images_root) if entry.is_dir())
+
+    processed = files = total_bytes = 0
+    for file_id in file_ids:
+        image_dir = os.path.join(images_root, file_id)
+        try:
+            if args.unpack:
+                if args.dry_run:
+                    processed += os.path.exists(image_dir + PACK_EXTENSION)
+                    continue
+                count = unpack_image_dir(image_dir)
+            else:
+                if not os.path.isdir(image_dir):
+                    continue
+                count, size = _dir_stats(image_dir)
+                total_bytes += size
+                if args.dry_run:
+                    processed += 1
+                    files += count
+                    continue
+                pack_image_dir(image_dir)
+            processed += 1
+            files += count
+        except Exception as e:
+            logger.error(f"处理图片目录失败: {image_dir}, 错误: {str(e)}")
+
+    action = "解包" if args.unpack else "打包"
+    prefix = "需要" if args.dry_run else "已"
+    logger.info(f"{prefix}{action} {processed} 个文档, {files} 个文件" + (f", {total_bytes / 1024 ** 2:.1f}MB" if total_bytes else ""))
+
+if __name__ == "__main__":
+    main()
@@ -25,6 +25,12 @@ fi
 mkdir -p uploads
 mkdir -p images
 
+# 启动后台任务工作进程
+echo "启动任务工作进程..."
+python worker.py &
+WORKER_PID=$!
+trap "kill $WORKER_PID" EXIT
+
 # 启动服务
 echo "启动服务..."
 python main.py
\ No newline at end of file
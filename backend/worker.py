@@ -0,0 +1,99 @@
+import os
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 处理解析、分类、渲染任务的工作进程数量
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+# OCR工作进程中同时执行的OCR任务数（对视觉模型服务的并发请求数）
+OCR_MAX_IN_FLIGHT = int(os.getenv("OCR_MAX_IN_FLIGHT", "4"))
+
+# 处理流程阶段（CPU密集）与OCR阶段（等待远程服务）分开调度
+PIPELINE_STAGES = ["parse", "classify", "render"]
+OCR_STAGES = ["ocr"]
+
+def worker_main(stages, threads, render_workers=None):
+    """
+    单个工作进程入口，收到SIGTERM/SIGINT后处理完当前任务再退出
+    :param render_workers: 渲染进程数，None时使用 RENDER_WORKERS 配置
+    """
+    from app.services.job_worker import run_worker
+    from app.services.ocr_clients import close_ocr_clients
+    from app.services.ocr_backends import init_background_ocr_clients, close_background_ocr_clients
+    from app.services.metadata_cache import metadata_cache
+    from app.database.models import JobStage
+
+    if render_workers is not None:
+        from app.utils import image_converter
+        image_converter.RENDER_WORKERS = render_workers
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    # OCR进程启动时在共用的事件循环中创建长期复用的OCR客户端，所有线程共享连接池
+    if "ocr" in (stages or []):
+        init_background_ocr_clients()
+    try:
+        run_worker(
+            stages=[JobStage(s) for s in stages] if stages else None,
+            stop_event=stop_event,
+            threads=threads
+        )
+    finally:
+        close_background_ocr_clients()
+        close_ocr_clients()
+        # 退出前发布尚未发布的缓存失效消息
+        metadata_cache.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF处理任务工作进程")
+    parser.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY, help="处理流程（解析/分类/渲染）工作进程数量")
+    parser.add_argument("--ocr-concurrency", type=int, default=OCR_MAX_IN_FLIGHT, help="同时执行的OCR任务数，0表示不处理OCR任务")
+    args = parser.parse_args()
+
+    from app.database.db_init import init_database
+    init_database()
+
+    # 创建必要的目录
+    os.makedirs(os.getenv("IMAGES_DIR", "./images"), exist_ok=True)
+
+    # 未配置 RENDER_WORKERS 时，CPU核数按实际启动的处理流程工作进程数平分
+    pipeline_processes = max(1, args.concurrency)
+    render_workers = None
+    if not os.getenv("RENDER_WORKERS"):
+        from app.utils.image_converter import default_render_workers
+        render_workers = default_render_workers(pipeline_processes)
+
+    # 使用spawn启动子进程，避免继承父进程的数据库连接
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for _ in range(pipeline_processes):
+        processes.append(context.Process(target=worker_main, args=(PIPELINE_STAGES, 1, render_workers)))
+    if args.ocr_concurrency > 0:
+        processes.append(context.Process(target=worker_main, args=(OCR_STAGES, args.ocr_concurrency)))
+    for process in processes:
+        process.start()
+    logger.info(f"已启动 {len(processes)} 个任务工作进程，OCR并发数: {args.ocr_concurrency}")
+
+    def shutdown(*_):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    main()